@@ -0,0 +1,380 @@
+# asgi.py - Modo de servicio asíncrono (ASGI) para los servidores Flask
+# El event loop (uvicorn) solo lee peticiones y escribe respuestas; las rutas
+# de Flask corren en un pool de hilos. Un /step lento en un mapa grande ya no
+# detiene a los demás clientes.
+#
+# - Orden por sesión: las peticiones de una sesión se ejecutan una tras otra
+#   en el orden en que llegaron, nunca dos a la vez en el pool.
+# - Límites: FLASHPOINT_WORKERS hilos de simulación (4), FLASHPOINT_MAX_PENDING
+#   peticiones en curso en total (256, si no 503) y FLASHPOINT_SESSION_QUEUE
+#   por sesión (32, si no 429).
+# - Timeout: FLASHPOINT_REQUEST_TIMEOUT segundos desde que llega la petición
+#   (30, si no 504). Si aún no empezaba ya no se ejecuta; si ya empezó
+#   termina en el pool (un step no se interrumpe a la mitad) y la siguiente
+#   petición de la sesión la espera.
+# - GET /stream usa un hilo propio por cliente (FLASHPOINT_MAX_STREAMS, 32) y
+#   /metrics, /sessions y /stream/control un pool aparte, fuera de la fila.
+#
+#   python asgi.py --server server --workers 8
+#   FLASHPOINT_SERVER=serverR uvicorn --factory asgi:app_from_env --port 5000
+#
+# Hilos y no procesos: las sesiones viven en la memoria del proceso
+# (SessionRegistry) y cualquier hilo del pool puede atender cualquier sesión.
+
+import argparse
+import asyncio
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import metrics
+from sessions import DEFAULT_SESSION
+
+# Servidor -> puerto de siempre
+SERVERS = {"serverR": 5000, "serverStrat": 5001, "server": 5002}
+STREAM_PATH = "/stream"
+CONTROL_PATHS = ("/metrics", "/sessions", "/stream/control")
+
+
+# --- PUENTE WSGI ---
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def call_wsgi(app, environ):
+    """(estado, headers, cuerpo iterable), sin consumir el cuerpo."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+        return lambda data: None  # write() no lo usa Flask
+
+    body = app(environ, start_response)
+    return started[0], started[1], body
+
+
+def run_wsgi(app, environ):
+    status, headers, body = call_wsgi(app, environ)
+    try:
+        return status, headers, b"".join(body)
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+def response_start(status, headers):
+    return {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]}
+
+
+async def send_response(send, status, headers, body):
+    await send(response_start(status, headers))
+    await send({"type": "http.response.body", "body": body})
+
+
+def error_response(code, message, retry_after=None):
+    headers = [("Content-Type", "application/json"), ("Access-Control-Allow-Origin", "*")]
+    if retry_after is not None:
+        headers.append(("Retry-After", str(retry_after)))
+    return f"{code} {message}", headers, json.dumps({"error": message}).encode()
+
+
+def session_key(environ, body):
+    """Sesión que toca la petición (misma regla que routes.resolve_session_id);
+    None si crea una sesión nueva."""
+    data = {}
+    if body and "json" in environ.get("CONTENT_TYPE", ""):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            pass
+        if not isinstance(data, dict):
+            data = {}
+    if data.get("new_session"):
+        return None
+    query = parse_qs(environ["QUERY_STRING"])
+    return str(environ.get("HTTP_X_SESSION_ID")
+               or query.get("session_id", [None])[0]
+               or data.get("session_id")
+               or DEFAULT_SESSION)
+
+
+def reject(reason, code, message, retry_after=None):
+    if metrics.ENABLED:
+        metrics.inc(metrics.REJECTED, reason=reason)
+    return error_response(code, message, retry_after)
+
+
+# --- APP ASGI ---
+
+class AsyncApp:
+    """App ASGI sobre la app WSGI de Flask: HTTP en el event loop y las rutas
+    en un pool de hilos, con orden por sesión, límites y timeout."""
+
+    def __init__(self, wsgi_app, workers=4, max_pending=256, session_queue=32,
+                 timeout=30.0, max_streams=32):
+        self.wsgi_app = wsgi_app
+        self.max_pending = max_pending
+        self.session_queue = session_queue
+        self.timeout = timeout
+        self.max_streams = max_streams
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="sim")
+        self.control_pool = ThreadPoolExecutor(2, thread_name_prefix="control")
+        # Solo se tocan desde el event loop (sin candados)
+        self.pending = 0
+        self.streams = 0
+        self._queues = {}  # sesión -> [futuro de la última petición en fila, peticiones]
+
+    @staticmethod
+    def limits_from_env():
+        env = os.environ.get
+        return {
+            "workers": int(env("FLASHPOINT_WORKERS", 4)),
+            "max_pending": int(env("FLASHPOINT_MAX_PENDING", 256)),
+            "session_queue": int(env("FLASHPOINT_SESSION_QUEUE", 32)),
+            "timeout": float(env("FLASHPOINT_REQUEST_TIMEOUT", 30)),
+            "max_streams": int(env("FLASHPOINT_MAX_STREAMS", 32)),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return  # Sin websockets: el servidor cierra la conexión
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        path = scope["path"]
+        if path == STREAM_PATH:
+            return await self._stream(environ, receive, send)
+        if path.startswith(CONTROL_PATHS):
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.control_pool, run_wsgi, self.wsgi_app, environ)
+            return await send_response(send, *response)
+        await send_response(send, *await self._queued(environ, body))
+
+    async def _queued(self, environ, body):
+        if self.pending >= self.max_pending:
+            return reject("busy", 503, "Server busy", retry_after=1)
+        key = session_key(environ, body)
+        entry = self._queues.get(key) if key is not None else None
+        if entry and entry[1] >= self.session_queue:
+            return reject("session_queue", 429, "Too many pending requests for this session",
+                          retry_after=1)
+
+        loop = asyncio.get_running_loop()
+        arrived = loop.time()
+        deadline = arrived + self.timeout
+        link = loop.create_future()  # Se resuelve cuando esta petición suelta la sesión
+        prev = None
+        if key is not None:
+            if entry:
+                prev = entry[0]
+                entry[0] = link
+                entry[1] += 1
+            else:
+                self._queues[key] = [link, 1]
+        self.pending += 1
+        cancelled = threading.Event()
+        future = None
+        try:
+            if prev is not None and not prev.done():
+                await asyncio.wait_for(asyncio.shield(prev), deadline - loop.time())
+            if metrics.ENABLED:
+                metrics.observe(metrics.QUEUE_WAIT, loop.time() - arrived)
+            future = loop.run_in_executor(self.pool, self._work, environ, cancelled)
+            future.add_done_callback(lambda _: self._release(key, link))
+            return await asyncio.wait_for(asyncio.shield(future), deadline - loop.time())
+        except asyncio.TimeoutError:
+            cancelled.set()  # Si no había empezado ya no corre
+            return reject("timeout", 504, "Timeout")
+        finally:
+            if future is None:
+                # Nunca llegó al pool: suelta la sesión cuando termine la anterior
+                if prev is None or prev.done():
+                    self._release(key, link)
+                else:
+                    prev.add_done_callback(lambda _: self._release(key, link))
+
+    def _work(self, environ, cancelled):
+        if cancelled.is_set():
+            return None  # Venció antes de empezar
+        return run_wsgi(self.wsgi_app, environ)
+
+    def _release(self, key, link):
+        self.pending -= 1
+        if key is not None:
+            entry = self._queues[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._queues[key]
+        link.set_result(None)
+
+    async def _stream(self, environ, receive, send):
+        # SSE: un hilo propio recorre el generador de Flask y pasa cada evento
+        # al loop; no genera el siguiente hasta que el anterior salió al socket
+        # (misma contrapresión que con el servidor de desarrollo).
+        if self.streams >= self.max_streams:
+            return await send_response(send, *reject("streams", 503, "Too many streams", retry_after=5))
+        self.streams += 1
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        delivered = threading.Semaphore(0)
+        stop = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # El loop ya cerró
+
+        def pump():
+            body = None
+            try:
+                status, headers, body = call_wsgi(self.wsgi_app, environ)
+                put(("start", status, headers))
+                for chunk in body:
+                    if stop.is_set():
+                        break
+                    if chunk:
+                        put(("body", chunk))
+                        delivered.acquire()
+            except Exception as e:
+                put(("error", e))
+            finally:
+                if hasattr(body, "close"):
+                    body.close()
+                put(("end",))
+
+        threading.Thread(target=pump, name="stream", daemon=True).start()
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        started = False
+        try:
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    break
+                item = get.result()
+                if item[0] == "start":
+                    started = True
+                    await send(response_start(item[1], item[2]))
+                elif item[0] == "body":
+                    await send({"type": "http.response.body", "body": item[1], "more_body": True})
+                    delivered.release()
+                elif item[0] == "error":
+                    if not started:
+                        await send_response(send, *error_response(500, "Internal Server Error"))
+                    raise item[1]
+                else:
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+        finally:
+            stop.set()
+            delivered.release()  # Despierta al hilo si esperaba entrega
+            disconnect.cancel()
+            self.streams -= 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.control_pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# --- ARRANQUE ---
+
+def load_wsgi_app(server):
+    return importlib.import_module(server).create_app()
+
+
+def app_from_env():
+    # Para uvicorn --factory; el servidor sale de FLASHPOINT_SERVER
+    wsgi_app = load_wsgi_app(os.environ.get("FLASHPOINT_SERVER", "server"))
+    return AsyncApp(wsgi_app, **AsyncApp.limits_from_env())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor asíncrono (ASGI + pool de hilos)")
+    parser.add_argument("--server", choices=SERVERS, default="server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, help="por defecto el del servidor elegido")
+    parser.add_argument("--workers", type=int, help="hilos de simulación")
+    parser.add_argument("--max-pending", type=int, help="peticiones en curso en total")
+    parser.add_argument("--session-queue", type=int, help="peticiones en fila por sesión")
+    parser.add_argument("--timeout", type=float, help="segundos por petición")
+    parser.add_argument("--max-streams", type=int, help="clientes de /stream a la vez")
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error("falta uvicorn (pip install uvicorn)")
+
+    limits = AsyncApp.limits_from_env()
+    for name in limits:
+        if getattr(args, name) is not None:
+            limits[name] = getattr(args, name)
+    app = AsyncApp(load_wsgi_app(args.server), **limits)
+    uvicorn.run(app, host=args.host, port=args.port or SERVERS[args.server], log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# batch.py - Avanzar varios steps de un modelo en una sola llamada
+# Sirve para /run (fast-forward en Unity) y para corridas sin Flask.
+
+from state_delta import build_delta
+
+MAX_BATCH_STEPS = 10000
+UNTIL_MODES = ("steps", "round", "end")
+
+
+def steps_for(model, until, steps):
+    if until == "round":
+        return len(model.firefighters)  # Un turno de cada bombero
+    if until == "end":
+        return MAX_BATCH_STEPS
+    try:
+        steps = 1 if steps is None else int(steps)
+    except (TypeError, ValueError):
+        raise ValueError("steps debe ser un entero") from None
+    if steps < 0:
+        raise ValueError("steps debe ser >= 0")
+    return min(steps, MAX_BATCH_STEPS)  # 0: no avanza, solo regresa el estado
+
+
+def advance(model, steps=1, until="steps", timeline=False):
+    """Avanza el modelo y regresa (steps avanzados, timeline o None).
+
+    La timeline trae un delta por step (solo lo que cambió), así el cliente
+    puede animar la corrida sin pedir cada step por HTTP.
+    """
+    if until not in UNTIL_MODES:
+        raise ValueError(f"until debe ser uno de {UNTIL_MODES}")
+    budget = steps_for(model, until, steps)
+    frames = [] if timeline else None
+    advanced = 0
+    while advanced < budget and model.running:
+        before = model.steps
+        acting = model.current_agent_id()
+        model.step()
+        advanced += 1
+        if frames is not None:
+            frame = build_delta(model, before)
+            frame["agent"] = acting
+            for key in ("delta", "since", "game_id"):
+                frame.pop(key, None)
+            frames.append(frame)
+    return advanced, frames
@@ -0,0 +1,359 @@
+# bench.py - Benchmarks de las rutas calientes de la simulación
+# Mide cada operación en ambos servidores, con varios tamaños de mapa y
+# densidades de fuego/humo, guarda los resultados en JSON y los compara
+# contra una línea base guardada para detectar regresiones.
+#
+#   python bench.py --save base.json                 # línea base
+#   python bench.py --compare base.json              # regresiones
+#   python bench.py --quick --cases step,astar --maps default,gen:200x200
+#
+# Llave de cada resultado: "caso|motor|mapa|densidad". Tiempos en µs por
+# operación (mediana y mínimo de las muestras). La suite se corre --runs
+# veces, un proceso por corrida, y se guarda cuánto varía el mínimo entre
+# corridas ("spread"). La comparación usa el mínimo y solo marca regresión
+# lo que pasa del umbral más esa variación; cada llave marcada se vuelve a
+# medir (hasta tres rondas separadas) antes de contarla.
+
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from server import STRATEGIES, model_factory
+
+DEFAULT_MAPS = "default,gen:60x40,gen:200x200"
+DEFAULT_DENSITIES = "0,0.1,0.3"
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_RUNS = 3
+MIN_DELTA_US = 2.0  # Por debajo de esto la diferencia es ruido del reloj, no del código
+CONFIRM_ROUNDS = 3   # Rondas para volver a medir lo marcado como regresión
+CONFIRM_PAUSE = 10.0 # Segundos entre rondas: la máquina tiene rachas lentas
+GAME_MAX_STEPS = 300
+STRAT_ENGINES = ("strat", "strat_array")
+
+
+# --- PREPARACIÓN ---
+
+class Context:
+    """Modelo preparado y entradas fijas (mismas para todos los motores)."""
+
+    def __init__(self, engine, map_name, density, seed):
+        self.engine = engine
+        self.map_name = map_name
+        self.seed = seed
+        self.cls = model_factory(engine)
+        self.model = self.cls(seed=seed, log_level="off", map_name=map_name)
+        rng = random.Random(seed)
+        game_map = self.model.map
+        cells = [(x, y) for y, row in enumerate(game_map.layout)
+                 for x, ch in enumerate(row) if ch == "C"]
+        walkable = [(x, y) for y, row in enumerate(game_map.layout)
+                    for x, ch in enumerate(row) if ch != "M"]
+        self.pairs = [(rng.choice(walkable), rng.choice(walkable)) for _ in range(20)]
+        self.points = [rng.choice(walkable) for _ in range(50)]
+        set_hazards(self.model, rng.sample(cells, int(len(cells) * density)))
+
+
+def set_hazards(model, positions):
+    # Mitad humo, mitad fuego; sin tocar celdas con víctima
+    if engine_of(model) == "random":
+        from serverR import CELL, FIRE, SMOKE
+        for i, (x, y) in enumerate(positions):
+            if model.cells[x][y] == CELL and (x, y) not in model.pois:
+                model.set_cell(x, y, FIRE if i % 2 else SMOKE)
+        return
+    for i, pos in enumerate(positions):
+        tile = model.get_tile(pos)
+        if not tile.hasPOI:
+            if i % 2:
+                tile.fire = 1
+            else:
+                tile.smoke = 1
+
+
+def engine_of(model):
+    return "random" if model.RULES == "random" else "strat"
+
+
+# --- CASOS ---
+# Cada caso genera la duración (segundos) de una operación a la vez.
+
+def _clock(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def case_astar(ctx):
+    while True:
+        for start, end in ctx.pairs:
+            yield _clock(ctx.model.get_path_astar, start, end)
+
+
+def case_rooms(ctx):
+    # Mismos pares que astar con el grafo de cuartos (cachés calientes)
+    from rooms import RoomGraph
+    graph = RoomGraph(ctx.model)
+    while True:
+        for start, end in ctx.pairs:
+            yield _clock(graph.path, start, end)
+
+
+def case_nearest_hazard(ctx):
+    while True:
+        for pos in ctx.points:
+            yield _clock(ctx.model.get_nearest_hazard, pos)
+
+
+def case_nearest_entity(ctx):
+    while True:
+        for pos in ctx.points:
+            yield _clock(ctx.model.get_nearest_entity, pos)
+
+
+def case_spawn_pois(ctx):
+    model = ctx.model.fork()
+    while True:
+        if engine_of(model) == "random":
+            if model.pois:
+                model.pois.pop()
+            yield _clock(model.spawn_poi)
+        else:
+            for pos in list(model.POIs):
+                model.remove_poi(pos)
+            yield _clock(model.spawn_pois)
+
+
+def case_get_available_actions(ctx):
+    model = ctx.model
+    while True:
+        for agent in model.firefighters:
+            agent.ap = 4
+            yield _clock(agent.get_available_actions)
+
+
+def case_step(ctx):
+    model = ctx.model.fork()
+    while True:
+        if not model.running:
+            model = ctx.model.fork()
+        yield _clock(model.step)
+
+
+def case_game(ctx):
+    seed = ctx.seed
+    while True:
+        seed += 1
+        start = time.perf_counter()
+        model = ctx.cls(seed=seed, log_level="off", map_name=ctx.map_name)
+        while model.running and model.steps < GAME_MAX_STEPS:
+            model.step()
+        yield time.perf_counter() - start
+
+
+def case_get_state_json(ctx):
+    while True:
+        yield _clock(ctx.model.get_state_json)
+
+
+# nombre -> (función, motores donde aplica, muestras)
+CASES = {
+    "astar": (case_astar, STRAT_ENGINES, 100),
+    "rooms": (case_rooms, STRAT_ENGINES, 100),
+    "nearest_hazard": (case_nearest_hazard, STRAT_ENGINES, 500),
+    "nearest_entity": (case_nearest_entity, STRAT_ENGINES, 500),
+    "spawn_pois": (case_spawn_pois, STRATEGIES, 100),
+    "get_available_actions": (case_get_available_actions, ("random_legacy",), 500),
+    "step": (case_step, STRATEGIES, 200),
+    "game": (case_game, STRATEGIES, 5),
+    "get_state_json": (case_get_state_json, STRATEGIES, 50),
+}
+
+
+def measure(gen, samples):
+    for _ in range(samples // 10):
+        next(gen)  # Calentamiento: cachés, campos de distancia, etc.
+    gc.collect()
+    gc.disable()  # Como timeit: una recolección a media muestra es solo ruido
+    try:
+        times = [next(gen) for _ in range(samples)]
+    finally:
+        gc.enable()
+    return {
+        "median_us": round(statistics.median(times) * 1e6, 2),
+        "min_us": round(min(times) * 1e6, 2),
+        "samples": samples,
+    }
+
+
+def run_once(cases, engines, maps, densities, seed=0, scale=1.0, progress=None):
+    results = {}
+    for engine in engines:
+        for map_name in maps:
+            for density in densities:
+                ctx = None
+                for case in cases:
+                    fn, applies, samples = CASES[case]
+                    if engine not in applies:
+                        continue
+                    if case == "game" and density:
+                        continue  # La partida completa no depende de la densidad inicial
+                    if ctx is None:
+                        ctx = Context(engine, map_name, density, seed)
+                    key = f"{case}|{engine}|{map_name}|{density:g}"
+                    results[key] = measure(fn(ctx), max(1, int(samples * scale)))
+                    if progress:
+                        print(f"{key}: {results[key]['median_us']} us", file=sys.stderr)
+    return results
+
+
+def run_suite(cases, engines, maps, densities, seed=0, scale=1.0, progress=None,
+              runs=DEFAULT_RUNS):
+    """Varias corridas completas, cada una en un proceso nuevo (otra semilla de
+    hash, otra memoria: de proceso a proceso el mismo caso varía mucho más
+    que dentro de uno) -> mínimo, mediana y variación por llave."""
+    task = (cases, engines, maps, densities, seed, scale, progress)
+    with mp.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        passes = pool.starmap(run_once, [task] * runs)
+    results = {}
+    for key in passes[0]:
+        mins = [p[key]["min_us"] for p in passes]
+        best = min(mins)
+        results[key] = {
+            "median_us": round(statistics.median(p[key]["median_us"] for p in passes), 2),
+            "min_us": best,
+            # Rango relativo del mínimo entre corridas: ruido propio de la llave
+            "spread": round((max(mins) - best) / best, 3) if best else 0.0,
+            "samples": passes[0][key]["samples"],
+            "runs": runs,
+        }
+    return results
+
+
+# --- LÍNEA BASE ---
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Filas (llave, base, actual, razón, tolerancia, estado) de las llaves en
+    ambas corridas. Compara mínimos; la tolerancia es el umbral más la mayor
+    variación entre corridas de las dos (una línea base vieja sin "spread"
+    cuenta como 0); además la diferencia debe pasar de MIN_DELTA_US."""
+    rows = []
+    for key, new in current.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        ratio = new["min_us"] / old["min_us"] if old["min_us"] else float("inf")
+        tolerance = threshold + max(old.get("spread", 0.0), new.get("spread", 0.0))
+        if ratio > 1 + tolerance and new["min_us"] - old["min_us"] > MIN_DELTA_US:
+            status = "REGRESSION"
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((key, old["min_us"], new["min_us"], ratio, tolerance, status))
+    return rows
+
+
+def remeasure(keys, results, seed, scale, runs):
+    """Vuelve a medir las llaves marcadas y se queda con lo mejor de ambas
+    mediciones: una regresión real sobrevive, un mal momento de la máquina no."""
+    for key in keys:
+        case, engine, map_name, density = key.split("|")
+        again = run_suite([case], [engine], [map_name], [float(density)], seed, scale,
+                          runs=runs)[key]
+        first = results[key]
+        results[key] = dict(first, min_us=min(first["min_us"], again["min_us"]),
+                            spread=max(first["spread"], again["spread"]),
+                            runs=first["runs"] + again["runs"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la simulación")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--engines", default=",".join(STRATEGIES))
+    parser.add_argument("--maps", default=DEFAULT_MAPS)
+    parser.add_argument("--densities", default=DEFAULT_DENSITIES, help="fracción de celdas C con fuego/humo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="una quinta parte de las muestras")
+    parser.add_argument("--save", help="guardar resultados en este JSON")
+    parser.add_argument("--compare", help="JSON de línea base contra el cual comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help="corridas completas para medir la variación")
+    parser.add_argument("--progress", action="store_true")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in args.cases.split(",") if c]
+    engines = [e for e in args.engines.split(",") if e]
+    unknown = [c for c in cases if c not in CASES] + [e for e in engines if e not in STRATEGIES]
+    if unknown:
+        parser.error(f"desconocidos: {', '.join(unknown)}")
+    maps = [m for m in args.maps.split(",") if m]
+    densities = [float(d) for d in args.densities.split(",") if d]
+    if args.runs < 1:
+        parser.error("--runs debe ser >= 1")
+
+    start = time.perf_counter()
+    results = run_suite(cases, engines, maps, densities, args.seed,
+                        0.2 if args.quick else 1.0, args.progress, args.runs)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "quick": args.quick,
+            "runs": args.runs,
+            "wall_seconds": round(time.perf_counter() - start, 1),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if not args.compare:
+        for key, r in results.items():
+            print(f"{key:55} {r['median_us']:>12.2f} us  (min {r['min_us']:.2f}, "
+                  f"spread {r['spread']:.0%})")
+        return
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline["results"], args.threshold)
+    for attempt in range(CONFIRM_ROUNDS):
+        flagged = [r[0] for r in rows if r[5] == "REGRESSION"]
+        if not flagged:
+            break
+        if attempt:
+            time.sleep(CONFIRM_PAUSE)
+        print(f"ronda {attempt + 1}: volviendo a medir {len(flagged)} llaves marcadas",
+              file=sys.stderr)
+        remeasure(flagged, results, args.seed, 0.2 if args.quick else 1.0, args.runs)
+        rows = compare(results, baseline["results"], args.threshold)
+    for key, old, new, ratio, tolerance, status in rows:
+        print(f"{key:55} {old:>12.2f} -> {new:>12.2f} us (min)  x{ratio:5.2f}  "
+              f"±{tolerance:.0%}  {status}")
+    regressions = [r for r in rows if r[5] == "REGRESSION"]
+    print(f"{len(rows)} comparados, {len(regressions)} regresiones "
+          f"(umbral {args.threshold:.0%} + variación, base {baseline['meta'].get('commit')})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# cellpool.py - Conjunto indexado de celdas candidatas (para aparecer víctimas/humo)
+# Los modelos mantienen aquí las celdas donde puede aparecer algo y lo
+# actualizan cada vez que cambia una celda, en lugar de recorrer el mapa
+# completo en cada step.
+#
+# Es un árbol de Fenwick sobre los índices planos: agregar, quitar y
+# pool[k] (el k-ésimo índice en orden) cuestan O(log n). Conservar el orden
+# hace que random.choice(pool) elija exactamente la misma celda que
+# random.choice(lista de candidatos), así las partidas con semilla (y los
+# registros de replay) no cambian.
+
+from itertools import accumulate
+
+
+class CellPool:
+    __slots__ = ("size", "members", "tree", "count", "_top")
+
+    def __init__(self, size, flags=None):
+        """flags: bytes/bytearray de 0/1 por índice plano (None = vacío)."""
+        self.size = size
+        self.members = bytearray(flags) if flags is not None else bytearray(size)
+        # tree[i] = miembros en (i - lowbit(i), i], construido con sumas prefijo
+        prefix = list(accumulate(self.members, initial=0))
+        self.tree = [0] + [prefix[i] - prefix[i - (i & -i)] for i in range(1, size + 1)]
+        self.count = prefix[-1]
+        self._top = 1 << (size.bit_length() - 1) if size else 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return bool(self.members[i])
+
+    def __iter__(self):
+        return (i for i, m in enumerate(self.members) if m)
+
+    def __getitem__(self, k):
+        # k-ésimo miembro en orden (lo que usa random.choice)
+        if not 0 <= k < self.count:
+            raise IndexError("CellPool index out of range")
+        tree, size = self.tree, self.size
+        pos, rest, step = 0, k + 1, self._top
+        while step:
+            nxt = pos + step
+            if nxt <= size and tree[nxt] < rest:
+                pos = nxt
+                rest -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def set(self, i, member):
+        member = 1 if member else 0
+        if self.members[i] == member:
+            return
+        self.members[i] = member
+        delta = 1 if member else -1
+        self.count += delta
+        tree, size = self.tree, self.size
+        i += 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def add(self, i):
+        self.set(i, 1)
+
+    def discard(self, i):
+        self.set(i, 0)
+
+    def copy(self):
+        twin = object.__new__(CellPool)
+        twin.size, twin.count, twin._top = self.size, self.count, self._top
+        twin.members = bytearray(self.members)
+        twin.tree = list(self.tree)
+        return twin
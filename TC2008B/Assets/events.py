@@ -0,0 +1,99 @@
+# events.py - Bitácora estructurada de eventos de la simulación
+# Reemplaza los print() del ciclo de juego. Cada evento es un dict
+# {"seq", "step", "level", "kind", ...campos}. Los niveles apagados se
+# resuelven al configurar el log: log.debug(...) queda como una función
+# vacía, así que en corridas por lote no se formatea ni se escribe nada.
+#
+# Variables de entorno: FLASHPOINT_LOG_LEVEL (debug/info/warning/off),
+# FLASHPOINT_LOG_FILE (ruta JSONL) y FLASHPOINT_LOG_ECHO=1 (también a stdout).
+# El archivo se abre con el primer evento que se escribe: un log apagado no
+# abre nada. SessionRegistry lo cierra al expulsar o reemplazar la sesión.
+
+import json
+import os
+from collections import deque
+
+DEBUG, INFO, WARNING, OFF = 10, 20, 30, 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+LEVEL_NAMES = {v: k for k, v in LEVELS.items()}
+DEFAULT_CAPACITY = 1000
+
+
+def parse_level(level):
+    if level is None:
+        level = os.environ.get("FLASHPOINT_LOG_LEVEL", "info")
+    if isinstance(level, str):
+        return LEVELS[level.lower()]
+    return int(level)
+
+
+def _noop(kind, **fields):
+    pass
+
+
+class EventLog:
+    def __init__(self, level=None, capacity=DEFAULT_CAPACITY, path=None, echo=None):
+        self.seq = 0
+        self.step = 0
+        self.game = None
+        self.buffer = deque(maxlen=capacity)
+        if path is None:
+            path = os.environ.get("FLASHPOINT_LOG_FILE")
+        self._path = path or None
+        self._file = None
+        if echo is None:
+            echo = os.environ.get("FLASHPOINT_LOG_ECHO") == "1"
+        self.echo = echo
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = parse_level(level)
+        self.debug = self._emitter(DEBUG)
+        self.info = self._emitter(INFO)
+        self.warning = self._emitter(WARNING)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def _emitter(self, level):
+        if not self.enabled(level):
+            return _noop
+        name = LEVEL_NAMES[level]
+        def emit(kind, **fields):
+            self.seq += 1
+            event = {"seq": self.seq, "step": self.step, "level": name, "kind": kind}
+            event.update(fields)
+            self.buffer.append(event)
+            if self._path:
+                if self._file is None:
+                    self._file = open(self._path, "a", buffering=1)
+                if self.game:
+                    event = dict(event, game=self.game)
+                self._file.write(json.dumps(event, default=str) + "\n")
+            if self.echo:
+                details = " ".join(f"{k}={v}" for k, v in fields.items())
+                print(f"[{self.step}] {name.upper()} {kind} {details}")
+        return emit
+
+    def query(self, since=0, limit=100, level=None, kind=None):
+        """Eventos con seq > since, filtrados por nivel mínimo y tipo."""
+        min_level = parse_level(level) if level else 0
+        kinds = set(kind.split(",")) if kind else None
+        out = []
+        for event in self.buffer:
+            if event["seq"] <= since:
+                continue
+            if LEVELS[event["level"]] < min_level:
+                continue
+            if kinds and event["kind"] not in kinds:
+                continue
+            out.append(event)
+            if len(out) >= limit:
+                break
+        return out
+
+    def close(self):
+        self._path = None  # Cerrado para siempre: no se vuelve a abrir
+        if self._file:
+            self._file.close()
+            self._file = None
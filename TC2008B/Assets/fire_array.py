@@ -0,0 +1,239 @@
+# fire_array.py - Motor de FireModel sobre arreglos NumPy
+# Mismas reglas que serverStrat.FireModel, pero el mapa vive en arreglos
+# [y, x] (tipo, fuego, humo, daño, POI) en lugar de 240 agentes Tile dentro
+# del MultiGrid. El orden fila por fila es el mismo que el de model.tiles,
+# así que con la misma semilla ambos motores juegan la misma partida.
+
+import heapq
+
+import numpy as np
+
+import metrics
+
+from cellpool import CellPool
+from serverStrat import FireModel
+from snapshot import blank_grid
+
+# Códigos de tipo = "state" que se manda a Unity
+TYPE_CODES = {"F": 0, "M": 1, "C": 2, "D": 3}
+TYPE_CHARS = "FMCD"
+OUTSIDE, WALL, CELL, DOOR = range(4)
+SMOKE_STATE, FIRE_STATE = 4, 5
+# Código de tipo <-> carácter ASCII (formato del snapshot, igual que Tile)
+TYPE_ASCII = np.frombuffer(TYPE_CHARS.encode(), dtype=np.uint8)
+ASCII_TYPE = np.zeros(256, dtype=np.uint8)
+ASCII_TYPE[TYPE_ASCII] = np.arange(len(TYPE_CHARS))
+
+
+class TileView:
+    """Vista de una celda con la misma interfaz que Tile (para FireFighter)."""
+
+    __slots__ = ("model", "pos", "_i")
+
+    def __init__(self, model, pos):
+        self.model = model
+        self.pos = pos
+        self._i = (pos[1], pos[0])
+
+    def _set(self, array, value):
+        if array[self._i] != value:
+            array[self._i] = value
+            self.model.on_tile_change(self, None)
+
+    @property
+    def type(self):
+        return TYPE_CHARS[self.model.kind[self._i]]
+
+    @type.setter
+    def type(self, value):
+        self._set(self.model.kind, TYPE_CODES[value])
+
+    @property
+    def fire(self):
+        return int(self.model.fire[self._i])
+
+    @fire.setter
+    def fire(self, value):
+        self._set(self.model.fire, value)
+
+    @property
+    def smoke(self):
+        return int(self.model.smoke[self._i])
+
+    @smoke.setter
+    def smoke(self, value):
+        self._set(self.model.smoke, value)
+
+    @property
+    def damage(self):
+        return int(self.model.damage[self._i])
+
+    @damage.setter
+    def damage(self, value):
+        self._set(self.model.damage, value)
+
+    @property
+    def hasPOI(self):
+        return bool(self.model.poi[self._i])
+
+    @hasPOI.setter
+    def hasPOI(self, value):
+        self.model.poi[self._i] = value
+
+    # walkable se deriva del tipo
+    @property
+    def walkable(self):
+        return self.model.kind[self._i] in (CELL, DOOR)
+
+    @walkable.setter
+    def walkable(self, value):
+        pass
+
+
+class ArrayFireModel(FireModel):
+    def _create_map(self):
+        # Tipos y coordenadas salen compilados del mapa; solo se copia lo que cambia
+        kind, self._xs, self._ys = self.map.arrays()
+        self.kind = kind.copy()
+        self.fire = np.zeros_like(self.kind)
+        self.smoke = np.zeros_like(self.kind)
+        self.damage = np.zeros((self.height, self.width), dtype=np.int16)
+        self.poi = np.zeros((self.height, self.width), dtype=bool)
+        # Coordenadas de cada celda en orden fila por fila (igual que tiles)
+        self._xs_list, self._ys_list = self.map.coords()
+        self._costs = None
+
+    def get_tile(self, pos):
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return TileView(self, pos)
+        return None
+
+    def _build_pools(self):
+        open_cell = (self.kind == CELL) & ~self.poi
+        quiet = open_cell & (self.smoke == 0) & (self.fire == 0)
+        self.smoke_pool = CellPool(open_cell.size, open_cell.ravel().astype(np.uint8).tobytes())
+        self.poi_pool = CellPool(quiet.size, quiet.ravel().astype(np.uint8).tobytes())
+
+    def _refresh_pools(self, pos):
+        x, y = pos
+        i = y * self.width + x
+        open_cell = self.kind[y, x] == CELL and not self.poi[y, x]
+        self.smoke_pool.set(i, open_cell)
+        self.poi_pool.set(i, open_cell and self.smoke[y, x] == 0 and self.fire[y, x] == 0)
+
+    def on_tile_change(self, tile, attr):
+        super().on_tile_change(tile, attr)
+        self._costs = None
+
+    def _nearest_flat(self, mask, pos):
+        # Primer mínimo Manhattan en orden fila por fila, como min() sobre tiles
+        idx = np.flatnonzero(mask)
+        if idx.size == 0: return None, None
+        d = np.abs(self._xs[idx] - pos[0]) + np.abs(self._ys[idx] - pos[1])
+        k = int(np.argmin(d))
+        return self._flat_pos(idx[k]), int(d[k])
+
+    def cost_at(self, pos):
+        x, y = pos
+        kind = self.kind[y, x]
+        if kind == WALL: return 10
+        if kind == DOOR: return 2
+        if self.fire[y, x] > 0: return 3
+        return 1
+
+    def move_costs(self):
+        # Costo de entrar a cada celda (mismo modelo que A*), lista plana.
+        # Se recalcula solo cuando cambia alguna celda.
+        if self._costs is None:
+            cost = np.ones(self.kind.shape, dtype=np.int16)
+            cost[self.fire > 0] = 3
+            cost[self.kind == DOOR] = 2
+            cost[self.kind == WALL] = 10
+            self._costs = cost.ravel().tolist()
+        return self._costs
+
+    def get_path_astar(self, start, end):
+        if start == end: return [start]
+        w = self.width
+        cost = self.move_costs()
+        adjacent = self.map.adjacent
+        ex, ey = end
+        frontier = [(0, start)]
+        came_from = {start: None}
+        cost_so_far = {start: 0}
+
+        while frontier:
+            _, current = heapq.heappop(frontier)
+            if current == end:
+                break
+            base = cost_so_far[current]
+            for next_pos in adjacent[current]:
+                nx, ny = next_pos
+                new_cost = base + cost[ny * w + nx]
+                if next_pos not in cost_so_far or new_cost < cost_so_far[next_pos]:
+                    cost_so_far[next_pos] = new_cost
+                    heapq.heappush(frontier, (new_cost + abs(ex - nx) + abs(ey - ny), next_pos))
+                    came_from[next_pos] = current
+
+        if metrics.ENABLED:
+            metrics.inc(metrics.ASTAR_CALLS, model=type(self).__name__)
+            metrics.inc(metrics.ASTAR_NODES, len(came_from), model=type(self).__name__)
+        if end not in came_from:
+            return None
+        path = []
+        curr = end
+        while curr is not None:
+            path.append(curr)
+            curr = came_from[curr]
+        return path[::-1]
+
+    def nearest_outside(self, pos):
+        return self._nearest_flat(self.kind == OUTSIDE, pos)[0]
+
+    # --- SNAPSHOT ---
+
+    def _grid_snapshot(self):
+        return (TYPE_ASCII[self.kind].tobytes(), self.fire.tobytes(),
+                self.smoke.tobytes(), self.damage.astype(np.uint8).tobytes())
+
+    def _load_grid(self, kind, fire, smoke, damage):
+        shape = self.kind.shape
+        self.kind[:] = ASCII_TYPE[np.frombuffer(kind, dtype=np.uint8)].reshape(shape)
+        self.fire[:] = np.frombuffer(fire, dtype=np.uint8).reshape(shape)
+        self.smoke[:] = np.frombuffer(smoke, dtype=np.uint8).reshape(shape)
+        self.damage[:] = np.frombuffer(damage, dtype=np.uint8).reshape(shape)
+        self.poi[:] = False
+        self._costs = None
+        return [self._flat_pos(i) for i in np.flatnonzero((self.fire > 0) | (self.smoke > 0))]
+
+    def _fork_board(self, source):
+        self.grid = blank_grid(source.grid)
+        for name in ("kind", "fire", "smoke", "damage", "poi"):
+            setattr(self, name, getattr(source, name).copy())
+        self._costs = None
+
+    # --- SERIALIZACIÓN ---
+
+    def state_grid(self):
+        state = self.kind.copy()
+        state[self.smoke > 0] = SMOKE_STATE
+        state[self.fire > 0] = FIRE_STATE
+        return state
+
+    def state_planes(self):
+        return (self.state_grid().astype(np.uint8).tobytes(),
+                np.minimum(self.damage, 255).astype(np.uint8).tobytes())
+
+    def cell_json(self, p):
+        x, y = p
+        st = int(self.kind[y, x])
+        if self.smoke[y, x]: st = SMOKE_STATE
+        if self.fire[y, x]: st = FIRE_STATE
+        return {"x": x, "y": y, "state": st, "damage": int(self.damage[y, x])}
+
+    def cells_json(self):
+        return [{"x": x, "y": y, "state": s, "damage": d}
+                for x, y, s, d in zip(self._xs_list, self._ys_list,
+                                      self.state_grid().ravel().tolist(),
+                                      self.damage.ravel().tolist())]
@@ -0,0 +1,292 @@
+# maps.py - Mapas cargables (archivo JSON o generados) compilados una sola vez
+# Un mapa es una lista de filas con F=Fuera, M=Muro, C=Celda, D=Puerta, más
+# las posiciones de salida de los bomberos (spawns) y los puntos de entrega
+# de víctimas (entry_points, la ambulancia). Se valida y se compila a
+# arreglos y tablas de vecinos una vez por proceso; /init y /reset solo
+# copian lo que la partida modifica.
+#
+#   {"name": "bodega", "layout": ["FFFF...", ...],
+#    "spawns": [[0, 4], [0, 5]], "entry_points": [[1, 5]]}
+#
+# /init {"map": "bodega"} busca maps/bodega.json (o FLASHPOINT_MAPS_DIR);
+# {"map": "gen:500x500"} o "gen:500x500:7" genera un edificio de ese tamaño.
+#
+#   python maps.py generate 120 80 --seed 3 > maps/grande.json
+#   python maps.py check maps/grande.json
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from collections import OrderedDict
+
+from pathing import DIRS, neighbor_table
+
+TILE_TYPES = "FMCD"  # Código 0..3 = "state" que se manda a Unity
+WALKABLE = "FCD"     # Donde puede aparecer o entregar un bombero
+MAX_SIDE = 1024
+MAX_CACHED = 8
+
+DEFAULT_LAYOUT = (
+    "FFFFFFFFFFFFFFFFFFFF",
+    "FMMMMMMMMMMMMDMMMMMF",
+    "FMCCCCCDCCCMCCCCCCMF",
+    "FMCCCCCMCCCDCCCCCCMF",
+    "FMCCCMMMMMMMMMMMMDMF",
+    "FDCCCMCCCCCCCCCDCCMF",
+    "FMCCCMCCCCCCCCCMCCMF",
+    "FMMMMMMMMDMMMMMMMMMF",
+    "FMCCCCCCCCCDCCCDCCMF",
+    "FMCCCCCCCCCMCCCMCCMF",
+    "FMMMMDMMMMMMMMMMMMMF",
+    "FFFFFFFFFFFFFFFFFFFF",
+)
+DEFAULT_SPAWNS = ((0, 4), (0, 5), (0, 6), (13, 0), (14, 0), (15, 0))
+DEFAULT_ENTRY_POINTS = ((1, 5),)
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+_GENERATED = re.compile(r"^gen:(\d+)x(\d+)(?::(\d+))?$")
+
+
+class MapError(ValueError):
+    pass
+
+
+class CompiledMap:
+    """Mapa validado y sus datos derivados (solo lectura, compartidos)."""
+
+    def __init__(self, name, layout, spawns, entry_points):
+        self.name = name
+        self.layout = tuple(layout)
+        self.height = len(self.layout)
+        self.width = len(self.layout[0]) if self.layout else 0
+        self.spawns = tuple(tuple(p) for p in spawns)
+        self.entry_points = tuple(tuple(p) for p in entry_points)
+        validate(self)
+        # Fila por fila: código de tipo de cada celda (índice plano y * ancho + x)
+        flat = "".join(self.layout)
+        self.codes = flat.encode().translate(_CODE_TABLE)
+        self.outside = tuple((i % self.width, i // self.width)
+                             for i, ch in enumerate(flat) if ch == "F")
+        self.walls = tuple((i % self.width, i // self.width)
+                           for i, ch in enumerate(flat) if ch == "M")
+        self._neighbors = None
+        self._around = None
+        self._adjacent = None
+        self._arrays = None
+        self._coords = None
+
+    @property
+    def neighbors(self):
+        # Tabla de adyacencia (orden de pathing.DIRS), se construye al primer uso
+        if self._neighbors is None:
+            self._neighbors = neighbor_table(self.width, self.height)
+        return self._neighbors
+
+    @property
+    def around(self):
+        # Posición -> (ella misma, sus 4 vecinos en orden de DIRS; None fuera
+        # del mapa). Las acciones de serverR leen estas 5 celdas en una pasada.
+        if self._around is None:
+            w, h = self.width, self.height
+            self._around = {
+                (x, y): ((x, y),) + tuple((x + dx, y + dy) if 0 <= x + dx < w and 0 <= y + dy < h
+                                          else None for dx, dy in DIRS)
+                for x in range(w) for y in range(h)}
+        return self._around
+
+    @property
+    def adjacent(self):
+        # Posición -> vecinos dentro del mapa en orden de DIRS (A*, explosiones)
+        if self._adjacent is None:
+            self._adjacent = {pos: tuple(p for p in near[1:] if p is not None)
+                              for pos, near in self.around.items()}
+        return self._adjacent
+
+    def arrays(self):
+        # (tipos [y, x], xs, ys) en NumPy para el motor de arreglos
+        if self._arrays is None:
+            import numpy as np
+            kind = np.frombuffer(self.codes, dtype=np.uint8).reshape(self.height, self.width)
+            kind.flags.writeable = False
+            ys, xs = np.divmod(np.arange(self.width * self.height), self.width)
+            self._arrays = (kind, xs, ys)
+        return self._arrays
+
+    def coords(self):
+        # Listas (xs, ys) de cada índice plano, para serializar sin NumPy
+        if self._coords is None:
+            _, xs, ys = self.arrays()
+            self._coords = (xs.tolist(), ys.tolist())
+        return self._coords
+
+    def to_json(self):
+        return {"name": self.name, "layout": list(self.layout),
+                "spawns": [list(p) for p in self.spawns],
+                "entry_points": [list(p) for p in self.entry_points]}
+
+
+_CODE_TABLE = bytes.maketrans(TILE_TYPES.encode(), bytes(range(len(TILE_TYPES))))
+
+
+def validate(m):
+    if not m.layout or not m.width:
+        raise MapError("el mapa está vacío")
+    if m.width > MAX_SIDE or m.height > MAX_SIDE:
+        raise MapError(f"mapa de {m.width}x{m.height}, máximo {MAX_SIDE} por lado")
+    for y, row in enumerate(m.layout):
+        if len(row) != m.width:
+            raise MapError(f"la fila {y} mide {len(row)}, se esperaba {m.width}")
+        bad = set(row) - set(TILE_TYPES)
+        if bad:
+            raise MapError(f"caracteres desconocidos en la fila {y}: {''.join(sorted(bad))}")
+    if not any("C" in row for row in m.layout):
+        raise MapError("el mapa no tiene celdas C")
+    for label, points in (("spawns", m.spawns), ("entry_points", m.entry_points)):
+        if not points:
+            raise MapError(f"faltan {label}")
+        for x, y in points:
+            if not (0 <= x < m.width and 0 <= y < m.height):
+                raise MapError(f"{label}: ({x}, {y}) fuera del mapa")
+            if m.layout[y][x] not in WALKABLE:
+                raise MapError(f"{label}: ({x}, {y}) cae en un muro")
+    if len(set(m.spawns)) != len(m.spawns):
+        raise MapError("spawns repetidos")
+
+
+# --- CARGA ---
+
+def maps_dir():
+    return os.environ.get("FLASHPOINT_MAPS_DIR",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps"))
+
+
+def from_json(data, name=None):
+    try:
+        return CompiledMap(data.get("name", name), data["layout"],
+                           data.get("spawns", ()), data.get("entry_points", ()))
+    except (KeyError, TypeError) as e:
+        raise MapError(f"formato de mapa inválido: {e}") from None
+
+
+def load_map_file(path):
+    with open(path) as f:
+        return from_json(json.load(f), os.path.splitext(os.path.basename(path))[0])
+
+
+_cache = OrderedDict()  # llave -> CompiledMap
+
+
+def _cached(key, build):
+    m = _cache.get(key)
+    if m is None:
+        m = build()
+        _cache[key] = m
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return m
+
+
+def load_map(spec=None):
+    """None/"default", "gen:WxH[:semilla]" o el nombre de un archivo en maps/."""
+    if spec is None or spec == "default":
+        return _cached("default", lambda: CompiledMap(
+            "default", DEFAULT_LAYOUT, DEFAULT_SPAWNS, DEFAULT_ENTRY_POINTS))
+    spec = str(spec)
+    gen = _GENERATED.match(spec)
+    if gen:
+        w, h, seed = int(gen.group(1)), int(gen.group(2)), int(gen.group(3) or 0)
+        check_generated_size(w, h)  # Antes de armar la rejilla (y de guardarla en caché)
+        return _cached(spec, lambda: from_json(generate_map(w, h, seed=seed), spec))
+    if not _NAME.match(spec):
+        raise MapError(f"nombre de mapa inválido: {spec}")
+    path = os.path.join(maps_dir(), spec + ".json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        raise MapError(f"no existe el mapa: {spec}") from None
+    # Si el archivo cambia se vuelve a compilar
+    return _cached((spec, mtime), lambda: load_map_file(path))
+
+
+# --- GENERADOR ---
+
+def check_generated_size(width, height):
+    if width < 7 or height < 7:
+        raise MapError("el mapa generado debe medir al menos 7x7")
+    if width > MAX_SIDE or height > MAX_SIDE:
+        raise MapError(f"mapa de {width}x{height}, máximo {MAX_SIDE} por lado")
+
+
+def generate_map(width, height, room=6, seed=0):
+    """Edificio de cuartos de ~room x room con una puerta entre cuartos vecinos,
+    rodeado de una franja exterior F. Para pruebas de escala."""
+    check_generated_size(width, height)
+    rng = random.Random(seed)
+    grid = [["F"] * width for _ in range(height)]
+    x0, y0, x1, y1 = 1, 1, width - 2, height - 2  # Contorno del edificio
+    for y in range(y0, y1 + 1):
+        for x in range(x0, x1 + 1):
+            grid[y][x] = "M" if x in (x0, x1) or y in (y0, y1) else "C"
+    # Muros interiores cada 'room' celdas
+    xs = list(range(x0 + room + 1, x1 - room // 2, room + 1))
+    ys = list(range(y0 + room + 1, y1 - room // 2, room + 1))
+    for x in xs:
+        for y in range(y0, y1 + 1):
+            grid[y][x] = "M"
+    for y in ys:
+        for x in range(x0, x1 + 1):
+            grid[y][x] = "M"
+    # Una puerta en cada tramo de muro entre dos cuartos
+    bx = [x0] + xs + [x1]
+    by = [y0] + ys + [y1]
+    for x in xs:
+        for a, b in zip(by, by[1:]):
+            grid[rng.randint(a + 1, b - 1)][x] = "D"
+    for y in ys:
+        for a, b in zip(bx, bx[1:]):
+            grid[y][rng.randint(a + 1, b - 1)] = "D"
+    # Puertas al exterior: una por lado; spawns afuera junto a ellas
+    doors = [(rng.randint(x0 + 1, x1 - 1), y0), (rng.randint(x0 + 1, x1 - 1), y1),
+             (x0, rng.randint(y0 + 1, y1 - 1)), (x1, rng.randint(y0 + 1, y1 - 1))]
+    for x, y in doors:
+        grid[y][x] = "D"
+    spawns = []
+    for (x, y), (dx, dy) in zip(doors, ((0, -1), (0, 1), (-1, 0), (1, 0))):
+        spawns.append((x + dx, y + dy))
+        spawns.append((x + dx + (dy != 0), y + dy + (dx != 0)))
+    return {"name": f"gen:{width}x{height}:{seed}",
+            "layout": ["".join(row) for row in grid],
+            "spawns": [list(p) for p in spawns[:6]],
+            "entry_points": [list(doors[2])]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera o valida mapas")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    gen = sub.add_parser("generate", help="imprime un mapa generado en JSON")
+    gen.add_argument("width", type=int)
+    gen.add_argument("height", type=int)
+    gen.add_argument("--room", type=int, default=6)
+    gen.add_argument("--seed", type=int, default=0)
+    chk = sub.add_parser("check", help="valida un archivo de mapa")
+    chk.add_argument("path")
+    args = parser.parse_args(argv)
+    try:
+        if args.cmd == "generate":
+            print(json.dumps(generate_map(args.width, args.height, args.room, args.seed)))
+        else:
+            m = load_map_file(args.path)
+            print(f"{m.name}: {m.width}x{m.height}, {len(m.spawns)} spawns, "
+                  f"{len(m.entry_points)} entry points")
+    except MapError as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
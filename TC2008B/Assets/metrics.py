@@ -0,0 +1,177 @@
+# metrics.py - Tiempos por fase y contadores del proceso, en texto de Prometheus
+# Los modelos miden cada fase de step() (turno del agente, humo, reaparición
+# de víctimas, condiciones de fin, commit) y cuentan llamadas y nodos de A*
+# y los nodos y reconstrucciones de los cachés de caminos (field / rooms);
+# las rutas miden su latencia, la serialización y las celdas enviadas.
+# GET /metrics regresa todo en el formato de texto de Prometheus.
+#
+# Apagado (por defecto fuera del servidor, FLASHPOINT_METRICS=0 en él) los
+# modelos solo revisan metrics.ENABLED una vez por step: no se toma ningún
+# tiempo ni se crea ningún objeto.
+
+import bisect
+import os
+import threading
+import time
+
+ENABLED = False
+
+# Límites superiores de las cubetas (segundos)
+LATENCY_BUCKETS = (0.000025, 0.0001, 0.00025, 0.001, 0.0025, 0.01, 0.025, 0.1, 0.25, 1.0, 2.5)
+
+STEP_PHASE = "flashpoint_step_phase_seconds"
+STEP = "flashpoint_step_seconds"
+REQUEST = "flashpoint_request_seconds"
+SERIALIZE = "flashpoint_serialize_seconds"
+ASTAR_CALLS = "flashpoint_astar_calls_total"
+ASTAR_NODES = "flashpoint_astar_nodes_total"
+PATH_NODES = "flashpoint_path_nodes_total"
+PATH_REBUILDS = "flashpoint_path_rebuilds_total"
+CELLS = "flashpoint_cells_serialized_total"
+QUEUE_WAIT = "flashpoint_queue_wait_seconds"
+REJECTED = "flashpoint_requests_rejected_total"
+STATE_CACHE = "flashpoint_state_cache_total"
+
+# nombre -> (tipo, ayuda)
+DEFINITIONS = {
+    STEP_PHASE: ("histogram", "Duración de cada fase de model.step()"),
+    STEP: ("histogram", "Duración de model.step() completo"),
+    REQUEST: ("histogram", "Latencia de las rutas HTTP"),
+    SERIALIZE: ("histogram", "Armado (build) y codificación (encode) del estado"),
+    ASTAR_CALLS: ("counter", "Llamadas a get_path_astar"),
+    ASTAR_NODES: ("counter", "Nodos alcanzados por A*"),
+    PATH_NODES: ("counter", "Nodos expandidos por el caché de caminos, por modo (field, rooms)"),
+    PATH_REBUILDS: ("counter", "Campos de distancia creados (field) o cuartos rehechos (rooms)"),
+    CELLS: ("counter", "Celdas enviadas en estados completos o deltas"),
+    QUEUE_WAIT: ("histogram", "Espera en la fila de la sesión antes del pool (asgi.py)"),
+    REJECTED: ("counter", "Peticiones rechazadas por límite o timeout (asgi.py)"),
+    STATE_CACHE: ("counter", "GET /state por resultado: hit, miss o not_modified (304)"),
+}
+
+
+def enabled_from_env(default="1"):
+    return os.environ.get("FLASHPOINT_METRICS", default) not in ("0", "false", "off")
+
+
+def set_enabled(flag):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # No acumuladas; se acumulan al exportar
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_histograms = {}  # (nombre, etiquetas) -> Histogram
+_counters = {}    # (nombre, etiquetas) -> número
+
+
+def _histogram(key):
+    # Llamar con _lock tomado
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = Histogram()
+    return hist
+
+
+def _observe(key, seconds):
+    with _lock:
+        _histogram(key).observe(seconds)
+
+
+def observe(name, seconds, **labels):
+    _observe((name, tuple(sorted(labels.items()))), seconds)
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+class Laps:
+    """Cronómetro de fases: lap(fase) mide desde la vuelta anterior, done()
+    mide el total y registra todo de una vez. Solo se crea cuando ENABLED."""
+    __slots__ = ("labels", "start", "last", "laps")
+
+    def __init__(self, **labels):
+        self.labels = tuple(sorted(labels.items()))
+        self.start = self.last = time.perf_counter()
+        self.laps = []
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.laps.append((phase, now - self.last))
+        self.last = now
+
+    def done(self):
+        total = time.perf_counter() - self.start
+        with _lock:
+            for phase, seconds in self.laps:
+                _histogram((STEP_PHASE, self.labels + (("phase", phase),))).observe(seconds)
+            _histogram((STEP, self.labels)).observe(total)
+
+
+# --- EXPORTACIÓN ---
+
+def _escape(value):
+    # Formato de texto de Prometheus: \\, \" y \n dentro de una etiqueta
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(items, extra=None):
+    items = list(items) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Texto de exposición de Prometheus (versión 0.0.4)."""
+    with _lock:
+        histograms = {k: (list(h.counts), h.sum, h.count, h.buckets) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    for name, (kind, help_text) in DEFINITIONS.items():
+        source = histograms if kind == "histogram" else counters
+        series = sorted((k for k in source if k[0] == name), key=lambda k: k[1])
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in series:
+            labels = key[1]
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(counters[key])}")
+                continue
+            counts, total, count, buckets = histograms[key]
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+# pathing.py - Campos de distancia (flow fields) para mover a los bomberos
+# Un campo guarda, para cada celda, el costo mínimo para llegar a un objetivo
+# con el mismo modelo de costos que A* (muro 10, puerta 2, fuego 3, resto 1).
+# Es un Dijkstra inverso desde el objetivo que se expande solo lo necesario
+# y se reanuda en la siguiente consulta; el siguiente paso de un agente se
+# lee mirando a sus 4 vecinos.
+
+import heapq
+from collections import OrderedDict
+
+INF = float("inf")
+DIRS = ((0, 1), (0, -1), (1, 0), (-1, 0))  # Mismo orden que A*
+MAX_FIELDS = 32
+FIELD_BUDGET = 2_000_000  # Celdas totales entre todos los campos guardados
+
+
+def neighbor_table(width, height):
+    # Vecinos de cada índice plano (y * width + x) en el orden de DIRS
+    table = []
+    for y in range(height):
+        for x in range(width):
+            row = []
+            for dx, dy in DIRS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    row.append(ny * width + nx)
+            table.append(row)
+    return table
+
+
+class DistanceField:
+    """Dijkstra inverso reanudable. Invariante: toda celda con distancia menor
+    a la cima del heap ya es definitiva."""
+
+    __slots__ = ("target", "dist", "closed", "heap")
+
+    def __init__(self, target, size):
+        self.target = target
+        self.dist = [INF] * size
+        self.closed = bytearray(size)
+        self.dist[target] = 0
+        self.heap = [(0, target)]
+
+    def settle(self, i, costs, neighbors):
+        # Expandir hasta que la distancia de i sea definitiva
+        dist, closed, heap = self.dist, self.closed, self.heap
+        pops = 0
+        while heap and (not closed[i] or heap[0][0] < dist[i]):
+            d, u = heapq.heappop(heap)
+            pops += 1
+            if d > dist[u]:
+                continue
+            closed[u] = 1
+            nd = d + costs[u]  # Entrar a u desde cualquier vecino
+            for v in neighbors[u]:
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return pops
+
+
+class DistanceFieldCache:
+    def __init__(self, model, max_fields=MAX_FIELDS):
+        self.model = model
+        self.w, self.h = model.width, model.height
+        self.size = self.w * self.h
+        # Tabla de vecinos compartida del mapa compilado, si el modelo lo tiene
+        game_map = getattr(model, "map", None)
+        self.neighbors = game_map.neighbors if game_map else neighbor_table(self.w, self.h)
+        # Copia propia de los costos; se actualiza celda por celda
+        self.costs = [model.cost_at((i % self.w, i // self.w)) for i in range(self.size)]
+        self.fields = OrderedDict()  # objetivo (índice plano) -> DistanceField
+        self.max_fields = max(2, min(max_fields, FIELD_BUDGET // self.size))
+        self.builds = self.drops = self.expanded = 0
+        self.reported = (0, 0)  # (expanded, builds) ya enviados a metrics
+
+    def field(self, target):
+        t = target[1] * self.w + target[0]
+        f = self.fields.get(t)
+        if f is None:
+            f = DistanceField(t, self.size)
+            self.builds += 1
+            self.fields[t] = f
+            if len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(t)
+        return f
+
+    def distance(self, pos, target):
+        f = self.field(target)
+        i = pos[1] * self.w + pos[0]
+        self.expanded += f.settle(i, self.costs, self.neighbors)
+        return f.dist[i]
+
+    def search_counts(self):
+        # (nodos expandidos, reconstrucciones) para metrics
+        return self.expanded, self.builds
+
+    def next_step(self, pos, target):
+        """Siguiente celda hacia target, o None si ya llegó / no hay camino."""
+        if pos == target:
+            return None
+        f = self.field(target)
+        i = pos[1] * self.w + pos[0]
+        self.expanded += f.settle(i, self.costs, self.neighbors)
+        dist, costs = f.dist, self.costs
+        best, best_j = INF, None
+        for j in self.neighbors[i]:
+            d = costs[j] + dist[j]
+            if d < best:
+                best, best_j = d, j
+        if best_j is None:
+            return None
+        return (best_j % self.w, best_j // self.w)
+
+    # --- INVALIDACIÓN ---
+
+    def on_cost_change(self, pos):
+        i = pos[1] * self.w + pos[0]
+        old, new = self.costs[i], self.model.cost_at(pos)
+        if old == new:
+            return
+        self.costs[i] = new
+        for t, f in list(self.fields.items()):
+            if not f.closed[i]:
+                continue  # Nadie se ha relajado a través de esta celda todavía
+            dist = f.dist
+            if new < old:
+                # Bajó el costo (puerta abierta, muro roto, fuego apagado): los
+                # vecinos que mejoran vuelven al heap y el resto se propaga
+                # en la siguiente consulta
+                through = new + dist[i]
+                for j in self.neighbors[i]:
+                    if through < dist[j]:
+                        dist[j] = through
+                        heapq.heappush(f.heap, (through, j))
+            elif any(dist[j] == old + dist[i] for j in self.neighbors[i]):
+                # Subió el costo de una celda que usa algún camino mínimo
+                del self.fields[t]
+                self.drops += 1
+
+
+def nearest_target(start, targets, costs, neighbors, width):
+    """Dijkstra desde start hasta el primer objetivo que sale del heap.
+    Regresa el camino [start, ..., objetivo] de menor costo o None."""
+    s = start[1] * width + start[0]
+    goals = {y * width + x for x, y in targets}
+    dist = {s: 0}
+    came_from = {s: None}
+    heap = [(0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if u in goals:
+            path = []
+            while u is not None:
+                path.append((u % width, u // width))
+                u = came_from[u]
+            return path[::-1]
+        for v in neighbors[u]:
+            nd = d + costs[v]
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                came_from[v] = u
+                heapq.heappush(heap, (nd, v))
+    return None
@@ -0,0 +1,71 @@
+# policies.py - Políticas de los bomberos sobre un solo motor de reglas
+# FireModel (y ArrayFireModel) aplican las reglas del turno: romper muros,
+# abrir puertas, apagar fuego/humo, moverse, recoger y entregar víctimas.
+# La política solo decide el siguiente paso de cada bombero, así la de roles,
+# la random y las que se agreguen corren en el mismo motor rápido y se
+# eligen por sesión (/init {"policy": "random"} o server.py).
+#
+# Una política nueva implementa choose(ff) y se agrega a POLICIES:
+#   choose(ff) -> (objetivo, siguiente celda, tipo de objetivo)
+# Objetivo None termina el turno sin bitácora; siguiente celda None también.
+# Si usa azar debe tomar model.random para que las semillas reproduzcan.
+
+
+class Policy:
+    name = None
+
+    def choose(self, ff):
+        raise NotImplementedError
+
+
+class RolePolicy(Policy):
+    """Apagador, rescatista y comodín (la estrategia de siempre)."""
+    name = "roles"
+
+    def choose(self, ff):
+        model = ff.model
+        if model.targeting == "cost":
+            # Objetivo y camino en una sola búsqueda por costo real
+            return model.plan_by_cost(ff)
+        target = None
+        target_type = "Nada"
+        if ff.carrying:
+            target = model.nearest_entry(ff.pos)
+            target_type = "SALIDA (Ambulancia)"
+        elif ff.role == "APAGADOR":
+            target = model.get_nearest_hazard(ff.pos)
+            target_type = "FUEGO/HUMO"
+            if target is None:
+                target = model.get_nearest_poi(ff.pos)
+                target_type = "VICTIMA (Fallback)"
+        elif ff.role == "RESCATISTA":
+            target = model.get_nearest_poi(ff.pos)
+            target_type = "VICTIMA"
+        elif ff.role == "COMODIN":
+            target = model.get_nearest_entity(ff.pos)
+            target_type = "VICTIMA/FUEGO/HUMO"
+        if target is None:
+            return None, None, target_type
+        # Solo importa el siguiente paso del camino
+        return target, model.next_step(ff.pos, target), target_type
+
+
+class RandomPolicy(Policy):
+    """Un paso a una celda vecina al azar; las reglas deciden qué pasa ahí
+    (abrir, romper, apagar o moverse)."""
+    name = "random"
+
+    def choose(self, ff):
+        model = ff.model
+        next_pos = model.random.choice(model.map.adjacent[ff.pos])
+        return next_pos, next_pos, "AZAR"
+
+
+POLICIES = {policy.name: policy() for policy in (RolePolicy, RandomPolicy)}
+
+
+def get_policy(name):
+    try:
+        return POLICIES[name]
+    except KeyError:
+        raise ValueError(f"política desconocida: {name}") from None
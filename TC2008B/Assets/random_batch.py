@@ -0,0 +1,317 @@
+# random_batch.py - Motor por lotes de la estrategia random (K partidas a la vez)
+# Mismas reglas que serverR.FlashPointModel, pero K partidas viven en
+# arreglos apilados (K, ancho+2, alto+2) y avanzan juntas un tick a la vez:
+# máscaras de acciones, elecciones al azar, humo/fuego y explosiones se
+# calculan con NumPy para todas las partidas en curso. El borde extra
+# (PAD) evita revisar límites al mirar vecinos.
+#
+# Las partidas no repiten la secuencia de serverR con la misma semilla (el
+# RNG es otro), pero siguen las mismas reglas y producen las mismas stats
+# por partida, así que sirven para estadística de la línea base random.
+#
+#   python random_batch.py --games 20000 --batch 2000 --seed 7 --json reporte.json
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from maps import load_map
+from random_rules import (AP_BREAK_WALL, AP_EXTINGUISH_FIRE, AP_EXTINGUISH_SMOKE, AP_MOVE,
+                          AP_MOVE_CARRYING, AP_OPEN_DOOR, AP_PICKUP_VICTIM, CELL, DOOR,
+                          DOOR_OPEN, FIRE, OUTSIDE, SMOKE, WALL)
+from tournament import DEFAULT_MAX_STEPS, Aggregate
+from tuning import MAX_DAMAGE, MAX_LOST, WIN_RESCUED
+
+PAD = 127  # Celda fuera del mapa: no coincide con ningún código
+TURN_AP = 4
+
+# Columnas de stats (mismas llaves y orden que FlashPointModel.stats)
+STAT_KEYS = ("victims_rescued", "victims_lost", "fires_extinguished", "smokes_removed",
+             "smokes_spawned", "explosions", "building_damage", "doors_opened", "walls_broken")
+(RESCUED, LOST, FIRES_EXTINGUISHED, SMOKES_REMOVED, SMOKES_SPAWNED, EXPLOSIONS,
+ BUILDING_DAMAGE, DOORS_OPENED, WALLS_BROKEN) = range(len(STAT_KEYS))
+
+# Acciones en el mismo orden que get_available_actions (sin WAIT)
+ACTIONS = ("MOVE", "EXTINGUISH_SMOKE", "EXTINGUISH_FIRE", "BREAK_WALL", "OPEN_DOOR",
+           "PICKUP_VICTIM", "DROP_VICTIM")
+MOVE, EXT_SMOKE, EXT_FIRE, BREAK, OPEN, PICKUP, DROP = range(len(ACTIONS))
+
+RESULTS = (None, "WIN", "LOSE COLLAPSADOS", "LOSE DEMASIADAS VICTIMAS")
+WALKABLE_CODES = (CELL, DOOR_OPEN, SMOKE, OUTSIDE)
+
+
+class BatchFlashPoint:
+    def __init__(self, games, num_agents=6, max_pois=3, seed=None, map_name=None):
+        self.games = games
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.map = load_map(map_name)
+        self.width, self.height = self.map.width, self.map.height
+        self.max_pois = max_pois
+        stride = self.height + 2
+        # Índice plano de (x, y) en el arreglo con borde: (x+1) * stride + (y+1)
+        self.offsets4 = np.array((1, -1, stride, -stride))  # Mismo orden que serverR
+        self.offsets5 = np.concatenate(([0], self.offsets4))
+
+        codes = np.frombuffer(self.map.codes, dtype=np.uint8).reshape(self.height, self.width)
+        board = np.full((self.width + 2, self.height + 2), PAD, dtype=np.int8)
+        board[1:-1, 1:-1] = codes.T
+        self.cells = np.repeat(board.reshape(1, -1), games, axis=0)
+        self.damage = np.zeros(self.cells.shape, dtype=np.int16)
+        self.pois = np.zeros(self.cells.shape, dtype=bool)
+        self.occupied = np.zeros(self.cells.shape, dtype=bool)
+
+        spawns = self.map.spawns[:num_agents]
+        self.num_agents = len(spawns)
+        start = np.array([(x + 1) * stride + (y + 1) for x, y in spawns])
+        self.pos = np.repeat(start.reshape(1, -1), games, axis=0)
+        self.carrying = np.zeros((games, self.num_agents), dtype=bool)
+        self.occupied[:, start] = True
+
+        self.stats = np.zeros((games, len(STAT_KEYS)), dtype=np.int32)
+        self.running = np.ones(games, dtype=bool)
+        self.result = np.zeros(games, dtype=np.int8)
+        self.steps = np.zeros(games, dtype=np.int32)
+        self.tick = 0
+
+        everyone = np.arange(games)
+        self._initial_fires(everyone, 3)
+        self._respawn_pois(everyone)
+
+    # --- ELECCIONES AL AZAR ---
+
+    def _pick(self, mask):
+        # Índice uniforme entre las columnas True de cada fila
+        return np.argmax(self.rng.random(mask.shape) * mask, axis=1)
+
+    def _initial_fires(self, games, count):
+        for _ in range(count):
+            candidates = self.cells[games] == CELL
+            has = candidates.any(axis=1)
+            g = games[has]
+            self.cells[g, self._pick(candidates[has])] = FIRE
+
+    def _respawn_pois(self, games):
+        # Celdas C sin víctima ni bombero, una víctima a la vez hasta el máximo
+        missing = self.max_pois - self.pois[games].sum(axis=1)
+        while True:
+            g = games[missing > 0]
+            if g.size == 0:
+                break
+            candidates = (self.cells[g] == CELL) & ~self.pois[g] & ~self.occupied[g]
+            has = candidates.any(axis=1)
+            self.pois[g[has], self._pick(candidates[has])] = True
+            missing[missing > 0] -= 1
+            missing[np.isin(games, g[~has])] = 0  # Sin lugar: se queda corto
+
+    # --- TURNO DEL AGENTE ---
+
+    def _turn(self, g, agent):
+        cells, stats = self.cells, self.stats
+        pos = self.pos[g, agent]
+        carrying = self.carrying[g, agent]
+        ap = np.full(g.size, TURN_AP)
+        active = np.ones(g.size, dtype=bool)
+        while active.any():
+            i = np.flatnonzero(active)
+            k, p = g[i], pos[i]
+            here = cells[k, p]
+
+            # Con víctima sobre el exterior: se entrega sin gastar AP
+            drop = carrying[i] & (here == OUTSIDE)
+            if drop.any():
+                carrying[i[drop]] = False
+                stats[k[drop], RESCUED] += 1
+                i, k, p, here = i[~drop], k[~drop], p[~drop], here[~drop]
+                if i.size == 0:
+                    continue
+
+            near4 = p[:, None] + self.offsets4
+            near5 = p[:, None] + self.offsets5
+            around = cells[k[:, None], near5]
+            neighbors = around[:, 1:]
+            moves = np.isin(neighbors, WALKABLE_CODES) & ~self.occupied[k[:, None], near4]
+            left = ap[i]
+            cost = np.where(carrying[i], AP_MOVE_CARRYING, AP_MOVE)
+            available = np.stack((
+                moves.any(axis=1) & (left >= cost),
+                (left >= AP_EXTINGUISH_SMOKE) & (around == SMOKE).any(axis=1),
+                (left >= AP_EXTINGUISH_FIRE) & (around == FIRE).any(axis=1),
+                (left >= AP_BREAK_WALL) & (neighbors == WALL).any(axis=1),
+                (left >= AP_OPEN_DOOR) & (neighbors == DOOR).any(axis=1),
+                (left >= AP_PICKUP_VICTIM) & ~carrying[i] & self.pois[k, p],
+                carrying[i] & (here == OUTSIDE),
+            ), axis=1)
+            stuck = ~available.any(axis=1)
+            active[i[stuck]] = False
+            action = self._pick(available)
+            action[stuck] = -1
+
+            sel = action == MOVE
+            if sel.any():
+                target = near4[sel, self._pick(moves[sel])]
+                self.occupied[k[sel], p[sel]] = False
+                self.occupied[k[sel], target] = True
+                pos[i[sel]] = target
+                ap[i[sel]] -= cost[sel]
+            for act, code, new, stat, spent in (
+                    (EXT_SMOKE, SMOKE, CELL, SMOKES_REMOVED, AP_EXTINGUISH_SMOKE),
+                    (EXT_FIRE, FIRE, SMOKE, FIRES_EXTINGUISHED, AP_EXTINGUISH_FIRE),
+                    (OPEN, DOOR, DOOR_OPEN, DOORS_OPENED, AP_OPEN_DOOR)):
+                sel = action == act
+                if sel.any():
+                    # Humo y fuego también en la celda propia; puertas solo vecinas
+                    if act == OPEN:
+                        target = near4[sel, self._pick(neighbors[sel] == code)]
+                    else:
+                        target = near5[sel, self._pick(around[sel] == code)]
+                    cells[k[sel], target] = new
+                    stats[k[sel], stat] += 1
+                    ap[i[sel]] -= spent
+            sel = action == BREAK
+            if sel.any():
+                kk = k[sel]
+                target = near4[sel, self._pick(neighbors[sel] == WALL)]
+                self.damage[kk, target] += 2
+                stats[kk, BUILDING_DAMAGE] += 2
+                ap[i[sel]] -= AP_BREAK_WALL
+                broken = self.damage[kk, target] >= 2
+                cells[kk[broken], target[broken]] = CELL
+                stats[kk[broken], WALLS_BROKEN] += 1
+            sel = action == PICKUP
+            if sel.any():
+                carrying[i[sel]] = True
+                self.pois[k[sel], p[sel]] = False
+                ap[i[sel]] -= AP_PICKUP_VICTIM
+            sel = action == DROP
+            if sel.any():
+                carrying[i[sel]] = False
+                stats[k[sel], RESCUED] += 1
+            active[i] &= ap[i] > 0
+        self.pos[g, agent] = pos
+        self.carrying[g, agent] = carrying
+
+    # --- DINÁMICA DEL FUEGO ---
+
+    def _spawn_smoke(self, g):
+        cells, stats = self.cells, self.stats
+        xs = self.rng.integers(1, self.width - 1, g.size)   # randint(1, ancho-2)
+        ys = self.rng.integers(1, self.height - 1, g.size)
+        p = (xs + 1) * (self.height + 2) + (ys + 1)
+        current = cells[g, p]
+        smoke, fire, cell = current == SMOKE, current == FIRE, current == CELL
+        cells[g[smoke], p[smoke]] = FIRE
+        cells[g[cell], p[cell]] = SMOKE
+        stats[g[smoke | cell], SMOKES_SPAWNED] += 1
+        if fire.any():
+            self._explode(g[fire], p[fire])
+
+    def _explode(self, k, p):
+        stats = self.stats
+        stats[k, EXPLOSIONS] += 1
+        near = p[:, None] + self.offsets4
+        kk = np.repeat(k, 4).reshape(near.shape)
+        codes = self.cells[kk, near]
+        wall = codes == WALL
+        self.damage[kk[wall], near[wall]] += 1
+        stats[k, BUILDING_DAMAGE] += wall.sum(axis=1)
+        broken = wall & (self.damage[kk, near] >= 2)
+        burn = ~wall & (codes != OUTSIDE) & (codes != PAD)
+        self.cells[kk[broken], near[broken]] = CELL
+        self.cells[kk[burn], near[burn]] = FIRE
+
+    def _check_end(self, g):
+        stats = self.stats[g]
+        result = np.select(
+            (stats[:, RESCUED] >= WIN_RESCUED, stats[:, BUILDING_DAMAGE] >= MAX_DAMAGE,
+             stats[:, LOST] >= MAX_LOST),
+            (1, 2, 3), 0)
+        over = result > 0
+        self.result[g[over]] = result[over]
+        self.running[g[over]] = False
+
+    # --- CICLO ---
+
+    def step(self):
+        """Un step de cada partida en curso (el mismo bombero en todas)."""
+        g = np.flatnonzero(self.running)
+        if g.size == 0:
+            return 0
+        self._turn(g, self.tick % self.num_agents)
+        self._spawn_smoke(g)
+        self._respawn_pois(g)
+        self._check_end(g)
+        self.steps[g] += 1
+        self.tick += 1
+        return g.size
+
+    def run(self, max_steps=DEFAULT_MAX_STEPS):
+        while self.tick < max_steps and self.step():
+            pass
+        return self
+
+    def game_result(self, index):
+        return RESULTS[self.result[index]]
+
+    def game_stats(self, index):
+        return {key: int(v) for key, v in zip(STAT_KEYS, self.stats[index])}
+
+
+def play_batch(games, seed=0, max_steps=DEFAULT_MAX_STEPS, first_index=0, **options):
+    """Juega un lote y regresa una fila por partida (formato de tournament.play_game)."""
+    start = time.perf_counter()
+    batch = BatchFlashPoint(games, seed=seed, **options).run(max_steps)
+    seconds = round((time.perf_counter() - start) / games, 6)
+    rows = []
+    for index in range(games):
+        result = batch.game_result(index)
+        rows.append({
+            "strategy": "random_batch", "game": first_index + index, "seed": seed,
+            "game_result": result or "TIMEOUT",
+            "win": result == "WIN",
+            "steps": int(batch.steps[index]),
+            "seconds": seconds,  # Tiempo del lote repartido entre sus partidas
+            "stats": batch.game_stats(index),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partidas random por lotes con NumPy")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=2000, help="partidas por lote")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--agents", type=int, default=6)
+    parser.add_argument("--max-pois", type=int, default=3)
+    parser.add_argument("--map", default=None)
+    parser.add_argument("--json", help="archivo JSON con el reporte agregado")
+    args = parser.parse_args(argv)
+
+    aggregate = Aggregate()
+    start = time.perf_counter()
+    done = 0
+    while done < args.games:
+        size = min(args.batch, args.games - done)
+        # Semilla distinta por lote, derivada de la base
+        for row in play_batch(size, seed=[args.seed, done], max_steps=args.max_steps,
+                              first_index=done, num_agents=args.agents,
+                              max_pois=args.max_pois, map_name=args.map):
+            aggregate.add(row)
+        done += size
+    wall = time.perf_counter() - start
+    report = {"games": args.games, "batch": args.batch, "seed": args.seed,
+              "max_steps": args.max_steps, "wall_seconds": round(wall, 3),
+              "games_per_second": round(args.games / wall, 1) if wall else None,
+              "random_batch": aggregate.report()}
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
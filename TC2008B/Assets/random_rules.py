@@ -0,0 +1,23 @@
+# random_rules.py - Códigos de celda y costos de acción de la estrategia random
+# Viven aparte de serverR.py para que random_batch.py (solo NumPy) no tenga
+# que importar Mesa, que arrastra pandas y networkx al arrancar.
+
+# --- CONFIGURACIÓN ---
+OUTSIDE = 0
+WALL = 1
+CELL = 2
+DOOR = 3
+SMOKE = 4
+FIRE = 5
+POI = 6
+DOOR_OPEN = 8
+
+AP_MOVE = 1
+AP_MOVE_CARRYING = 2
+AP_EXTINGUISH_SMOKE = 1
+AP_EXTINGUISH_FIRE = 2
+AP_BREAK_WALL = 2
+AP_OPEN_DOOR = 1
+AP_PICKUP_VICTIM = 1
+
+MOVABLE = (CELL, DOOR_OPEN, SMOKE, OUTSIDE)  # Celdas a las que se puede mover un bombero
@@ -0,0 +1,192 @@
+# replay.py - Registro de cambios por step y reconstrucción de partidas
+# Con la semilla y los parámetros del modelo se reconstruye el estado
+# inicial; después se aplican los cambios registrados step por step (solo
+# celdas/agentes/POIs/stats que cambiaron). No se vuelve a ejecutar la lógica
+# de los agentes, así que ir al step N cuesta lo que cuesta aplicar N deltas,
+# y con checkpoints cada CHECKPOINT_EVERY steps ni eso.
+#
+#   python replay.py partida.jsonl --step 120          # estado en el step 120
+#   python replay.py partida.jsonl --verify            # compara con re-simular
+
+import argparse
+import copy
+import importlib
+import json
+import sys
+
+from state_delta import build_delta
+
+LOG_VERSION = 1
+CHECKPOINT_EVERY = 64
+
+
+def model_path(model):
+    cls = type(model)
+    return f"{cls.__module__}.{cls.__name__}"
+
+
+def build_from_header(header):
+    module, _, name = header["model"].rpartition(".")
+    cls = getattr(importlib.import_module(module), name)
+    return cls(seed=header["seed"], log_level="off", **header["params"])
+
+
+class GameRecorder:
+    """Log de solo agregar: un frame compacto por step."""
+
+    def __init__(self, model):
+        self.header = {
+            "version": LOG_VERSION,
+            "model": model_path(model),
+            "seed": model.seed,
+            "params": model.params,
+            "game_id": model.changes.game_id,
+        }
+        self.frames = []
+        self.last_step = model.steps
+        self._replay = None
+
+    def capture(self, model):
+        delta = build_delta(model, self.last_step)
+        self.last_step = model.steps
+        frame = {
+            "step": delta["step"],
+            "running": delta["running"],
+            "game_result": delta["game_result"],
+            "current_agent": delta["current_agent"],
+            "cells": [[c["x"], c["y"], c["state"], c["damage"]] for c in delta["cells"]],
+            "agents": delta["agents"],
+            "stats": delta["stats"],
+        }
+        if "pois" in delta:
+            frame["pois"] = [[p["x"], p["y"]] for p in delta["pois"]]
+        self.frames.append(frame)
+
+    def replay(self):
+        # Comparte la lista de frames: los steps nuevos quedan disponibles
+        if self._replay is None:
+            self._replay = Replay.from_recorder(self)
+        return self._replay
+
+    def lines(self):
+        yield json.dumps(self.header)
+        for frame in self.frames:
+            yield json.dumps(frame, default=int)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            for line in self.lines():
+                f.write(line + "\n")
+
+
+# --- REPRODUCCIÓN ---
+
+class _State:
+    # Estado indexado para aplicar deltas rápido
+    __slots__ = ("base", "cells", "agents", "pois", "stats")
+
+    def __init__(self, full):
+        self.base = {k: v for k, v in full.items() if k not in ("cells", "agents", "pois", "stats")}
+        self.cells = {(c["x"], c["y"]): c for c in full["cells"]}
+        self.agents = {a["id"]: a for a in full["agents"]}
+        self.pois = list(full["pois"])
+        self.stats = dict(full["stats"])
+
+    def apply(self, frame):
+        for x, y, state, damage in frame["cells"]:
+            self.cells[(x, y)] = {"x": x, "y": y, "state": state, "damage": damage}
+        for agent in frame["agents"]:
+            self.agents[agent["id"]] = agent
+        if "pois" in frame:
+            self.pois = [{"x": x, "y": y} for x, y in frame["pois"]]
+        self.stats.update(frame["stats"])
+        for key in ("step", "running", "game_result", "current_agent"):
+            self.base[key] = frame[key]
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def to_json(self):
+        state = dict(self.base)
+        state["cells"] = list(self.cells.values())
+        state["agents"] = list(self.agents.values())
+        state["pois"] = list(self.pois)
+        state["stats"] = dict(self.stats)
+        return state
+
+
+class Replay:
+    def __init__(self, header, frames, checkpoint_every=CHECKPOINT_EVERY):
+        self.header = header
+        self.frames = frames
+        self.checkpoint_every = checkpoint_every
+        initial = build_from_header(header).get_state_json()
+        self.first_step = initial["step"]
+        self.checkpoints = {self.first_step: _State(initial)}
+
+    @classmethod
+    def from_recorder(cls, recorder):
+        return cls(recorder.header, recorder.frames)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            header = json.loads(f.readline())
+            frames = [json.loads(line) for line in f if line.strip()]
+        return cls(header, frames)
+
+    @property
+    def last_step(self):
+        return self.first_step + len(self.frames)
+
+    def state_at(self, step):
+        if not self.first_step <= step <= self.last_step:
+            raise ValueError(f"step fuera de rango [{self.first_step}, {self.last_step}]")
+        # Checkpoint más cercano por debajo
+        base = max(s for s in self.checkpoints if s <= step)
+        state = self.checkpoints[base].copy()
+        for s in range(base + 1, step + 1):
+            state.apply(self.frames[s - self.first_step - 1])
+            if s % self.checkpoint_every == 0 and s not in self.checkpoints:
+                self.checkpoints[s] = state.copy()
+        return state.to_json()
+
+
+def normalized(state):
+    # Forma comparable de un estado (orden de celdas/agentes/POIs)
+    keys = ("step", "running", "game_result", "current_agent", "cells", "agents", "pois", "stats")
+    out = {k: state[k] for k in keys}
+    out["cells"] = sorted(state["cells"], key=lambda c: (c["x"], c["y"]))
+    out["agents"] = sorted(state["agents"], key=lambda a: a["id"])
+    out["pois"] = sorted(state["pois"], key=lambda p: (p["x"], p["y"]))
+    return json.loads(json.dumps(out, default=int))
+
+
+def verify(replay):
+    """Re-simula con la misma semilla y compara cada step con la reproducción."""
+    model = build_from_header(replay.header)
+    for step in range(replay.first_step, replay.last_step + 1):
+        if normalized(model.get_state_json()) != normalized(replay.state_at(step)):
+            return step
+        model.step()
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduce una partida registrada")
+    parser.add_argument("log", help="archivo JSONL guardado con GameRecorder.save o GET /history")
+    parser.add_argument("--step", type=int, help="step a reconstruir (por defecto el último)")
+    parser.add_argument("--verify", action="store_true", help="re-simular y comparar")
+    args = parser.parse_args(argv)
+
+    replay = Replay.load(args.log)
+    if args.verify:
+        bad = verify(replay)
+        print("OK" if bad is None else f"Diverge en el step {bad}")
+        sys.exit(0 if bad is None else 1)
+    step = replay.last_step if args.step is None else args.step
+    print(json.dumps(replay.state_at(step)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# rooms.py - Búsqueda jerárquica por cuartos para edificios grandes
+# Un cuarto es una región conexa de celdas C (o F, el exterior) rodeada de
+# muros M y puertas D. Cada muro y cada puerta es un portal: el grafo
+# abstracto va de portal a portal, pasando por dentro de un cuarto (costo
+# guardado en caché por cuarto) o directo entre portales vecinos. Con el
+# mismo modelo de costos que A* (muro 10, puerta 2, fuego 3, resto 1) da
+# caminos de costo mínimo: un camino de celdas siempre se parte en tramos
+# dentro de un solo cuarto entre dos portales.
+#
+# La búsqueda abstracta es A* con heurística Manhattan (cada paso cuesta al
+# menos 1); el camino de celdas se arma tramo por tramo conforme el bombero
+# avanza. Cuando se rompe un muro o se abre una puerta solo se rehacen los
+# cuartos que tocan esa celda; el fuego solo invalida el caché de su cuarto.
+#
+# Misma interfaz que pathing.DistanceFieldCache (costs, neighbors,
+# next_step, on_cost_change): FireModel(pathing="rooms").
+
+import heapq
+from collections import OrderedDict
+
+from pathing import INF, neighbor_table
+
+ROOM_COSTS = (1, 3)  # C o F, con o sin fuego: interior de un cuarto
+GOAL = -1            # Nodo abstracto del objetivo cuando está dentro de un cuarto
+MAX_ROUTES = 64
+
+
+class Route:
+    """Camino vigente hacia un objetivo. cells: celdas ya refinadas, al revés
+    (cells[-1] es la posición actual); legs: tramos pendientes (cuarto o
+    None si es directo, celda final), también al revés. Solo vale durante
+    el step en que se planeó: así el paso elegido depende solo del estado
+    de la partida y un fork o un snapshot juegan igual que el original."""
+
+    __slots__ = ("cells", "legs", "step")
+
+    def __init__(self, cells, legs, step):
+        self.cells = cells
+        self.legs = legs
+        self.step = step
+
+
+class RoomGraph:
+    def __init__(self, model):
+        self.model = model
+        self.w, self.h = model.width, model.height
+        self.size = self.w * self.h
+        game_map = getattr(model, "map", None)
+        self.neighbors = game_map.neighbors if game_map else neighbor_table(self.w, self.h)
+        self.costs = [model.cost_at((i % self.w, i // self.w)) for i in range(self.size)]
+        self.room = [-1] * self.size  # Cuarto de cada celda (-1 = portal)
+        self.cells = {}               # cuarto -> sus celdas
+        self.intra = {}               # cuarto -> {portal: {portal: costo}}
+        self.routes = OrderedDict()   # objetivo (índice plano) -> Route
+        self._next_room = 0
+        self.rebuilds = self.expanded = 0
+        self.reported = (0, 0)  # (expanded, rebuilds) ya enviados a metrics
+        self._flood(range(self.size))
+
+    # --- CUARTOS ---
+
+    def _flood(self, seeds):
+        room, costs, neighbors = self.room, self.costs, self.neighbors
+        for s in seeds:
+            if room[s] >= 0 or costs[s] not in ROOM_COSTS:
+                continue
+            r = self._next_room
+            self._next_room += 1
+            room[s] = r
+            members = [s]
+            for u in members:  # BFS: la lista crece mientras se recorre
+                for v in neighbors[u]:
+                    if room[v] < 0 and costs[v] in ROOM_COSTS:
+                        room[v] = r
+                        members.append(v)
+            self.cells[r] = members
+
+    def _rebuild(self, i):
+        # Rehacer solo los cuartos que tocan la celda i
+        room = self.room
+        touched = {room[j] for j in (i, *self.neighbors[i]) if room[j] >= 0}
+        seeds = [i]
+        for r in touched:
+            members = self.cells.pop(r)
+            self.intra.pop(r, None)
+            for c in members:
+                room[c] = -1
+            seeds.extend(members)
+        self._flood(seeds)
+        self.rebuilds += 1
+
+    def rooms_of(self, p):
+        # Cuartos vecinos de un portal (en orden de DIRS) -> cuántas celdas
+        # del cuarto tocan al portal
+        room = self.room
+        found = {}
+        for c in self.neighbors[p]:
+            r = room[c]
+            if r >= 0:
+                found[r] = found.get(r, 0) + 1
+        return found
+
+    # --- BÚSQUEDAS DENTRO DE UN CUARTO ---
+
+    def _search(self, r, seeds, goals=None):
+        """Dijkstra dentro del cuarto r desde {celda: costo}. Con goals se
+        detiene en la primera meta y regresa (dist, came_from, meta)."""
+        room, costs, neighbors = self.room, self.costs, self.neighbors
+        dist = dict(seeds)
+        came = dict.fromkeys(seeds)
+        heap = [(d, c) for c, d in seeds.items()]
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if goals is not None and u in goals:
+                return dist, came, u
+            for v in neighbors[u]:
+                if room[v] == r:
+                    nd = d + costs[v]
+                    if nd < dist.get(v, INF):
+                        dist[v] = nd
+                        came[v] = u
+                        heapq.heappush(heap, (nd, v))
+        return dist, came, None
+
+    def _row(self, r, p):
+        # Costo de ir del portal p a cada portal del cuarto r por dentro
+        # (sin contar la entrada al portal destino: los portales cambian de
+        # costo sin invalidar nada)
+        rows = self.intra.setdefault(r, {})
+        row = rows.get(p)
+        if row is None:
+            room, costs, neighbors = self.room, self.costs, self.neighbors
+            dist, _, _ = self._search(r, {c: costs[c] for c in neighbors[p] if room[c] == r})
+            row = {}
+            for c, d in dist.items():
+                for q in neighbors[c]:
+                    if room[q] < 0 and q != p and d < row.get(q, INF):
+                        row[q] = d
+            rows[p] = row
+        return row
+
+    def _exits(self, t):
+        # Portal -> costo de llegar de él a t (t dentro de un cuarto), con un
+        # Dijkstra inverso dentro del cuarto de t
+        room, costs, neighbors = self.room, self.costs, self.neighbors
+        r = room[t]
+        dist = {t: 0}
+        heap = [(0, t)]
+        exits = {}
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            through = d + costs[v]  # Entrar a v desde un vecino
+            for u in neighbors[v]:
+                if room[u] == r:
+                    if through < dist.get(u, INF):
+                        dist[u] = through
+                        heapq.heappush(heap, (through, u))
+                elif room[u] < 0 and through < exits.get(u, INF):
+                    exits[u] = through
+        return exits
+
+    # --- GRAFO ABSTRACTO ---
+
+    def _plan(self, s, t):
+        """Tramos de s a t (al revés, ver Route) o None si no hay camino."""
+        room, costs, neighbors, w = self.room, self.costs, self.neighbors, self.w
+        tx, ty = t % w, t // w
+        goal = t if room[t] < 0 else GOAL
+        exits = self._exits(t) if goal == GOAL else {}
+        g, came, heap = {}, {}, []
+        g_get, push, row = g.get, heapq.heappush, self._row
+
+        def relax(node, d, prev, via):
+            if d < g.get(node, INF):
+                g[node] = d
+                came[node] = (prev, via)
+                h = 0 if node == GOAL else abs(node % w - tx) + abs(node // w - ty)
+                push(heap, (d + h, d, node))
+
+        if room[s] >= 0:
+            # Salir del cuarto de s: un Dijkstra local a todos sus portales
+            r = room[s]
+            dist, _, _ = self._search(r, {s: 0})
+            for c, d in dist.items():
+                if c == t:
+                    relax(GOAL, d, s, r)
+                for q in neighbors[c]:
+                    if room[q] < 0:
+                        relax(q, d + costs[q], s, r)
+        else:
+            g[s] = 0
+            came[s] = None
+            heap.append((0, 0, s))
+
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if d > g[u]:
+                continue
+            if u == goal:
+                break
+            self.expanded += 1
+            for q in neighbors[u]:
+                if room[q] < 0:
+                    relax(q, d + costs[q], u, None)
+            via = came[u][1] if came[u] else None
+            for r, touching in self.rooms_of(u).items():
+                if r == via and touching == 1:
+                    # Se llegó a u desde su única celda en r: volver a r por
+                    # ella es un ciclo, r ya se relajó desde el portal anterior
+                    continue
+                # relax() en línea: aquí se va casi todo el tiempo de la búsqueda
+                for q, dq in row(r, u).items():
+                    nd = d + dq + costs[q]
+                    if nd < g_get(q, INF):
+                        g[q] = nd
+                        came[q] = (u, r)
+                        push(heap, (nd + abs(q % w - tx) + abs(q // w - ty), nd, q))
+            if u in exits:
+                relax(GOAL, d + exits[u], u, room[t])
+        else:
+            return None
+
+        legs = []
+        node = goal
+        while node != s:
+            prev, via = came[node]
+            legs.append((via, t if node == GOAL else node))
+            node = prev
+        return legs
+
+    def _refine(self, a, leg):
+        """Celdas del tramo desde a (sin incluir a), en orden."""
+        r, end = leg
+        if r is None:
+            return [end]
+        room, costs, neighbors = self.room, self.costs, self.neighbors
+        if room[a] == r:
+            seeds = {a: 0}
+        else:
+            seeds = {c: costs[c] for c in neighbors[a] if room[c] == r}
+        goals = {end} if room[end] == r else {c for c in neighbors[end] if room[c] == r}
+        _, came, c = self._search(r, seeds, goals)
+        cells = []
+        while c is not None and c != a:
+            cells.append(c)
+            c = came[c]
+        cells.reverse()
+        if room[end] < 0:
+            cells.append(end)
+        return cells
+
+    # --- CONSULTAS ---
+
+    def search_counts(self):
+        # (nodos expandidos, reconstrucciones) para metrics
+        return self.expanded, self.rebuilds
+
+    def path(self, start, end):
+        """Camino completo [start, ..., end] de costo mínimo, o None."""
+        s, t = start[1] * self.w + start[0], end[1] * self.w + end[0]
+        if s == t:
+            return [start]
+        legs = self._plan(s, t)
+        if legs is None:
+            return None
+        cells = [s]
+        while legs:
+            cells.extend(self._refine(cells[-1], legs.pop()))
+        return [(i % self.w, i // self.w) for i in cells]
+
+    def next_step(self, pos, target):
+        """Siguiente celda hacia target, o None si ya llegó / no hay camino."""
+        if pos == target:
+            return None
+        i, t = pos[1] * self.w + pos[0], target[1] * self.w + target[0]
+        step = self.model.steps
+        route = self.routes.get(t)
+        if route is not None and route.step != step:
+            route = None
+        if route is not None:
+            self.routes.move_to_end(t)
+            cells = route.cells
+            if len(cells) > 1 and cells[-2] == i:
+                cells.pop()  # Ya avanzó un paso sobre el camino
+            if cells[-1] != i:
+                route = None
+        if route is None:
+            legs = self._plan(i, t)
+            if legs is None:
+                return None
+            route = Route([i], legs, step)
+            self.routes[t] = route
+            if len(self.routes) > MAX_ROUTES:
+                self.routes.popitem(last=False)
+        if len(route.cells) == 1:
+            if not route.legs:
+                return None
+            # Refinar el siguiente tramo (solo cuando el bombero llega a él)
+            route.cells = self._refine(i, route.legs.pop())[::-1] + [i]
+        nxt = route.cells[-2]
+        return (nxt % self.w, nxt // self.w)
+
+    # --- INVALIDACIÓN ---
+
+    def on_cost_change(self, pos):
+        i = pos[1] * self.w + pos[0]
+        old, new = self.costs[i], self.model.cost_at(pos)
+        if old == new:
+            return
+        self.costs[i] = new
+        self.routes.clear()  # Los caminos guardados pueden dejar de ser mínimos
+        was_room, is_room = old in ROOM_COSTS, new in ROOM_COSTS
+        if was_room and is_room:
+            # Fuego dentro de un cuarto: cambian sus costos internos
+            self.intra.pop(self.room[i], None)
+        elif was_room or is_room:
+            # Muro roto, puerta abierta: el cuarto se une con sus vecinos
+            self._rebuild(i)
+        # Entre portales (puerta <-> muro) no hay nada guardado que cambie
@@ -0,0 +1,424 @@
+# routes.py - Rutas Flask compartidas por serverR.py y serverStrat.py
+# Cada petición se resuelve contra una sesión del SessionRegistry.
+
+import time
+
+from flask import Response, g, jsonify, request
+
+import metrics
+from batch import MAX_BATCH_STEPS, advance
+from sessions import DEFAULT_SESSION, SessionRegistry
+from snapshot import snapshot_size
+from state_binary import MIME, compress, encode_state, wants_binary, wants_gzip
+from state_delta import build_delta
+from stream import Autoplay, parse_rate
+
+
+def request_data():
+    # Unity manda Content-Type JSON con cuerpo vacío en /step
+    return request.get_json(silent=True) or {}
+
+
+def resolve_session_id(data):
+    # str(): un id numérico (o de otro tipo) en el JSON no truena el registro
+    return str(request.headers.get("X-Session-Id")
+               or request.args.get("session_id")
+               or data.get("session_id")
+               or DEFAULT_SESSION)
+
+
+def delta_since(data):
+    # ?since=N o {"since": N}: el cliente ya tiene el estado del step N
+    since = request.args.get("since", data.get("since"))
+    if since is None:
+        return None
+    try:
+        return int(since)
+    except (TypeError, ValueError):
+        raise ValueError("since debe ser un entero") from None
+
+
+def since_error(data):
+    # Validar since antes de tocar la partida: después ya avanzó
+    try:
+        delta_since(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return None
+
+
+def binary_requested():
+    return wants_binary(request.args.get("format"), request.headers.get("Accept"))
+
+
+def session_state(session, data=None):
+    start = time.perf_counter() if metrics.ENABLED else None
+    data = data or {}
+    since = delta_since(data)
+    # En binario las celdas salen de model.state_planes(), no de dicts
+    with_cells = not binary_requested()
+    if since is not None or data.get("delta"):
+        game_id = request.args.get("game_id", data.get("game_id"))
+        state = build_delta(session.model, since, game_id, with_cells)
+    else:
+        state = session.model.get_state_json(with_cells)
+        state["game_id"] = session.model.changes.game_id
+    state["session_id"] = session.id
+    if start is not None:
+        metrics.observe(metrics.SERIALIZE, time.perf_counter() - start, stage="build")
+    return state
+
+
+def cell_count(state, model=None):
+    # Sin lista de celdas el binario manda los planos completos del modelo
+    if state.get("cells") is not None:
+        return len(state["cells"])
+    return model.width * model.height if model is not None else 0
+
+
+def respond(state, model=None):
+    # JSON por defecto; binario con ?format=binary o Accept (state_binary.py)
+    start = time.perf_counter() if metrics.ENABLED else None
+    binary = binary_requested()
+    if binary:
+        response = Response(encode_state(state, model), mimetype=MIME)
+    else:
+        response = jsonify(state)
+    if wants_gzip(request.args.get("compress"), request.headers.get("Accept-Encoding"), binary):
+        response.set_data(compress(response.get_data()))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if start is not None:
+        fmt = "binary" if binary else "json"
+        metrics.observe(metrics.SERIALIZE, time.perf_counter() - start, stage="encode", format=fmt)
+        metrics.inc(metrics.CELLS, cell_count(state, model), format=fmt)
+    return response
+
+
+def state_etag(model, binary, gzip):
+    # El estado solo cambia con un step o al cambiar de partida (reset/restore)
+    return f"{model.changes.game_id}-{model.steps}-{'b' if binary else 'j'}{'z' if gzip else ''}"
+
+
+def cached_response(etag, body, mimetype, encoding):
+    response = Response(body, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # Revalidar siempre con If-None-Match
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    return response
+
+
+def register_routes(app, build_model, registry=None, on_init=None, on_reset=None):
+    """build_model(params) -> modelo nuevo; params es el JSON de /init."""
+    if registry is None:  # Un registro vacío es falso (__len__)
+        registry = SessionRegistry.from_env()
+    app.config["SESSIONS"] = registry
+    metrics.set_enabled(metrics.enabled_from_env())
+
+    @app.before_request
+    def start_timer():
+        if metrics.ENABLED:
+            g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.observe(metrics.REQUEST, time.perf_counter() - start,
+                            route=rule, method=request.method, status=response.status_code)
+        return response
+
+    def lookup(data):
+        error = since_error(data)
+        if error:
+            return None, error
+        session = registry.get(resolve_session_id(data))
+        if session is None:
+            return None, (jsonify({"error": "Init first"}), 400)
+        return session, None
+
+    @app.route('/init', methods=['POST'])
+    def init():
+        data = request_data()
+        error = since_error(data)
+        if error: return error
+        if data.get("new_session"):
+            session_id = registry.new_id()
+        else:
+            session_id = resolve_session_id(data)
+        params = {k: v for k, v in data.items() if k not in ("session_id", "new_session")}
+        try:
+            model = build_model(params)
+        except (ValueError, TypeError) as e:  # Mapa inválido o campo de otro tipo
+            return jsonify({"error": str(e)}), 400
+        session = registry.put(session_id, model, params)
+        if on_init: on_init(session)
+        with session.lock:
+            return respond(session_state(session), session.model)
+
+    @app.route('/step', methods=['POST'])
+    def step_route():
+        data = request_data()
+        session, error = lookup(data)
+        if error: return error
+        with session.lock:
+            session.model.step()
+            response = respond(session_state(session, data), session.model)
+        registry.account(session)  # Fuera del candado: puede cerrar otras sesiones
+        return response
+
+    @app.route('/state', methods=['GET'])
+    def state_route():
+        # Estado actual sin avanzar. Se serializa una vez por step y formato;
+        # con If-None-Match igual al ETag responde 304 sin cuerpo.
+        session, error = lookup({})
+        if error: return error
+        binary = binary_requested()
+        gzip = wants_gzip(request.args.get("compress"), request.headers.get("Accept-Encoding"), binary)
+        with session.lock:
+            etag = state_etag(session.model, binary, gzip)
+            if request.if_none_match.contains(etag):
+                if metrics.ENABLED: metrics.inc(metrics.STATE_CACHE, result="not_modified")
+                return with_etag(Response(status=304), etag)
+            cached = session.state_cache.get((binary, gzip))
+            if cached is None or cached[0] != etag:
+                response = respond(session_state(session), session.model)
+                cached = (etag, response.get_data(), response.mimetype,
+                          response.headers.get("Content-Encoding"))
+                session.state_cache[(binary, gzip)] = cached
+                if metrics.ENABLED: metrics.inc(metrics.STATE_CACHE, result="miss")
+            elif metrics.ENABLED:
+                metrics.inc(metrics.STATE_CACHE, result="hit")
+        registry.account(session)
+        return cached_response(*cached)
+
+    @app.route('/run', methods=['POST'])
+    def run_route():
+        # {"steps": N} | {"until": "round"} | {"until": "end"}, opcional "timeline": true
+        data = request_data()
+        session, error = lookup(data)
+        if error: return error
+        with session.lock:
+            try:
+                advanced, timeline = advance(
+                    session.model,
+                    steps=data.get("steps", request.args.get("steps", 1)),
+                    until=data.get("until", request.args.get("until", "steps")),
+                    timeline=bool(data.get("timeline")),
+                )
+            except (ValueError, TypeError) as e:  # p. ej. "steps": [1]
+                return jsonify({"error": str(e)}), 400
+            state = session_state(session, data)
+            state["advanced"] = advanced
+            if timeline is not None:
+                state["timeline"] = timeline
+            response = respond(state, session.model)
+        registry.account(session)
+        return response
+
+    @app.route('/reset', methods=['POST'])
+    def reset():
+        data = request_data()
+        error = since_error(data)
+        if error: return error
+        session_id = resolve_session_id(data)
+        old = registry.get(session_id)
+        params = dict(old.params) if old else {}
+        params.update({k: v for k, v in data.items() if k != "session_id"})
+        try:
+            model = build_model(params)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        session = registry.put(session_id, model, params)
+        if on_reset: on_reset(session)
+        with session.lock:
+            return respond(session_state(session), session.model)
+
+    @app.route('/snapshot', methods=['POST'])
+    def snapshot_route():
+        # {"name": "antes_explosion"} (por defecto el número de step)
+        data = request_data()
+        session, error = lookup(data)
+        if error: return error
+        with session.lock:
+            snap = session.model.snapshot()
+            name = str(data.get("name", snap["steps"]))
+            session.save_checkpoint(name, snap)
+        registry.account(session)
+        return jsonify({"session_id": session.id, "checkpoint": name,
+                        "step": snap["steps"], "bytes": snapshot_size(snap),
+                        "checkpoints": list(session.checkpoints)})
+
+    @app.route('/restore', methods=['POST'])
+    def restore_route():
+        data = request_data()
+        session, error = lookup(data)
+        if error: return error
+        with session.lock:
+            snap = session.checkpoints.get(str(data.get("checkpoint")))
+            if snap is None:
+                return jsonify({"error": "Unknown checkpoint"}), 404
+            session.model.restore(snap)
+            response = respond(session_state(session), session.model)
+        registry.account(session)
+        return response
+
+    @app.route('/fork', methods=['POST'])
+    def fork_route():
+        # Clona la sesión (o uno de sus checkpoints) en una sesión nueva:
+        # {"session_id": origen, "fork_id": destino opcional, "checkpoint": opcional}
+        data = request_data()
+        source, error = lookup(data)
+        if error: return error
+        with source.lock:
+            model = source.model.fork()
+            if "checkpoint" in data:
+                snap = source.checkpoints.get(str(data["checkpoint"]))
+                if snap is None:
+                    return jsonify({"error": "Unknown checkpoint"}), 404
+                model.restore(snap)
+            params = dict(source.params)
+        session = registry.put(str(data.get("fork_id") or registry.new_id()), model, params)
+        with session.lock:
+            state = session_state(session)
+            state["forked_from"] = source.id
+            return respond(state, session.model)
+
+    @app.route('/stream', methods=['GET'])
+    def stream_route():
+        # Server-Sent Events: ?rate=10 (ticks/s, 0 = lo más rápido posible),
+        # &delta=0 para estados completos, &steps_per_event=N, &paused=1.
+        # Al reconectar, Last-Event-ID (o ?since=N) evita reenviar el estado completo.
+        session, error = lookup({})
+        if error: return error
+        args = request.args
+        since = request.headers.get("Last-Event-ID", args.get("since"))
+        try:
+            autoplay = Autoplay(
+                session,
+                rate=parse_rate(args.get("rate")),
+                delta=args.get("delta", "1") != "0",
+                steps_per_event=int(args.get("steps_per_event", 1)),
+                since=None if since is None else int(since),
+                game_id=args.get("game_id"),
+                max_steps=min(int(args.get("max_steps", MAX_BATCH_STEPS)), MAX_BATCH_STEPS),
+                paused=args.get("paused") == "1",
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        with session.lock:
+            if session.stream:
+                session.stream.stop()  # Un solo stream por sesión
+            session.stream = autoplay
+
+        def generate():
+            try:
+                yield from autoplay.events()
+            finally:
+                autoplay.stop()
+                if session.stream is autoplay:
+                    session.stream = None
+
+        return Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.route('/stream/control', methods=['POST'])
+    def stream_control():
+        # {"action": "pause" | "resume" | "stop", "rate": N}
+        data = request_data()
+        session, error = lookup(data)
+        if error: return error
+        autoplay = session.stream
+        if autoplay is None:
+            return jsonify({"error": "No active stream"}), 404
+        action = data.get("action")
+        if action not in (None, "pause", "resume", "stop"):
+            return jsonify({"error": f"Unknown action: {action}"}), 400
+        try:
+            if "rate" in data:
+                autoplay.set_rate(parse_rate(data["rate"]))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        if action:
+            getattr(autoplay, action)()
+        return jsonify(dict(autoplay.info(), session_id=session.id, step=session.model.steps))
+
+    @app.route('/events', methods=['GET'])
+    def events_route():
+        # ?since=<seq>&limit=100&level=info&kind=explosion,victim_lost
+        session, error = lookup({})
+        if error: return error
+        args = request.args
+        try:
+            since, limit = int(args.get("since", 0)), int(args.get("limit", 100))
+        except ValueError:
+            return jsonify({"error": "since y limit deben ser enteros"}), 400
+        with session.lock:
+            log = session.model.events
+            try:
+                events = log.query(
+                    since=since,
+                    limit=min(limit, log.buffer.maxlen or 1000),
+                    level=args.get("level"),
+                    kind=args.get("kind"),
+                )
+            except KeyError as e:  # Nivel desconocido
+                return jsonify({"error": f"nivel desconocido: {e.args[0]}"}), 400
+            return jsonify({"session_id": session.id, "last_seq": log.seq,
+                            "level": log.level, "events": events})
+
+    @app.route('/history', methods=['GET'])
+    def history_route():
+        # Registro JSONL de la partida (requiere "record": true en /init)
+        session, error = lookup({})
+        if error: return error
+        with session.lock:
+            recorder = session.model.recorder
+            if recorder is None:
+                return jsonify({"error": "Recording disabled"}), 400
+            body = "\n".join(recorder.lines()) + "\n"
+        return app.response_class(body, mimetype="application/x-ndjson")
+
+    @app.route('/replay', methods=['GET'])
+    def replay_route():
+        # ?step=N: estado completo del step N reconstruido desde el registro
+        session, error = lookup({})
+        if error: return error
+        with session.lock:
+            recorder = session.model.recorder
+            if recorder is None:
+                return jsonify({"error": "Recording disabled"}), 400
+            replay = recorder.replay()
+            try:
+                state = replay.state_at(int(request.args.get("step", replay.last_step)))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        state["session_id"] = session.id
+        return respond(state)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_route():
+        # Texto de Prometheus (FLASHPOINT_METRICS=0 lo apaga)
+        if not metrics.ENABLED:
+            return jsonify({"error": "Metrics disabled"}), 404
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route('/sessions', methods=['GET'])
+    def list_sessions():
+        registry.sweep()
+        return jsonify(registry.stats())
+
+    @app.route('/sessions/<session_id>', methods=['DELETE'])
+    def close_session(session_id):
+        if not registry.remove(session_id):
+            return jsonify({"error": "Unknown session"}), 404
+        return jsonify({"closed": session_id})
+
+    return registry
@@ -0,0 +1,260 @@
+# selfcheck.py - Verificaciones de las propiedades en que se apoyan las optimizaciones
+# Cada una compara la versión rápida contra la forma directa de calcular lo
+# mismo; si alguna falla, un cambio rompió algo que las partidas con semilla,
+# los replays o los clientes delta dan por hecho.
+#
+#   python selfcheck.py                      # todas (~30 s)
+#   python selfcheck.py --only paths,delta --seeds 3
+#
+# Sale con código 1 si alguna falla.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from server import STRATEGIES, build_model, model_factory
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def expect(condition, message):
+    # No assert: con python -O desaparecería
+    if not condition:
+        raise CheckFailed(message)
+
+
+# --- REPLAY ---
+
+def check_replay(seeds):
+    """Una partida grabada se reproduce igual que re-simularla con la semilla."""
+    from replay import verify
+    for strategy in STRATEGIES:
+        for seed in range(seeds):
+            model = build_model({"strategy": strategy, "seed": seed, "record": True})
+            while model.running and model.steps < 400:
+                model.step()
+            bad = verify(model.recorder.replay())
+            expect(bad is None, f"{strategy} semilla {seed}: el replay diverge en el step {bad}")
+
+
+# --- ORDEN DEL RNG ---
+
+def check_cellpool(seeds):
+    """random.choice(CellPool) elige lo mismo que sobre la lista ordenada."""
+    from cellpool import CellPool
+    for seed in range(seeds):
+        rng = random.Random(seed)
+        size = rng.randrange(1, 3000)
+        flags = bytes(rng.random() < 0.3 for _ in range(size))
+        pool = CellPool(size, flags)
+        members = {i for i in range(size) if flags[i]}
+        pick_pool, pick_list = random.Random(seed), random.Random(seed)
+        for _ in range(2000):
+            i = rng.randrange(size)
+            if rng.random() < 0.5:
+                pool.add(i)
+                members.add(i)
+            else:
+                pool.discard(i)
+                members.discard(i)
+            expect(len(pool) == len(members), f"semilla {seed}: tamaño {len(pool)} != {len(members)}")
+            if members:
+                got, want = pick_pool.choice(pool), pick_list.choice(sorted(members))
+                expect(got == want, f"semilla {seed}: choice eligió {got}, la lista {want}")
+        expect(list(pool.copy()) == sorted(members), f"semilla {seed}: copy() perdió miembros")
+
+
+def check_spatial(seeds):
+    """SpatialIndex.nearest da lo mismo que min() sobre la lista en orden."""
+    from spatial import SpatialIndex
+    for seed in range(seeds):
+        rng = random.Random(seed)
+        w, h = rng.randrange(1, 120), rng.randrange(1, 120)
+        index = SpatialIndex(w, h)
+        items = {}
+        for order in range(600):
+            pos = (rng.randrange(w), rng.randrange(h))
+            if rng.random() < 0.3 and items:
+                gone = rng.choice(sorted(items))
+                index.discard(gone)
+                del items[gone]
+            elif pos not in items:
+                index.add(pos, order)
+                items[pos] = order
+            probe = (rng.randrange(w), rng.randrange(h))
+            got = index.nearest(probe)
+            if not items:
+                expect(got == (None, None), f"semilla {seed}: índice vacío regresó {got}")
+                continue
+            dist = lambda p: abs(p[0] - probe[0]) + abs(p[1] - probe[1])
+            want = min(sorted(items, key=items.get), key=dist)
+            expect(got == (want, dist(want)), f"semilla {seed}: nearest({probe}) = {got}, "
+                                              f"min() = {(want, dist(want))}")
+
+
+# --- CAMINOS ---
+
+def path_cost(model, path):
+    return sum(model.cost_at(p) for p in path[1:])
+
+
+def check_paths(seeds):
+    """Con muros rotos y fuego cambiando, "field" y "rooms" cuestan lo mismo que A*."""
+    from pathing import DistanceFieldCache
+    from serverStrat import FireModel
+    for map_name in (None, "gen:30x25:1", "gen:41x17:3"):
+        for seed in range(seeds):
+            model = FireModel(seed=seed, log_level="off", map_name=map_name, pathing="rooms")
+            rooms = model.field_cache()
+            fields = DistanceFieldCache(model)
+            rng = random.Random(seed)
+            for _ in range(60):
+                pos = (rng.randrange(model.width), rng.randrange(model.height))
+                tile = model.tiles[pos]
+                if tile.type == "C" and rng.random() < 0.4:
+                    tile.fire = 1 - tile.fire
+                elif tile.type in "MD" and rng.random() < 0.6:
+                    tile.type = "C"
+                    tile.walkable = True
+                fields.on_cost_change(pos)
+                a = (rng.randrange(model.width), rng.randrange(model.height))
+                b = (rng.randrange(model.width), rng.randrange(model.height))
+                where = f"mapa {map_name} semilla {seed} {a}->{b}"
+                best = model.get_path_astar(a, b)
+                found = rooms.path(a, b)
+                expect((best is None) == (found is None), f"{where}: rooms y A* no coinciden en si hay camino")
+                if best is None or a == b:
+                    continue
+                expect(path_cost(model, found) == path_cost(model, best),
+                       f"{where}: rooms cuesta {path_cost(model, found)}, A* {path_cost(model, best)}")
+                cur, cost = a, 0
+                for _ in range(model.width * model.height):
+                    if cur == b:
+                        break
+                    cur = fields.next_step(cur, b)
+                    cost += model.cost_at(cur)
+                expect(cur == b and cost == path_cost(model, best),
+                       f"{where}: field cuesta {cost}, A* {path_cost(model, best)}")
+
+
+# --- DELTAS ---
+
+def check_delta(seeds):
+    """Estado completo + deltas = estado completo del step actual."""
+    from replay import _State, normalized
+    from state_delta import build_delta
+    for strategy in STRATEGIES:
+        for seed in range(seeds):
+            model = model_factory(strategy)(seed=seed, log_level="off")
+            client = _State(model.get_state_json())
+            rng = random.Random(seed)
+            while model.running and model.steps < 400:
+                for _ in range(rng.randint(1, 4)):
+                    model.step()
+                delta = build_delta(model, client.base["step"])
+                expect(delta["delta"], f"{strategy} semilla {seed}: step {model.steps} sin delta")
+                client.apply({
+                    **delta,
+                    "cells": [(c["x"], c["y"], c["state"], c["damage"]) for c in delta["cells"]],
+                    **({"pois": [(p["x"], p["y"]) for p in delta["pois"]]} if "pois" in delta else {}),
+                })
+                full = model.get_state_json()
+                mine = dict(client.to_json(), game_id=full.get("game_id"))
+                expect(normalized(mine) == normalized(full),
+                       f"{strategy} semilla {seed}: el delta del step {model.steps} no reconstruye el estado")
+
+
+# --- BARRIDO ---
+
+def check_sweep(seeds):
+    """Un barrido repetido no vuelve a jugar lo que ya está en la base."""
+    import sweep
+    configs = sweep.expand_grid({"smoke_rate": [1, 2]})
+    strategies = ["strat", "random"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = sweep.ResultStore(os.path.join(tmp, "barrido.sqlite"))
+        try:
+            first = sweep.run_sweep(store, configs, strategies, seeds, 0, 300, workers=1)
+            expect(first["played"] == first["games"] == 2 * 2 * seeds,
+                   f"primera corrida: {first}")
+            again = sweep.run_sweep(store, configs, strategies, seeds, 0, 300, workers=1)
+            expect(again["played"] == 0, f"la segunda corrida volvió a jugar: {again}")
+            more = sweep.run_sweep(store, configs, strategies, seeds + 1, 0, 300, workers=1)
+            expect(more["played"] == 2 * 2, f"una semilla más debía jugar 4 partidas: {more}")
+            rows = store.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            expect(rows == 2 * 2 * (seeds + 1), f"{rows} filas en la base")
+        finally:
+            store.close()
+
+
+# --- RUTAS ---
+
+BAD_INIT = (
+    {"strategy": "nada"}, {"map": "gen:5000x5000"}, {"map": "../etc"},
+    {"pathing": "bogus"}, {"targeting": "bogus"}, {"policy": "bogus"},
+    {"roles": 5}, {"roles": ["BOMBERO"]}, {"smoke_rate": [1]}, {"max_damage": "3"},
+    {"strategy": "random_legacy", "max_pois": 500}, {"since": "abc"},
+)
+
+
+def check_routes(seeds):
+    """/init con datos inválidos responde 400 (nunca 500) y no crea la sesión."""
+    try:
+        from server import create_app
+        client = create_app().test_client()
+    except ImportError as e:  # Flask es opcional fuera del servidor
+        return f"omitido: {e}"
+    for body in BAD_INIT:
+        response = client.post("/init", json=dict(body, session_id="selfcheck"))
+        expect(response.status_code == 400, f"/init {body}: {response.status_code}")
+    expect(client.post("/step", json={"session_id": "selfcheck"}).status_code == 400,
+           "una /init rechazada dejó una sesión")
+    expect(client.post("/init", json={"session_id": "selfcheck"}).status_code == 200,
+           "/init válido no respondió 200")
+    for query in ("since=abc", "since=1.5"):
+        response = client.post(f"/step?{query}", json={"session_id": "selfcheck"})
+        expect(response.status_code == 400, f"/step?{query}: {response.status_code}")
+    return None
+
+
+CHECKS = {
+    "replay": check_replay,
+    "cellpool": check_cellpool,
+    "spatial": check_spatial,
+    "paths": check_paths,
+    "delta": check_delta,
+    "sweep": check_sweep,
+    "routes": check_routes,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verificaciones de las optimizaciones")
+    parser.add_argument("--only", default=",".join(CHECKS), help="verificaciones separadas por coma")
+    parser.add_argument("--seeds", type=int, default=4, help="semillas por verificación")
+    args = parser.parse_args(argv)
+
+    names = [n for n in args.only.split(",") if n]
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        parser.error(f"desconocidas: {', '.join(unknown)}")
+    failed = 0
+    for name in names:
+        start = time.perf_counter()
+        try:
+            note = CHECKS[name](args.seeds)
+            status = note or "ok"
+        except CheckFailed as e:
+            failed += 1
+            status = f"FALLA: {e}"
+        print(f"{name:10} {time.perf_counter() - start:6.1f} s  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# server.py - Un solo servidor para todas las estrategias (port/5002)
+# Cada sesión elige su estrategia en /init; /reset conserva la anterior:
+#
+#   /init {"strategy": "random", "seed": 7, "map": "gen:60x40"}
+#
+# "strat", "random" y sus variantes "_array" corren en el mismo motor de
+# reglas (FireModel / ArrayFireModel) y solo cambian la política de los
+# bomberos (policies.py): el torneo compara políticas, no motores.
+# "random_legacy" es el modelo original de serverR.py, con sus propias
+# reglas, solo por compatibilidad con los clientes de Unity que ya lo usan.
+# serverR.py (5000) y serverStrat.py (5001) siguen funcionando igual.
+#
+#   python server.py --port 5002
+
+import argparse
+import importlib
+from functools import partial
+
+from templates import new_game
+
+# nombre -> (módulo, clase del modelo, argumentos fijos)
+STRATEGIES = {
+    "strat": ("serverStrat", "FireModel", {}),
+    "strat_array": ("fire_array", "ArrayFireModel", {}),
+    "random": ("serverStrat", "FireModel", {"policy": "random"}),
+    "random_array": ("fire_array", "ArrayFireModel", {"policy": "random"}),
+    "random_legacy": ("serverR", "FlashPointModel", {}),
+}
+DEFAULT_STRATEGY = "strat"
+DEFAULT_PORT = 5002
+
+_classes = {}
+
+
+def model_class(strategy):
+    if strategy not in _classes:
+        module, cls, _ = STRATEGIES[strategy]
+        _classes[strategy] = getattr(importlib.import_module(module), cls)
+    return _classes[strategy]
+
+
+def model_factory(strategy):
+    """Partidas nuevas de la estrategia (plantilla de su clase y argumentos fijos)."""
+    return partial(new_game, model_class(strategy), **STRATEGIES[strategy][2])
+
+
+def build_model(params):
+    strategy = params.get("strategy", DEFAULT_STRATEGY)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"estrategia desconocida: {strategy}")
+    cls = model_class(strategy)
+    # Cada modelo traduce el JSON de /init a sus argumentos; los fijos ganan
+    options = cls.options_from(params)
+    options.update(STRATEGIES[strategy][2])
+    return new_game(cls, **options)
+
+
+# Flask solo se importa al levantar el servidor; los modelos se usan sin él
+def create_app():
+    from flask import Flask
+    from flask_cors import CORS
+    from routes import register_routes
+
+    app = Flask(__name__)
+    CORS(app)
+    register_routes(
+        app, build_model,
+        on_init=lambda s: print(f"🚒 Simulación {s.params.get('strategy', DEFAULT_STRATEGY)} "
+                                f"iniciada (sesión {s.id})"),
+    )
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor de todas las estrategias")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    create_app().run(host='0.0.0.0', port=args.port, debug=True)
@@ -1,47 +1,56 @@
 # serverR.py - Estrategia 100% Aleatoria compatible con Unity
 # CORREGIDO: Error de inicialización de Agente y Puerto 5005
 
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import metrics
+from cellpool import CellPool
+from events import EventLog
+from maps import DEFAULT_LAYOUT, load_map
+from random_rules import (AP_BREAK_WALL, AP_EXTINGUISH_FIRE, AP_EXTINGUISH_SMOKE, AP_MOVE,
+                          AP_MOVE_CARRYING, AP_OPEN_DOOR, AP_PICKUP_VICTIM, CELL, DOOR,
+                          DOOR_OPEN, FIRE, MOVABLE, OUTSIDE, SMOKE, WALL)
+from replay import GameRecorder
+from snapshot import (SNAPSHOT_VERSION, blank_grid, check_snapshot, clone_agent, clone_shell,
+                      pack_rng, unpack_rng)
+from state_delta import ChangeTracker
+from templates import new_game
+from tuning import (MAX_DAMAGE, MAX_LOST, SMOKE_RATE, WIN_RESCUED, pois_from, rate_from,
+                    spread_count, threshold_from)
 import numpy as np
-import random
 
 from mesa import Agent, Model
 from mesa.space import SingleGrid
 
-app = Flask(__name__)
-CORS(app)
-
-# --- CONFIGURACIÓN ---
-OUTSIDE = 0
-WALL = 1
-CELL = 2
-DOOR = 3
-SMOKE = 4
-FIRE = 5
-POI = 6
-DOOR_OPEN = 8
-
-AP_MOVE = 1
-AP_MOVE_CARRYING = 2
-AP_EXTINGUISH_SMOKE = 1
-AP_EXTINGUISH_FIRE = 2
-AP_BREAK_WALL = 2
-AP_OPEN_DOOR = 1
-AP_PICKUP_VICTIM = 1
-
-GAME_MAP = """FFFFFFFFFFFFFFFFFFFF
-FMMMMMMMMMMMMDMMMMMF
-FMCCCCCDCCCMCCCCCCMF
-FMCCCCCMCCCDCCCCCCMF
-FMCCCMMMMMMMMMMMMDMF
-FDCCCMCCCCCCCCCDCCMF
-FMCCCMCCCCCCCCCMCCMF
-FMMMMMMMMDMMMMMMMMMF
-FMCCCCCCCCCDCCCDCCMF
-FMCCCCCCCCCMCCCMCCMF
-FMMMMDMMMMMMMMMMMMMF
-FFFFFFFFFFFFFFFFFFFF"""
+# Mapa por defecto (los mapas ahora viven en maps.py)
+GAME_MAP = "\n".join(DEFAULT_LAYOUT)
+
+class Surroundings:
+    """Celda propia + 4 vecinos (orden de DIRS) clasificados en una pasada."""
+    __slots__ = ("around", "codes", "moves", "walls", "doors")
+
+    def __init__(self, model, pos):
+        cells = model.cells
+        self.around = model.map.around[pos]
+        self.codes = [None if p is None else cells[p] for p in self.around]
+        self.moves, self.walls, self.doors = [], [], []
+        for p, code in zip(self.around[1:], self.codes[1:]):
+            if code in MOVABLE:
+                if model.grid.is_cell_empty(p):
+                    self.moves.append(p)
+            elif code == WALL:
+                self.walls.append(p)
+            elif code == DOOR:
+                self.doors.append(p)
+
+    def shuffled(self, rng, code):
+        # Como barajar [propia] + 4 vecinos (fuera del mapa incluidos) y tomar
+        # la primera con ese código: mismo consumo del RNG que antes
+        order = list(range(5))
+        rng.shuffle(order)
+        for i in order:
+            if self.codes[i] == code:
+                return self.around[i]
+        return None
+
 
 class FirefighterAgent(Agent):
     # --- CORRECCIÓN AQUÍ: Añadimos unique_id ---
@@ -51,103 +60,79 @@ class FirefighterAgent(Agent):
         self.ap = 0
         self.carrying_victim = False
 
+    # Celda propia y 4 vecinos leídos una sola vez (tabla del mapa compilado);
+    # de aquí salen los candidatos de todas las acciones de este punto de acción
+    def scan(self):
+        return Surroundings(self.model, self.pos)
+
     def get_valid_moves(self):
-        x, y = self.pos
-        moves = []
-        for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                cell_type = self.model.cells[nx][ny]
-                if cell_type in [CELL, DOOR_OPEN, SMOKE, OUTSIDE]:
-                    if self.model.grid.is_cell_empty((nx, ny)):
-                        moves.append((nx, ny))
-        return moves
+        return self.scan().moves
 
     # --- ACCIONES ALEATORIAS ---
 
-    def move_random(self):
-        moves = self.get_valid_moves()
+    def move_random(self, scan=None):
+        moves = (scan or self.scan()).moves
         if not moves:
             return False
         
         cost = AP_MOVE_CARRYING if self.carrying_victim else AP_MOVE
         if self.ap >= cost:
-            new_pos = random.choice(moves)
-            print(f"   🎲 Moviendo a {new_pos} (Costo: {cost})")
-            self.model.grid.move_agent(self, new_pos)
+            new_pos = self.random.choice(moves)
+            self.model.events.debug("move", agent=self.firefighter_id, pos=new_pos, ap=cost)
+            self.model.move_firefighter(self, new_pos)
             self.ap -= cost
             return True
         return False
 
-    def extinguish_smoke(self):
+    def extinguish_smoke(self, scan=None):
         if self.ap < AP_EXTINGUISH_SMOKE: return False
-        x, y = self.pos
-        candidates = [(x,y)] + [(x+dx, y+dy) for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]]
-        random.shuffle(candidates)
-        
-        for cx, cy in candidates:
-            if 0 <= cx < self.model.width and 0 <= cy < self.model.height:
-                if self.model.cells[cx][cy] == SMOKE:
-                    print(f"   💨 Extinguiendo Humo en {(cx, cy)}")
-                    self.model.cells[cx][cy] = CELL
-                    self.model.stats["smokes_removed"] += 1
-                    self.ap -= AP_EXTINGUISH_SMOKE
-                    return True
-        return False
+        scan = scan or self.scan()
+        pos = scan.shuffled(self.random, SMOKE)
+        if pos is None:
+            return False
+        self.model.events.debug("remove_smoke", agent=self.firefighter_id, pos=pos, ap=AP_EXTINGUISH_SMOKE)
+        self.model.set_cell(pos[0], pos[1], CELL)
+        self.model.stats["smokes_removed"] += 1
+        self.ap -= AP_EXTINGUISH_SMOKE
+        return True
 
-    def extinguish_fire(self):
+    def extinguish_fire(self, scan=None):
         if self.ap < AP_EXTINGUISH_FIRE: return False
-        x, y = self.pos
-        candidates = [(x,y)] + [(x+dx, y+dy) for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]]
-        random.shuffle(candidates)
-        
-        for cx, cy in candidates:
-            if 0 <= cx < self.model.width and 0 <= cy < self.model.height:
-                if self.model.cells[cx][cy] == FIRE:
-                    print(f"   💦 Extinguiendo Fuego en {(cx, cy)}")
-                    self.model.cells[cx][cy] = SMOKE
-                    self.model.stats["fires_extinguished"] += 1
-                    self.ap -= AP_EXTINGUISH_FIRE
-                    return True
-        return False
+        scan = scan or self.scan()
+        pos = scan.shuffled(self.random, FIRE)
+        if pos is None:
+            return False
+        self.model.events.debug("extinguish_fire", agent=self.firefighter_id, pos=pos, ap=AP_EXTINGUISH_FIRE)
+        self.model.set_cell(pos[0], pos[1], SMOKE)
+        self.model.stats["fires_extinguished"] += 1
+        self.ap -= AP_EXTINGUISH_FIRE
+        return True
 
-    def break_wall(self):
+    def break_wall(self, scan=None):
         if self.ap < AP_BREAK_WALL: return False
-        x, y = self.pos
-        candidates = []
-        for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                if self.model.cells[nx][ny] == WALL:
-                    candidates.append((nx, ny))
+        candidates = (scan or self.scan()).walls
         
         if candidates:
-            wx, wy = random.choice(candidates)
-            print(f"   🔨 Golpeando pared en {(wx, wy)}")
-            self.model.wall_damage[(wx, wy)] = self.model.wall_damage.get((wx, wy), 0) + 2
+            wx, wy = self.random.choice(candidates)
+            self.model.events.debug("break_wall", agent=self.firefighter_id, pos=(wx, wy), ap=AP_BREAK_WALL)
+            damage = self.model.add_wall_damage(wx, wy, 2)
             self.model.stats["building_damage"] += 2
             self.ap -= AP_BREAK_WALL
-            if self.model.wall_damage[(wx, wy)] >= 2:
-                print("      🧱 ¡Pared destruida!")
-                self.model.cells[wx][wy] = CELL
+            if damage >= 2:
+                self.model.events.info("wall_destroyed", agent=self.firefighter_id, pos=(wx, wy))
+                self.model.set_cell(wx, wy, CELL)
                 self.model.stats["walls_broken"] += 1
             return True
         return False
 
-    def open_door(self):
+    def open_door(self, scan=None):
         if self.ap < AP_OPEN_DOOR: return False
-        x, y = self.pos
-        candidates = []
-        for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                if self.model.cells[nx][ny] == DOOR:
-                    candidates.append((nx, ny))
+        candidates = (scan or self.scan()).doors
         
         if candidates:
-            dx, dy = random.choice(candidates)
-            print(f"   🚪 Abriendo puerta en {(dx, dy)}")
-            self.model.cells[dx][dy] = DOOR_OPEN
+            dx, dy = self.random.choice(candidates)
+            self.model.events.debug("open_door", agent=self.firefighter_id, pos=(dx, dy), ap=AP_OPEN_DOOR)
+            self.model.set_cell(dx, dy, DOOR_OPEN)
             self.model.stats["doors_opened"] += 1
             self.ap -= AP_OPEN_DOOR
             return True
@@ -157,9 +142,9 @@ class FirefighterAgent(Agent):
         if self.ap < AP_PICKUP_VICTIM or self.carrying_victim: return False
         x, y = self.pos
         if (x, y) in self.model.pois:
-            print(f"   🚑 Recogiendo víctima en {self.pos}")
+            self.model.events.debug("pickup_victim", agent=self.firefighter_id, pos=self.pos, ap=AP_PICKUP_VICTIM)
             self.carrying_victim = True
-            self.model.pois.remove((x, y))
+            self.model.remove_poi((x, y))
             self.ap -= AP_PICKUP_VICTIM
             return True
         return False
@@ -168,52 +153,27 @@ class FirefighterAgent(Agent):
         if not self.carrying_victim: return False
         x, y = self.pos
         if self.model.cells[x][y] == OUTSIDE:
-            print(f"   ✅ ¡Víctima salvada en {self.pos}!")
+            self.model.events.info("victim_saved", agent=self.firefighter_id, pos=self.pos)
             self.carrying_victim = False
             self.model.stats["victims_rescued"] += 1
             return True
         return False
 
-    def get_available_actions(self):
+    def get_available_actions(self, scan=None):
+        scan = scan or self.scan()
         actions = []
-        x, y = self.pos
-        
-        if self.get_valid_moves():
-            cost = AP_MOVE_CARRYING if self.carrying_victim else AP_MOVE
-            if self.ap >= cost: actions.append("MOVE")
-        
-        if self.ap >= AP_EXTINGUISH_SMOKE:
-            for dx, dy in [(0,0), (0,1), (0,-1), (1,0), (-1,0)]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                    if self.model.cells[nx][ny] == SMOKE:
-                        actions.append("EXTINGUISH_SMOKE"); break
         
-        if self.ap >= AP_EXTINGUISH_FIRE:
-            for dx, dy in [(0,0), (0,1), (0,-1), (1,0), (-1,0)]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                    if self.model.cells[nx][ny] == FIRE:
-                        actions.append("EXTINGUISH_FIRE"); break
-        
-        if self.ap >= AP_BREAK_WALL:
-            for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                    if self.model.cells[nx][ny] == WALL:
-                        actions.append("BREAK_WALL"); break
-        
-        if self.ap >= AP_OPEN_DOOR:
-            for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                    if self.model.cells[nx][ny] == DOOR:
-                        actions.append("OPEN_DOOR"); break
+        cost = AP_MOVE_CARRYING if self.carrying_victim else AP_MOVE
+        if scan.moves and self.ap >= cost: actions.append("MOVE")
+        if self.ap >= AP_EXTINGUISH_SMOKE and SMOKE in scan.codes: actions.append("EXTINGUISH_SMOKE")
+        if self.ap >= AP_EXTINGUISH_FIRE and FIRE in scan.codes: actions.append("EXTINGUISH_FIRE")
+        if self.ap >= AP_BREAK_WALL and scan.walls: actions.append("BREAK_WALL")
+        if self.ap >= AP_OPEN_DOOR and scan.doors: actions.append("OPEN_DOOR")
         
         if self.ap >= AP_PICKUP_VICTIM and not self.carrying_victim:
-            if (x, y) in self.model.pois: actions.append("PICKUP_VICTIM")
+            if self.pos in self.model.pois: actions.append("PICKUP_VICTIM")
         
-        if self.carrying_victim and self.model.cells[x][y] == OUTSIDE:
+        if self.carrying_victim and scan.codes[0] == OUTSIDE:
             actions.append("DROP_VICTIM")
             
         actions.append("WAIT")
@@ -222,33 +182,32 @@ class FirefighterAgent(Agent):
     def do_turn(self):
         if not self.model.running: return
         self.ap = 4
-        print(f"\n--- 🎲 TURNO RANDOM Agente {self.firefighter_id} en {self.pos} ---")
+        self.model.events.debug("turn", agent=self.firefighter_id, pos=self.pos)
         
         while self.ap > 0:
-            if self.carrying_victim:
-                x, y = self.pos
-                if self.model.cells[x][y] == OUTSIDE:
-                    self.drop_victim_outside()
-                    continue
+            scan = self.scan()
+            if self.carrying_victim and scan.codes[0] == OUTSIDE:
+                self.drop_victim_outside()
+                continue
             
-            actions = self.get_available_actions()
+            actions = self.get_available_actions(scan)
             
             if len(actions) == 1 and actions[0] == "WAIT":
-                print("   💤 Sin acciones posibles.")
+                self.model.events.debug("no_actions", agent=self.firefighter_id, pos=self.pos)
                 break
             
             filtered_actions = [a for a in actions if a != "WAIT"]
             if not filtered_actions:
                 action = "WAIT"
             else:
-                action = random.choice(filtered_actions)
+                action = self.random.choice(filtered_actions)
             
             success = False
-            if action == "MOVE": success = self.move_random()
-            elif action == "EXTINGUISH_SMOKE": success = self.extinguish_smoke()
-            elif action == "EXTINGUISH_FIRE": success = self.extinguish_fire()
-            elif action == "BREAK_WALL": success = self.break_wall()
-            elif action == "OPEN_DOOR": success = self.open_door()
+            if action == "MOVE": success = self.move_random(scan)
+            elif action == "EXTINGUISH_SMOKE": success = self.extinguish_smoke(scan)
+            elif action == "EXTINGUISH_FIRE": success = self.extinguish_fire(scan)
+            elif action == "BREAK_WALL": success = self.break_wall(scan)
+            elif action == "OPEN_DOOR": success = self.open_door(scan)
             elif action == "PICKUP_VICTIM": success = self.pickup_victim()
             elif action == "DROP_VICTIM": success = self.drop_victim_outside()
             elif action == "WAIT": break
@@ -257,26 +216,49 @@ class FirefighterAgent(Agent):
                 break
 
 class FlashPointModel(Model):
-    def __init__(self, num_agents=6, max_pois=3):
+    RULES = "random"  # Reglas del juego (para validar snapshots)
+    # Argumentos que se pueden barrer con sweep.py
+    TUNABLE = ("map_name", "num_agents", "max_pois", "smoke_rate", "win_rescued", "max_lost",
+               "max_damage")
+
+    # seed: semilla del RNG propio del modelo (Mesa la toma en __new__)
+    # record: guardar un registro por step para reproducir la partida
+    # map_name: mapa de maps.py (None = el de siempre, "gen:WxH", archivo en maps/)
+    # smoke_rate, win_rescued, max_lost, max_damage: reglas ajustables (tuning.py)
+    def __init__(self, num_agents=6, max_pois=3, log_level=None, seed=None, record=False,
+                 map_name=None, smoke_rate=SMOKE_RATE, win_rescued=WIN_RESCUED,
+                 max_lost=MAX_LOST, max_damage=MAX_DAMAGE):
         super().__init__()
-        lines = GAME_MAP.strip().split('\n')
-        self.height = len(lines)
-        self.width = len(lines[0])
+        self.seed = self._seed
+        self._prepare(num_agents, max_pois, log_level, map_name, smoke_rate, win_rescued,
+                      max_lost, max_damage)
+        self._start_game(record)
+
+    def _prepare(self, num_agents=6, max_pois=3, log_level=None, map_name=None,
+                 smoke_rate=SMOKE_RATE, win_rescued=WIN_RESCUED, max_lost=MAX_LOST,
+                 max_damage=MAX_DAMAGE):
+        # Todo lo que no usa el RNG: es lo que guarda la plantilla (templates.py)
+        self.smoke_rate = rate_from(smoke_rate)
+        self.win_rescued = threshold_from("win_rescued", win_rescued)
+        self.max_lost = threshold_from("max_lost", max_lost)
+        self.max_damage = threshold_from("max_damage", max_damage)
+        self.params = {"num_agents": num_agents, "max_pois": max_pois, "map_name": map_name,
+                       "smoke_rate": smoke_rate, "win_rescued": win_rescued,
+                       "max_lost": max_lost, "max_damage": max_damage}
+        self.map = load_map(map_name)
+        self.height = self.map.height
+        self.width = self.map.width
         self.grid = SingleGrid(self.width, self.height, torus=False)
         self.firefighters = []
-        self.cells = np.zeros((self.width, self.height), dtype=int)
-        self.wall_damage = {}
+        # Los códigos del mapa compilado coinciden con OUTSIDE/WALL/CELL/DOOR
+        codes = np.frombuffer(self.map.codes, dtype=np.uint8).reshape(self.height, self.width)
+        self.cells = codes.T.astype(int)
+        self.wall_damage = dict.fromkeys(self.map.walls, 0)
         self.pois = set()
-        self.max_active_pois = max_pois
-        
-        for y, line in enumerate(lines):
-            for x, char in enumerate(line):
-                if char == 'F': self.cells[x][y] = OUTSIDE
-                elif char == 'M': 
-                    self.cells[x][y] = WALL
-                    self.wall_damage[(x,y)] = 0
-                elif char == 'C': self.cells[x][y] = CELL
-                elif char == 'D': self.cells[x][y] = DOOR
+        self.max_active_pois = pois_from(max_pois, self.map)
+        self.changes = ChangeTracker()
+        self.events = EventLog(log_level)
+        self.events.game = self.changes.game_id
 
         self.stats = {
             "victims_rescued": 0, "victims_lost": 0, "fires_extinguished": 0,
@@ -284,14 +266,78 @@ class FlashPointModel(Model):
             "building_damage": 0, "doors_opened": 0, "walls_broken": 0
         }
 
-        self.spawn_agents(num_agents)
-        self.spawn_initial_fires(3)
-        for _ in range(self.max_active_pois): self.spawn_poi()
-
         self.steps = 0
         self.running = True
         self.game_result = None
         self.current_agent_index = 0
+        self.recorder = None
+
+        self.spawn_agents(num_agents)
+        self._build_spawn_pool()
+
+    def _start_game(self, record=False):
+        # Preparación con el RNG de la partida
+        self.spawn_initial_fires(3)
+        for _ in range(self.max_active_pois): self.spawn_poi()
+        self._commit_changes()
+        self.recorder = GameRecorder(self) if record else None
+
+    @staticmethod
+    def options_from(params):
+        # JSON de /init -> argumentos del constructor
+        return {
+            "num_agents": threshold_from("num_agents", params.get('num_agents', 6)),
+            "max_pois": params.get('max_pois', 3),
+            "map_name": params.get('map'),
+            "seed": params.get('seed'),
+            "record": bool(params.get('record', False)),
+            "smoke_rate": rate_from(params.get('smoke_rate', SMOKE_RATE)),
+            "win_rescued": threshold_from("win_rescued", params.get('win_rescued', WIN_RESCUED)),
+            "max_lost": threshold_from("max_lost", params.get('max_lost', MAX_LOST)),
+            "max_damage": threshold_from("max_damage", params.get('max_damage', MAX_DAMAGE)),
+        }
+
+    def set_cell(self, x, y, value):
+        if self.cells[x][y] != value:
+            self.cells[x][y] = value
+            self._refresh_spawn(x, y)
+            self.changes.mark((x, y))
+
+    def add_wall_damage(self, x, y, amount):
+        damage = self.wall_damage.get((x, y), 0) + amount
+        self.wall_damage[(x, y)] = damage
+        self.changes.mark((x, y))
+        return damage
+
+    # --- CELDAS CANDIDATAS ---
+    # spawn_pool: celdas C sin víctima ni bombero, índice plano columna por
+    # columna (x * alto + y), el mismo orden en que spawn_poi las recorría.
+
+    def _build_spawn_pool(self):
+        free = self.cells == CELL
+        for x, y in self.pois:
+            free[x, y] = False
+        for agent in self.firefighters:
+            free[agent.pos] = False
+        self.spawn_pool = CellPool(free.size, free.ravel().astype(np.uint8).tobytes())
+
+    def _refresh_spawn(self, x, y):
+        self.spawn_pool.set(x * self.height + y, self.cells[x, y] == CELL
+                            and (x, y) not in self.pois and self.grid.is_cell_empty((x, y)))
+
+    def add_poi(self, pos):
+        self.pois.add(pos)
+        self._refresh_spawn(*pos)
+
+    def remove_poi(self, pos):
+        self.pois.remove(pos)
+        self._refresh_spawn(*pos)
+
+    def move_firefighter(self, agent, pos):
+        old = agent.pos
+        self.grid.move_agent(agent, pos)
+        self._refresh_spawn(*old)
+        self._refresh_spawn(*pos)
 
     def get_all_cells(self):
         cells = []
@@ -302,7 +348,7 @@ class FlashPointModel(Model):
         return cells
 
     def spawn_agents(self, num_agents):
-        positions = [(0, 4), (0, 5), (0, 6), (13, 0), (14, 0), (15, 0)]
+        positions = self.map.spawns
         
         limit = min(num_agents, len(positions))
         
@@ -316,115 +362,206 @@ class FlashPointModel(Model):
             self.firefighters.append(agent)
 
     def spawn_initial_fires(self, count):
-        candidates = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.cells[x][y] == CELL:
-                    candidates.append((x,y))
+        # Todas las celdas C, columna por columna
+        candidates = CellPool(self.cells.size, (self.cells == CELL).ravel().astype(np.uint8).tobytes())
         
         for _ in range(count):
             if not candidates: break
-            pos = random.choice(candidates)
-            candidates.remove(pos)
-            self.cells[pos[0]][pos[1]] = FIRE
+            i = self.random.choice(candidates)
+            candidates.discard(i)
+            self.set_cell(*divmod(i, self.height), FIRE)
 
     def spawn_poi(self):
         if len(self.pois) >= self.max_active_pois: return False
-        candidates = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.cells[x][y] == CELL and (x, y) not in self.pois:
-                    if self.grid.is_cell_empty((x,y)):
-                        candidates.append((x, y))
-        if candidates:
-            pos = random.choice(candidates)
-            self.pois.add(pos)
+        if self.spawn_pool:
+            self.add_poi(divmod(self.random.choice(self.spawn_pool), self.height))
             return True
         return False
 
     def spawn_smoke_random(self):
-        x = random.randint(1, self.width-2)
-        y = random.randint(1, self.height-2)
+        x = self.random.randint(1, self.width-2)
+        y = self.random.randint(1, self.height-2)
         current = self.cells[x][y]
         
         if current == SMOKE:
-            print(f"🔥 ¡El humo en {x},{y} se convirtió en FUEGO!")
-            self.cells[x][y] = FIRE
+            self.events.debug("smoke_to_fire", pos=(x, y))
+            self.set_cell(x, y, FIRE)
             self.stats["smokes_spawned"] += 1
         elif current == FIRE:
             self.trigger_explosion(x, y)
         elif current == CELL:
-            self.cells[x][y] = SMOKE
+            self.set_cell(x, y, SMOKE)
             self.stats["smokes_spawned"] += 1
 
     def trigger_explosion(self, x, y):
-        print(f"💥 ¡EXPLOSIÓN en {x},{y}!")
+        self.events.info("explosion", pos=(x, y))
         self.stats["explosions"] += 1
-        for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.width and 0 <= ny < self.height:
-                if self.cells[nx][ny] == WALL:
-                    self.wall_damage[(nx, ny)] = self.wall_damage.get((nx, ny), 0) + 1
-                    self.stats["building_damage"] += 1
-                    if self.wall_damage[(nx, ny)] >= 2:
-                        print(f"   🧱 Pared destruida por explosión en {nx},{ny}")
-                        self.cells[nx][ny] = CELL
-                elif self.cells[nx][ny] != OUTSIDE:
-                    self.cells[nx][ny] = FIRE
+        for nx, ny in self.map.adjacent[(x, y)]:
+            if self.cells[nx][ny] == WALL:
+                damage = self.add_wall_damage(nx, ny, 1)
+                self.stats["building_damage"] += 1
+                if damage >= 2:
+                    self.events.info("wall_destroyed", pos=(nx, ny), cause="explosion")
+                    self.set_cell(nx, ny, CELL)
+            elif self.cells[nx][ny] != OUTSIDE:
+                self.set_cell(nx, ny, FIRE)
 
     def check_end_conditions(self):
-        if self.stats["victims_rescued"] >= 7:
-            print("🎉 ¡GANASTE! Se rescataron 7 víctimas.")
+        if self.stats["victims_rescued"] >= self.win_rescued:
             self.running = False
             self.game_result = "WIN"
-        elif self.stats["building_damage"] >= 24:
-            print("🏚️ ¡PERDISTE! El edificio colapsó.")
+        elif self.stats["building_damage"] >= self.max_damage:
             self.running = False
             self.game_result = "LOSE COLLAPSADOS"
-        elif self.stats["victims_lost"] >= 4:
-            print("💀 ¡PERDISTE! Demasiadas víctimas.")
+        elif self.stats["victims_lost"] >= self.max_lost:
             self.running = False
             self.game_result = "LOSE DEMASIADAS VICTIMAS"
+        if not self.running:
+            self.events.info("game_over", result=self.game_result)
 
     def step(self):
         if not self.running: return
+        self.changes.begin(self.steps + 1)
+        self.events.step = self.steps + 1
+        laps = metrics.Laps(model=type(self).__name__) if metrics.ENABLED else None
         agent = self.firefighters[self.current_agent_index]
         agent.do_turn()
-        self.spawn_smoke_random()
+        if laps: laps.lap("agent_turn")
+        for _ in range(spread_count(self.random, self.smoke_rate)):
+            self.spawn_smoke_random()
+        if laps: laps.lap("spread_smoke")
         
-        while len(self.pois) < self.max_active_pois:
-            self.spawn_poi()
+        # spawn_poi() regresa False si ya no hay celdas libres
+        while len(self.pois) < self.max_active_pois and self.spawn_poi():
+            pass
+        if laps: laps.lap("poi_respawn")
             
         self.check_end_conditions()
+        if laps: laps.lap("end_checks")
         self.current_agent_index = (self.current_agent_index + 1) % len(self.firefighters)
         self.steps += 1
+        self._commit_changes()
+        if self.recorder:
+            self.recorder.capture(self)
+        if laps:
+            laps.lap("commit")
+            laps.done()
+
+    def cell_json(self, p):
+        x, y = p
+        return {
+            "x": int(x), "y": int(y),
+            "state": int(self.cells[x][y]),
+            "damage": int(self.wall_damage.get((x,y), 0))
+        }
 
-    def get_state_json(self):
-        cells_list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                cells_list.append({
-                    "x": int(x), "y": int(y),
-                    "state": int(self.cells[x][y]),
-                    "damage": int(self.wall_damage.get((x,y), 0))
-                })
-        agents_list = []
+    def state_planes(self):
+        # Fila por fila (cells es [x][y]), un byte por celda (formato binario)
+        damage = np.zeros((self.height, self.width), dtype=np.uint8)
+        for (x, y), d in self.wall_damage.items():
+            if d:
+                damage[y, x] = min(d, 255)
+        return self.cells.T.astype(np.uint8).tobytes(), damage.tobytes()
+
+    def agent_json(self, agent):
+        return {
+            "id": int(agent.firefighter_id),
+            "x": int(agent.pos[0]), "y": int(agent.pos[1]),
+            "carrying_victim": agent.carrying_victim,
+            "ap_remaining": agent.ap
+        }
+
+    def current_agent_id(self):
+        return self.firefighters[self.current_agent_index].firefighter_id if self.firefighters else -1
+
+    def _commit_changes(self):
+        self.changes.commit(
+            {a.firefighter_id: self.agent_json(a) for a in self.firefighters},
+            [{"x":p[0], "y":p[1]} for p in self.pois],
+            self.stats
+        )
+
+    # --- SNAPSHOT / FORK ---
+
+    def snapshot(self):
+        return {
+            "version": SNAPSHOT_VERSION, "rules": self.RULES, "map": self.map.name,
+            "width": self.width, "height": self.height,
+            "steps": self.steps, "running": self.running, "game_result": self.game_result,
+            "current_index": self.current_agent_index,
+            "cells": self.cells.astype(np.uint8).tobytes(),  # [x][y], un byte por celda
+            "wall_damage": tuple((pos, d) for pos, d in self.wall_damage.items() if d),
+            "pois": tuple(self.pois),
+            "agents": tuple((a.pos, a.ap, a.carrying_victim) for a in self.firefighters),
+            "stats": dict(self.stats),
+            "rng": pack_rng(self.random),
+        }
+
+    def restore(self, snap):
+        check_snapshot(self, snap)
+        self.cells[:] = np.frombuffer(snap["cells"], dtype=np.uint8).reshape(self.cells.shape)
+        for pos in self.wall_damage:
+            self.wall_damage[pos] = 0
+        self.wall_damage.update(snap["wall_damage"])
+        self.pois = set(snap["pois"])
+        # SingleGrid: quitar a todos antes de recolocar para no chocar
         for agent in self.firefighters:
-            agents_list.append({
-                "id": int(agent.firefighter_id),
-                "x": int(agent.pos[0]), "y": int(agent.pos[1]),
-                "carrying_victim": agent.carrying_victim,
-                "ap_remaining": agent.ap
-            })
-        
-        current_id = self.firefighters[self.current_agent_index].firefighter_id if self.firefighters else -1
+            self.grid.remove_agent(agent)
+        for agent, (pos, ap, carrying) in zip(self.firefighters, snap["agents"]):
+            self.grid.place_agent(agent, pos)
+            agent.ap = ap
+            agent.carrying_victim = carrying
+        self._build_spawn_pool()
+        self.stats = dict(snap["stats"])
+        self.steps = snap["steps"]
+        self.running = snap["running"]
+        self.game_result = snap["game_result"]
+        self.current_agent_index = snap["current_index"]
+        unpack_rng(self.random, snap["rng"])
+        # Partida nueva para los clientes delta; el registro ya no sale de la semilla
+        self.recorder = None
+        self.changes = ChangeTracker(start=self.steps)
+        self.events.game = self.changes.game_id
+        self.events.step = self.steps
+        self._commit_changes()
+
+    def fork(self):
+        """Partida nueva con el mismo estado (misma semilla y RNG), sin
+        reconstruir el modelo ni repetir la preparación."""
+        clone = clone_shell(self)
+        clone.grid = blank_grid(self.grid)
+        clone.firefighters = []
+        for agent in self.firefighters:
+            twin = clone_agent(agent, clone)
+            clone.grid.place_agent(twin, agent.pos)
+            clone.firefighters.append(twin)
+        clone.cells = self.cells.copy()
+        clone.wall_damage = dict(self.wall_damage)
+        clone.pois = set(self.pois)
+        clone.spawn_pool = self.spawn_pool.copy()
+        clone.stats = dict(self.stats)
+        clone.params = dict(self.params)
+        clone.recorder = None
+        clone.changes = ChangeTracker(start=self.steps)
+        clone.events = EventLog(self.events.level)
+        clone.events.game = clone.changes.game_id
+        clone.events.step = self.steps
+        clone._commit_changes()
+        return clone
+
+    # with_cells=False omite las celdas (el formato binario usa state_planes)
+    def get_state_json(self, with_cells=True):
+        cells_list = None
+        if with_cells:
+            cells_list = [self.cell_json((x, y)) for x in range(self.width) for y in range(self.height)]
+        agents_list = [self.agent_json(agent) for agent in self.firefighters]
         
         return {
             "step": self.steps,
             "running": self.running,
             "game_result": self.game_result,
             "width": self.width, "height": self.height,
-            "current_agent": current_id,
+            "current_agent": self.current_agent_id(),
             "cells": cells_list,
             "agents": agents_list,
             "pois": [{"x":p[0], "y":p[1]} for p in self.pois],
@@ -432,31 +569,23 @@ class FlashPointModel(Model):
         }
 
 # --- API FLASK ---
-model = None
-
-@app.route('/init', methods=['POST'])
-def init():
-    global model
-    data = request.get_json() or {}
-    model = FlashPointModel(
-        num_agents=data.get('num_agents', 6),
-        max_pois=data.get('max_pois', 3)
+def build_model(params):
+    return new_game(FlashPointModel, **FlashPointModel.options_from(params))
+
+# Flask solo se importa al levantar el servidor; los modelos se usan sin él
+def create_app():
+    from flask import Flask
+    from flask_cors import CORS
+    from routes import register_routes
+
+    app = Flask(__name__)
+    CORS(app)
+    register_routes(
+        app, build_model,
+        on_init=lambda s: print(f"🤖 Simulación RANDOM iniciada (sesión {s.id})"),
+        on_reset=lambda s: print(f"🔄 Simulación Reiniciada (sesión {s.id})"),
     )
-    print("🤖 Simulación RANDOM iniciada")
-    return jsonify(model.get_state_json())
-
-@app.route('/step', methods=['POST'])
-def step():
-    if not model: return jsonify({"error": "Init first"}), 400
-    model.step()
-    return jsonify(model.get_state_json())
-
-@app.route('/reset', methods=['POST'])
-def reset():
-    global model
-    model = FlashPointModel()
-    print("🔄 Simulación Reiniciada")
-    return jsonify(model.get_state_json())
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -1,29 +1,36 @@
 import heapq
-from flask import Flask, jsonify, request
-from flask_cors import CORS
-import random
+import metrics
+from cellpool import CellPool
+from events import EventLog
+from maps import DEFAULT_LAYOUT, load_map
+from pathing import DistanceFieldCache, nearest_target
+from policies import get_policy
+from replay import GameRecorder
+from rooms import RoomGraph
+from snapshot import (SNAPSHOT_VERSION, blank_grid, check_snapshot, clone_agent, clone_shell,
+                      pack_rng, unpack_rng)
+from spatial import SpatialIndex
+from state_delta import ChangeTracker
+from templates import new_game
+from tuning import (MAX_DAMAGE, MAX_LOST, SMOKE_RATE, WIN_RESCUED, rate_from, roles_from,
+                    spread_count, threshold_from)
 from typing import List, Tuple, Dict, Optional
 
 from mesa import Agent, Model
 from mesa.space import MultiGrid
 
-app = Flask(__name__)
-CORS(app)
-
-MAP_LAYOUT = [
-    "FFFFFFFFFFFFFFFFFFFF",
-    "FMMMMMMMMMMMMDMMMMMF",
-    "FMCCCCCDCCCMCCCCCCMF",
-    "FMCCCCCMCCCDCCCCCCMF",
-    "FMCCCMMMMMMMMMMMMDMF",
-    "FDCCCMCCCCCCCCCDCCMF",
-    "FMCCCMCCCCCCCCCMCCMF",
-    "FMMMMMMMMDMMMMMMMMMF",
-    "FMCCCCCCCCCDCCCDCCMF",
-    "FMCCCCCCCCCMCCCMCCMF",
-    "FMMMMDMMMMMMMMMMMMMF",
-    "FFFFFFFFFFFFFFFFFFFF"
-]
+# Mapa por defecto (los mapas ahora viven en maps.py)
+MAP_LAYOUT = list(DEFAULT_LAYOUT)
+
+# Código "state" de cada tipo de celda (sin humo/fuego)
+TILE_STATES = {"F": 0, "M": 1, "C": 2, "D": 3}
+
+# Atributos de Tile que cambian lo que se manda a Unity
+TRACKED_TILE_ATTRS = ("type", "fire", "smoke", "damage")
+
+# Valores aceptados de pathing y targeting (ver FireModel)
+PATHING_MODES = ("field", "rooms", "astar")
+TARGETING_MODES = ("manhattan", "cost")
 
 class Tile(Agent):
     def __init__(self, unique_id, model, pos, tile_type):
@@ -36,55 +43,40 @@ class Tile(Agent):
         self.hasPOI = False
         self.walkable = tile_type in ("C", "D")
 
+    # Avisar al modelo cuando cambia algo visible de la celda (para deltas)
+    def __setattr__(self, name, value):
+        notify = name in TRACKED_TILE_ATTRS and self.__dict__.get(name, value) != value
+        object.__setattr__(self, name, value)
+        if notify:
+            self.model.on_tile_change(self, name)
+
 
-# Mensajes en consola Generados con IA
 class FireFighter(Agent):
     def __init__(self, unique_id, model, pos, role):
         super().__init__(unique_id, model)
         self.role = role
         self.carrying = False
         self.action_points = 4
+        self.plan = None  # Camino del modo targeting="cost"
 
     def step(self):
         self.action_points = 4
-        print(f"\nTURNO AGENTE {self.unique_id} ({self.role}) en {self.pos}")
+        self.plan = None
+        log = self.model.events
+        log.debug("turn", agent=self.unique_id, role=self.role, pos=self.pos)
         
         while self.action_points > 0 and self.model.running:
-            # DEFINIR OBJETIVO
-            target = None
-            target_type = "Nada"
-            
-            if self.carrying:
-                target = self.model.entryPoints[0]
-                target_type = "SALIDA (Ambulancia)"
-            else:
-                if self.role == "APAGADOR":
-                    target = self.model.get_nearest_hazard(self.pos)
-                    target_type = "FUEGO/HUMO"
-                    if target is None:
-                        target = self.model.get_nearest_poi(self.pos)
-                        target_type = "VICTIMA (Fallback)"
-
-                elif self.role == "RESCATISTA":
-                    target = self.model.get_nearest_poi(self.pos)
-                    target_type = "VICTIMA"
-
-                elif self.role == "COMODIN":
-                    target = self.model.get_nearest_entity(self.pos)
-                    target_type = "VICTIMA/FUEGO/HUMO"
+            # DEFINIR OBJETIVO Y SIGUIENTE PASO (lo decide la política del modelo)
+            target, next_pos, target_type = self.model.policy.choose(self)
 
             if target is None:
                 return
 
-            print(f"    Objetivo: {target} ({target_type})")
+            log.debug("target", agent=self.unique_id, target=target, target_type=target_type)
 
-            # CALCULAR CAMINO
-            path = self.model.get_path_astar(self.pos, target)
-            
-            if path is None or len(path) <= 1:
+            if next_pos is None:
                 return
 
-            next_pos = path[1]
             next_tile = self.model.get_tile(next_pos)
 
             # EJECUTAR ACCIÓN
@@ -94,61 +86,61 @@ class FireFighter(Agent):
 
             if next_tile.type == "M":
                 if self.action_points >= 2:
-                    print(f"   ROMPIENDO en {next_pos} (Costo: 2 AP)")
+                    log.debug("break_wall", agent=self.unique_id, pos=next_pos, ap=2)
                     next_tile.damage += 2
                     self.model.buildingDamage += 2
                     if next_tile.damage >= 2:
                         next_tile.type = "C"
                         next_tile.walkable = True
-                        print("      🧱 ¡Pared destruida!")
+                        log.info("wall_destroyed", agent=self.unique_id, pos=next_pos)
                     self.action_points -= 2
                     continue 
                 else:
-                    print("   ❌ No hay AP para romper pared.")
+                    log.debug("blocked", agent=self.unique_id, pos=next_pos, reason="wall")
                     return
 
             elif next_tile.type == "D":
                 if self.action_points >= 1:
-                    print(f"   🚪 ABRIENDO PUERTA en {next_pos} (Costo: 1 AP)")
+                    log.debug("open_door", agent=self.unique_id, pos=next_pos, ap=1)
                     next_tile.type = "C"
                     next_tile.walkable = True
                     self.action_points -= 1
                     continue
                 else:
-                    print("   ❌ No hay AP para abrir puerta.")
+                    log.debug("blocked", agent=self.unique_id, pos=next_pos, reason="door")
                     return
 
             # -- INTERACCIONES (Fuego/Humo) --
             if next_tile.fire == 1:
                 if self.action_points >= 2:
-                    print(f"   💦 EXTINGUIENDO FUEGO en {next_pos} (Costo: 2 AP)")
+                    log.debug("extinguish_fire", agent=self.unique_id, pos=next_pos, ap=2)
                     next_tile.fire = 0
                     next_tile.smoke = 1 
                     self.model.stats["fires_extinguished"] += 1
                     self.action_points -= 2
                     continue
                 else:
-                    print("   ❌ Fuego bloquea el paso y no hay AP suficiente.")
+                    log.debug("blocked", agent=self.unique_id, pos=next_pos, reason="fire")
                     return
             
             elif next_tile.smoke == 1:
                 if self.action_points >= 1:
-                    print(f"   💨 DISIPANDO HUMO en {next_pos} (Costo: 1 AP)")
+                    log.debug("remove_smoke", agent=self.unique_id, pos=next_pos, ap=1)
                     next_tile.smoke = 0
                     self.model.stats["smokes_removed"] += 1
                     self.action_points -= 1
                     continue
                 else:
-                    print("   ❌ Humo bloquea el paso y no hay AP suficiente.")
+                    log.debug("blocked", agent=self.unique_id, pos=next_pos, reason="smoke")
                     return
 
             # -- MOVERSE --
             if self.action_points >= move_cost:
-                print(f"   🏃 MOVIENDO a {next_pos} (Costo: {move_cost} AP)")
+                log.debug("move", agent=self.unique_id, pos=next_pos, ap=move_cost)
                 self.model.grid.move_agent(self, next_pos)
                 self.action_points -= move_cost
             else:
-                print("   ❌ No hay AP para moverse.")
+                log.debug("blocked", agent=self.unique_id, pos=next_pos, reason="move")
                 return
 
             # -- ACCIONES AUTOMÁTICAS POST-MOVIMIENTO --
@@ -157,35 +149,83 @@ class FireFighter(Agent):
             # Recoger víctima
             if not self.carrying and current_tile.hasPOI:
                 if self.action_points >= 1:
-                    print(f"   🚑 RECOGIENDO VÍCTIMA en {self.pos} (Costo: 1 AP)")
+                    log.debug("pickup_victim", agent=self.unique_id, pos=self.pos, ap=1)
                     self.carrying = True
-                    current_tile.hasPOI = False
-                    if self.pos in self.model.POIs:
-                        self.model.POIs.remove(self.pos)
+                    self.model.remove_poi(self.pos)
                     self.action_points -= 1
             
             # Entregar víctima
             if self.carrying and self.pos in self.model.entryPoints:
-                print(f"   ✅ ¡VÍCTIMA SALVADA! en {self.pos}")
+                log.info("victim_saved", agent=self.unique_id, pos=self.pos)
                 self.carrying = False
                 self.model.savedVictims += 1
                 return
 
+def _stat(key):
+    # Contador que se lee y escribe directo en model.stats (una sola fuente)
+    return property(lambda self: self.stats[key],
+                    lambda self, value: self.stats.__setitem__(key, value))
+
 class FireModel(Model):
-    def __init__(self):
+    RULES = "strat"  # Reglas del juego (para validar snapshots)
+    # Argumentos que se pueden barrer con sweep.py
+    TUNABLE = ("map_name", "pathing", "targeting", "roles", "smoke_rate", "win_rescued",
+               "max_lost", "max_damage")
+
+    savedVictims = _stat("victims_rescued")
+    lostVictims = _stat("victims_lost")
+    buildingDamage = _stat("building_damage")
+
+    # pathing: "field" (campos de distancia en caché), "rooms" (grafo de cuartos,
+    # para edificios grandes) o "astar" (A* por acción)
+    # targeting: "manhattan" (objetivo más cercano en línea recta) o "cost"
+    # (objetivo más barato de alcanzar, un Dijkstra multi-objetivo por turno)
+    # seed: semilla del RNG propio del modelo (Mesa la toma en __new__)
+    # record: guardar un registro por step para reproducir la partida
+    # map_name: mapa de maps.py (None = el de siempre, "gen:WxH", archivo en maps/)
+    # policy: quién decide los pasos de los bomberos, ver policies.py ("roles", "random")
+    # roles, smoke_rate, win_rescued, max_lost, max_damage: reglas ajustables (tuning.py)
+    def __init__(self, pathing="field", targeting="manhattan", log_level=None, seed=None,
+                 record=False, map_name=None, policy="roles", roles=None,
+                 smoke_rate=SMOKE_RATE, win_rescued=WIN_RESCUED, max_lost=MAX_LOST,
+                 max_damage=MAX_DAMAGE):
         super().__init__()
-        self.width = 20
-        self.height = 12
+        self.seed = self._seed
+        self._prepare(pathing, targeting, log_level, map_name, policy, roles,
+                      smoke_rate, win_rescued, max_lost, max_damage)
+        self._start_game(record)
+
+    def _prepare(self, pathing="field", targeting="manhattan", log_level=None, map_name=None,
+                 policy="roles", roles=None, smoke_rate=SMOKE_RATE, win_rescued=WIN_RESCUED,
+                 max_lost=MAX_LOST, max_damage=MAX_DAMAGE):
+        # Todo lo que no usa el RNG: es lo que guarda la plantilla (templates.py)
+        self.roles = roles_from(roles)
+        self.smoke_rate = rate_from(smoke_rate)
+        self.win_rescued = threshold_from("win_rescued", win_rescued)
+        self.max_lost = threshold_from("max_lost", max_lost)
+        self.max_damage = threshold_from("max_damage", max_damage)
+        self.params = {"pathing": pathing, "targeting": targeting, "map_name": map_name,
+                       "policy": policy, "roles": self.roles, "smoke_rate": smoke_rate,
+                       "win_rescued": win_rescued, "max_lost": max_lost,
+                       "max_damage": max_damage}
+        if pathing not in PATHING_MODES:
+            raise ValueError(f"pathing desconocido: {pathing}")
+        if targeting not in TARGETING_MODES:
+            raise ValueError(f"targeting desconocido: {targeting}")
+        self.pathing = pathing
+        self.targeting = targeting
+        self.policy = get_policy(policy)
+        self.map = load_map(map_name)
+        self.width = self.map.width
+        self.height = self.map.height
         self.grid = MultiGrid(self.width, self.height, torus=False)
         self.tiles = {}
         self.POIs = []
         self.firefighters = []
         
-        self.savedVictims = 0
-        self.lostVictims = 0
-        self.buildingDamage = 0
-        self.entryPoints = [(1, 5)] # Ambulancia
+        self.entryPoints = list(self.map.entry_points) # Ambulancia
         
+        # savedVictims, lostVictims y buildingDamage se guardan aquí mismo
         self.stats = {
             "victims_rescued": 0, "victims_lost": 0, "building_damage": 0,
             "fires_extinguished": 0, "smokes_removed": 0, "explosions": 0
@@ -194,32 +234,60 @@ class FireModel(Model):
         self.running = True
         self.game_result = None
         self.steps = 0
+        self.changes = ChangeTracker()
+        self.events = EventLog(log_level)
+        self.events.game = self.changes.game_id
+        # Índices incrementales de fuego/humo y víctimas para los objetivos
+        self.hazards = SpatialIndex(self.width, self.height)
+        self.poi_index = SpatialIndex(self.width, self.height)
+        self._poi_seq = 0
+        self.fields = None  # DistanceFieldCache o RoomGraph, se crea al primer uso
+        self.recorder = None
 
         self._create_map()
+        self._build_pools()
         self._create_agents()
-        self.spawn_pois()
-        
         self.turn_order = self.get_turn_order()
         self.current_index = 0
 
+    def _start_game(self, record=False):
+        # Preparación con el RNG de la partida
+        self.spawn_pois()
+        self._commit_changes()
+        self.recorder = GameRecorder(self) if record else None
+
+    @staticmethod
+    def options_from(params):
+        # JSON de /init -> argumentos del constructor
+        return {
+            "pathing": params.get("pathing", "field"),
+            "targeting": params.get("targeting", "manhattan"),
+            "map_name": params.get("map"),
+            "seed": params.get("seed"),
+            "record": bool(params.get("record", False)),
+            "policy": params.get("policy", "roles"),
+            "roles": roles_from(params.get("roles")),
+            "smoke_rate": rate_from(params.get("smoke_rate", SMOKE_RATE)),
+            "win_rescued": threshold_from("win_rescued", params.get("win_rescued", WIN_RESCUED)),
+            "max_lost": threshold_from("max_lost", params.get("max_lost", MAX_LOST)),
+            "max_damage": threshold_from("max_damage", params.get("max_damage", MAX_DAMAGE)),
+        }
+
     def _create_map(self):
         uid = 1000
-        for y in range(self.height):
-            for x in range(self.width):
-                ch = MAP_LAYOUT[y][x]
+        for y, row in enumerate(self.map.layout):
+            for x, ch in enumerate(row):
                 tile = Tile(uid, self, (x, y), ch)
                 self.tiles[(x, y)] = tile
                 self.grid.place_agent(tile, (x, y))
                 uid += 1
 
     def _create_agents(self):
-        # Roles definidos
-        roles = ["APAGADOR", "RESCATISTA", "COMODIN",
-                 "APAGADOR", "RESCATISTA", "COMODIN"]
-        positions = [(0, 4), (0, 5), (0, 6), 
-                     (13, 0), (14, 0), (15, 0)]
+        # Roles definidos, en ciclo sobre los spawns del mapa
+        roles = self.roles
         
-        for uid, (pos, role) in enumerate(zip(positions, roles)):
+        for uid, pos in enumerate(self.map.spawns):
+            role = roles[uid % len(roles)]
             ff = FireFighter(uid, self, pos, role)
             self.grid.place_agent(ff, pos)
             self.firefighters.append(ff)
@@ -227,24 +295,136 @@ class FireModel(Model):
     def get_tile(self, pos):
         return self.tiles.get(pos)
 
+    def _flat_pos(self, i):
+        y, x = divmod(int(i), self.width)
+        return (x, y)
+
+    # --- CELDAS CANDIDATAS ---
+    # smoke_pool: celdas C sin víctima (spread_smoke); poi_pool: además sin
+    # fuego ni humo (spawn_pois). Índice plano fila por fila, el orden de tiles.
+
+    def _build_pools(self):
+        smoke, poi = bytearray(len(self.tiles)), bytearray(len(self.tiles))
+        for i, t in enumerate(self.tiles.values()):
+            if t.type == "C" and not t.hasPOI:
+                smoke[i] = 1
+                poi[i] = t.smoke == 0 and t.fire == 0
+        self.smoke_pool = CellPool(len(smoke), smoke)
+        self.poi_pool = CellPool(len(poi), poi)
+
+    def _refresh_pools(self, pos):
+        tile = self.tiles[pos]
+        i = pos[1] * self.width + pos[0]
+        open_cell = tile.type == "C" and not tile.hasPOI
+        self.smoke_pool.set(i, open_cell)
+        self.poi_pool.set(i, open_cell and tile.smoke == 0 and tile.fire == 0)
+
+    def on_tile_change(self, tile, attr):
+        self._refresh_pools(tile.pos)
+        self.changes.mark(tile.pos)
+        x, y = tile.pos
+        if tile.fire > 0 or tile.smoke > 0:
+            self.hazards.add(tile.pos, y * self.width + x)  # Orden fila por fila
+        else:
+            self.hazards.discard(tile.pos)
+        if self.fields is not None:
+            self.fields.on_cost_change(tile.pos)
+
+    def add_poi(self, pos):
+        self.get_tile(pos).hasPOI = True
+        self._refresh_pools(pos)
+        self.POIs.append(pos)
+        self._poi_seq += 1
+        self.poi_index.add(pos, self._poi_seq)  # Orden de aparición, como la lista
+
+    def remove_poi(self, pos):
+        self.get_tile(pos).hasPOI = False
+        self._refresh_pools(pos)
+        if pos in self.POIs:
+            self.POIs.remove(pos)
+        self.poi_index.discard(pos)
+
     # --- BÚSQUEDA DE OBJETIVOS ---
 
     # Se busca punto de interes (POI) basado en la distancia Manhattan
     def get_nearest_poi(self, pos):
-        if not self.POIs: return None
-        return min(self.POIs, key=lambda p: abs(p[0]-pos[0]) + abs(p[1]-pos[1]))
+        return self.poi_index.nearest(pos)[0]
 
     # Busca fuego o humo basado en la distancia Manhattan
     def get_nearest_hazard(self, pos):
-        hazards = [p for p, t in self.tiles.items() if t.fire > 0 or t.smoke > 0]
-        if not hazards: return None
-        return min(hazards, key=lambda p: abs(p[0]-pos[0]) + abs(p[1]-pos[1]))
+        return self.hazards.nearest(pos)[0]
 
-    # Busqueda mixta de POI o peligro, Manhattan
+    # Busqueda mixta de POI o peligro, Manhattan (empate: gana la víctima)
     def get_nearest_entity(self, pos):
-        targets = self.POIs + [p for p, t in self.tiles.items() if t.fire > 0 or t.smoke > 0]
-        if not targets: return None
-        return min(targets, key=lambda p: abs(p[0]-pos[0]) + abs(p[1]-pos[1]))
+        poi, poi_d = self.poi_index.nearest(pos)
+        hazard, hazard_d = self.hazards.nearest(pos)
+        if poi is None: return hazard
+        if hazard is None: return poi
+        return poi if poi_d <= hazard_d else hazard
+
+    # Costo de entrar a una celda, mismo modelo que A*
+    def cost_at(self, pos):
+        tile = self.tiles[pos]
+        if tile.type == "M": return 10
+        if tile.type == "D": return 2
+        if tile.fire > 0: return 3
+        return 1
+
+    def field_cache(self):
+        if self.fields is None:
+            self.fields = RoomGraph(self) if self.pathing == "rooms" else DistanceFieldCache(self)
+        return self.fields
+
+    def next_step(self, start, end):
+        if self.pathing == "astar":
+            path = self.get_path_astar(start, end)
+            return path[1] if path and len(path) > 1 else None
+        return self.field_cache().next_step(start, end)
+
+    # Posibles objetivos de un bombero según su rol (modo "cost")
+    def role_targets(self, ff):
+        if ff.carrying:
+            return set(self.entryPoints), "SALIDA (Ambulancia)"
+        if ff.role == "APAGADOR":
+            if len(self.hazards):
+                return set(self.hazards), "FUEGO/HUMO"
+            return set(self.POIs), "VICTIMA (Fallback)"
+        if ff.role == "RESCATISTA":
+            return set(self.POIs), "VICTIMA"
+        if ff.role == "COMODIN":
+            return set(self.POIs) | set(self.hazards), "VICTIMA/FUEGO/HUMO"
+        return set(), "Nada"
+
+    def plan_by_cost(self, ff):
+        """(objetivo, siguiente paso, tipo). Reusa el camino del turno mientras
+        el agente lo siga y el objetivo siga vigente."""
+        targets, target_type = self.role_targets(ff)
+        if not targets:
+            return None, None, target_type
+        plan = ff.plan
+        if plan and len(plan) > 1 and plan[1] == ff.pos:
+            del plan[0]
+        if not plan or plan[0] != ff.pos or plan[-1] not in targets:
+            cache = self.field_cache()
+            plan = nearest_target(ff.pos, targets, cache.costs, cache.neighbors, self.width)
+            ff.plan = plan
+        if plan is None:
+            return None, None, target_type
+        return plan[-1], (plan[1] if len(plan) > 1 else None), target_type
+
+    def _report_paths(self):
+        # Lo que expandió el caché de caminos desde el último reporte
+        cache = self.fields
+        if cache is None:
+            return
+        (nodes, rebuilds), (sent_nodes, sent_rebuilds) = cache.search_counts(), cache.reported
+        cache.reported = (nodes, rebuilds)
+        # La etiqueta sale del tipo de caché, no del JSON de /init
+        mode = "rooms" if isinstance(cache, RoomGraph) else "field"
+        if nodes > sent_nodes:
+            metrics.inc(metrics.PATH_NODES, nodes - sent_nodes, mode=mode)
+        if rebuilds > sent_rebuilds:
+            metrics.inc(metrics.PATH_REBUILDS, rebuilds - sent_rebuilds, mode=mode)
 
     #  PATHFINDING A* (Para preferir puertas sobre muros)
     def get_path_astar(self, start, end):
@@ -253,6 +433,7 @@ class FireModel(Model):
         heapq.heappush(frontier, (0, start))
         came_from = {start: None}
         cost_so_far = {start: 0}
+        adjacent = self.map.adjacent  # Vecinos precalculados del mapa
         
         while frontier:
             _, current = heapq.heappop(frontier)
@@ -260,14 +441,7 @@ class FireModel(Model):
             if current == end:
                 break
             
-            x, y = current
-            neighbors = []
-            for dx, dy in [(0,1), (0,-1), (1,0), (-1,0)]:
-                nx, ny = x + dx, y + dy
-                if (nx, ny) in self.tiles:
-                    neighbors.append((nx, ny))
-            
-            for next_pos in neighbors:
+            for next_pos in adjacent[current]:
                 tile = self.tiles[next_pos]
                 
                 added_cost = 1 # Base move cost
@@ -287,6 +461,9 @@ class FireModel(Model):
                     heapq.heappush(frontier, (priority, next_pos))
                     came_from[next_pos] = current
                     
+        if metrics.ENABLED:
+            metrics.inc(metrics.ASTAR_CALLS, model=type(self).__name__)
+            metrics.inc(metrics.ASTAR_NODES, len(came_from), model=type(self).__name__)
         if end not in came_from:
             return None # No hay camino
             
@@ -304,18 +481,13 @@ class FireModel(Model):
 
     def spawn_pois(self, max_pois=3):
         while self.count_total_pois() < max_pois:
-            candidates = [p for p, t in self.tiles.items() if t.type == "C" 
-                          and not t.hasPOI and t.smoke == 0 and t.fire == 0]
-            if not candidates: break
-            pos = random.choice(candidates)
-            self.tiles[pos].hasPOI = True
-            self.POIs.append(pos)
+            if not self.poi_pool: break
+            self.add_poi(self._flat_pos(self.random.choice(self.poi_pool)))
 
     def spread_smoke(self):
-        candidates = [p for p, t in self.tiles.items() if t.type == "C" and not t.hasPOI]
-        if not candidates: return
-        pos = random.choice(candidates)
-        tile = self.tiles[pos]
+        if not self.smoke_pool: return
+        pos = self._flat_pos(self.random.choice(self.smoke_pool))
+        tile = self.get_tile(pos)
         if tile.smoke == 0 and tile.fire == 0:
             tile.smoke = 1
         elif tile.smoke == 1:
@@ -325,7 +497,7 @@ class FireModel(Model):
 
     def explosion(self, pos):
         self.stats["explosions"] += 1
-        print(f"💥 EXPLOSIÓN en {pos}!")
+        self.events.info("explosion", pos=pos)
         # Daño en cruz
         self.check_explosion_damage(pos) # Centro
         x, y = pos
@@ -333,8 +505,8 @@ class FireModel(Model):
             self.check_explosion_damage((x+dx, y+dy))
 
     def check_explosion_damage(self, pos):
-        if pos not in self.tiles: return
-        tile = self.tiles[pos]
+        tile = self.get_tile(pos)
+        if tile is None: return
         
         # Dañar Muro
         if tile.type == "M":
@@ -345,10 +517,9 @@ class FireModel(Model):
         
         # Matar Víctima en suelo
         if tile.hasPOI:
-            tile.hasPOI = False
-            if pos in self.POIs: self.POIs.remove(pos)
+            self.remove_poi(pos)
             self.lostVictims += 1
-            print(f" Víctima quemada en {pos}")
+            self.events.info("victim_lost", pos=pos, cause="explosion")
 
         # Herir Bombero (lo manda fuera, pierde víctima si carga)
         cell_contents = self.grid.get_cell_list_contents([pos])
@@ -356,101 +527,247 @@ class FireModel(Model):
             if isinstance(obj, FireFighter):
                 self.send_to_outside(obj, victim_dies=True)
 
+    # Buscar la celda F más cercana (las F no cambian, salen del mapa compilado)
+    def nearest_outside(self, pos):
+        outside_cells = self.map.outside
+        if not outside_cells: return None
+        return min(outside_cells, key=lambda p: abs(p[0]-pos[0]) + abs(p[1]-pos[1]))
+
+    # Ambulancia más cercana (empate: la primera del mapa)
+    def nearest_entry(self, pos):
+        return min(self.entryPoints, key=lambda p: abs(p[0]-pos[0]) + abs(p[1]-pos[1]))
+
     def send_to_outside(self, ff, victim_dies=False):
-        # Buscar la celda F más cercana
         start = ff.pos
-        outside_cells = [p for p, t in self.tiles.items() if t.type == "F"]
-        if not outside_cells: return
-        target = min(outside_cells, key=lambda p: abs(p[0]-start[0]) + abs(p[1]-start[1]))
+        target = self.nearest_outside(start)
+        if target is None: return
         
+        self.events.info("firefighter_hurt", agent=ff.unique_id, pos=start, to=target)
         self.grid.move_agent(ff, target)
         if ff.carrying:
             ff.carrying = False
             if victim_dies:
                 self.lostVictims += 1
-                print(f" Víctima perdida (bombero herido)")
+                self.events.info("victim_lost", pos=start, agent=ff.unique_id, cause="firefighter_hurt")
 
     def get_turn_order(self):
         # Ordenar por rol para simular turnos organizados (opcional)
         return sorted(self.firefighters, key=lambda x: x.unique_id)
 
     def check_end_conditions(self):
-        if self.savedVictims >= 7:
+        if self.savedVictims >= self.win_rescued:
             self.running = False; self.game_result = "WIN"
-        elif self.lostVictims >= 4:
+        elif self.lostVictims >= self.max_lost:
             self.running = False; self.game_result = "LOSE VICTIMS"
-        elif self.buildingDamage >= 24:
+        elif self.buildingDamage >= self.max_damage:
             self.running = False; self.game_result = "LOSE COLLAPSE"
+        if not self.running:
+            self.events.info("game_over", result=self.game_result)
+
+    def cell_json(self, p):
+        t = self.tiles[p]
+        st = 0
+        if t.type == "F": st=0
+        elif t.type == "M": st=1
+        elif t.type == "C": st=2
+        elif t.type == "D": st=3
+        if t.smoke: st=4
+        if t.fire: st=5
+        return {"x":p[0], "y":p[1], "state":st, "damage":t.damage}
+
+    def agent_json(self, ff):
+        return {
+            "id": ff.unique_id, "x": ff.pos[0], "y": ff.pos[1],
+            "role": ff.role, "carrying_victim": ff.carrying,
+            "ap_remaining": ff.action_points
+        }
 
-    def get_state_json(self):
-        # Serialización idéntica a la anterior
-        cells = []
-        for p, t in self.tiles.items():
-            st = 0
-            if t.type == "F": st=0
-            elif t.type == "M": st=1
-            elif t.type == "C": st=2
-            elif t.type == "D": st=3
-            if t.smoke: st=4
-            if t.fire: st=5
-            cells.append({"x":p[0], "y":p[1], "state":st, "damage":t.damage})
-        
-        agents = []
-        for ff in self.firefighters:
-            agents.append({
-                "id": ff.unique_id, "x": ff.pos[0], "y": ff.pos[1],
-                "role": ff.role, "carrying_victim": ff.carrying,
-                "ap_remaining": ff.action_points
-            })
-            
+    def current_agent_id(self):
         current = self.turn_order[self.current_index] if self.turn_order else None
-        
-        self.stats.update({
-            "victims_rescued": self.savedVictims,
-            "victims_lost": self.lostVictims,
-            "building_damage": self.buildingDamage
-        })
+        return current.unique_id if current else -1
+
+    def sync_stats(self):
+        # Los contadores ya viven en stats; se conserva por compatibilidad
+        return self.stats
+
+    def _commit_changes(self):
+        self.changes.commit(
+            {ff.unique_id: self.agent_json(ff) for ff in self.firefighters},
+            [{"x":p[0], "y":p[1]} for p in self.POIs],
+            self.sync_stats()
+        )
+
+    def cells_json(self):
+        return [self.cell_json(p) for p in self.tiles]
+
+    def state_planes(self):
+        # Estado y daño de cada celda, fila por fila, un byte cada uno (binario)
+        tiles = self.tiles.values()
+        state = bytes(5 if t.fire else 4 if t.smoke else TILE_STATES[t.type] for t in tiles)
+        return state, bytes(min(t.damage, 255) for t in tiles)
+
+    # with_cells=False omite las celdas (el formato binario usa state_planes)
+    def get_state_json(self, with_cells=True):
+        # Serialización idéntica a la anterior
+        cells = self.cells_json() if with_cells else None
+        agents = [self.agent_json(ff) for ff in self.firefighters]
 
         return {
             "step": self.steps, "running": self.running, "game_result": self.game_result,
             "width": self.width, "height": self.height, 
-            "current_agent": current.unique_id if current else -1,
+            "current_agent": self.current_agent_id(),
             "cells": cells, "agents": agents, 
             "pois": [{"x":p[0], "y":p[1]} for p in self.POIs],
-            "stats": self.stats
+            "stats": self.sync_stats()
         }
 
+    # --- SNAPSHOT / FORK ---
+
+    def _grid_snapshot(self):
+        # Fila por fila, un byte por celda: tipo (F/M/C/D), fuego, humo y daño
+        tiles = self.tiles.values()
+        return ("".join(t.type for t in tiles).encode(), bytes(t.fire for t in tiles),
+                bytes(t.smoke for t in tiles), bytes(t.damage for t in tiles))
+
+    def _load_grid(self, kind, fire, smoke, damage):
+        # Escribe directo en __dict__ (sin avisos por celda); regresa fuego/humo
+        hazards = []
+        for t, k, f, s, d in zip(self.tiles.values(), kind.decode(), fire, smoke, damage):
+            t.__dict__.update(type=k, fire=f, smoke=s, damage=d, hasPOI=False, walkable=k in "CD")
+            if f or s:
+                hazards.append(t.pos)
+        return hazards
+
+    def snapshot(self):
+        return {
+            "version": SNAPSHOT_VERSION, "rules": self.RULES, "map": self.map.name,
+            "width": self.width, "height": self.height,
+            "steps": self.steps, "running": self.running, "game_result": self.game_result,
+            "current_index": self.current_index,
+            "grid": self._grid_snapshot(),
+            "pois": tuple(self.POIs),
+            "agents": tuple((ff.pos, ff.action_points, ff.carrying) for ff in self.firefighters),
+            "counters": (self.savedVictims, self.lostVictims, self.buildingDamage),
+            "stats": dict(self.stats),
+            "rng": pack_rng(self.random),
+        }
+
+    def restore(self, snap):
+        check_snapshot(self, snap)
+        self.hazards = SpatialIndex(self.width, self.height)
+        for pos in self._load_grid(*snap["grid"]):
+            self.hazards.add(pos, pos[1] * self.width + pos[0])
+        self._build_pools()
+        self.POIs = []
+        self.poi_index = SpatialIndex(self.width, self.height)
+        self._poi_seq = 0
+        for pos in snap["pois"]:
+            self.add_poi(pos)
+        for ff, (pos, ap, carrying) in zip(self.firefighters, snap["agents"]):
+            if ff.pos != pos:
+                self.grid.move_agent(ff, pos)
+            ff.action_points = ap
+            ff.carrying = carrying
+            ff.plan = None
+        self.savedVictims, self.lostVictims, self.buildingDamage = snap["counters"]
+        self.stats = dict(snap["stats"])
+        self.steps = snap["steps"]
+        self.running = snap["running"]
+        self.game_result = snap["game_result"]
+        self.current_index = snap["current_index"]
+        unpack_rng(self.random, snap["rng"])
+        # Partida nueva para los clientes delta; el registro ya no sale de la semilla
+        self.fields = None
+        self.recorder = None
+        self.changes = ChangeTracker(start=self.steps)
+        self.events.game = self.changes.game_id
+        self.events.step = self.steps
+        self._commit_changes()
+
+    def _fork_board(self, source):
+        self.grid = blank_grid(source.grid)
+        cells = self.grid._grid  # Directo: la grid nueva no lleva empties
+        self.tiles = {}
+        for pos, tile in source.tiles.items():
+            twin = clone_agent(tile, self)
+            self.tiles[pos] = twin
+            cells[pos[0]][pos[1]].append(twin)
+
+    def fork(self):
+        """Partida nueva con el mismo estado (misma semilla y RNG), sin
+        reconstruir el modelo ni repetir la preparación."""
+        clone = clone_shell(self)
+        clone._fork_board(self)
+        clone.firefighters = []
+        for ff in self.firefighters:
+            twin = clone_agent(ff, clone)
+            twin.plan = None
+            clone.grid.place_agent(twin, ff.pos)
+            clone.firefighters.append(twin)
+        clone.turn_order = clone.get_turn_order()
+        clone.POIs = list(self.POIs)
+        clone.poi_index = self.poi_index.copy()
+        clone.hazards = self.hazards.copy()
+        clone.smoke_pool = self.smoke_pool.copy()
+        clone.poi_pool = self.poi_pool.copy()
+        clone.stats = dict(self.stats)
+        clone.params = dict(self.params)
+        clone.fields = None
+        clone.recorder = None
+        clone.changes = ChangeTracker(start=self.steps)
+        clone.events = EventLog(self.events.level)
+        clone.events.game = clone.changes.game_id
+        clone.events.step = self.steps
+        clone._commit_changes()
+        return clone
+
     def step(self):
         if not self.running: return
+        self.changes.begin(self.steps + 1)
+        self.events.step = self.steps + 1
+        laps = metrics.Laps(model=type(self).__name__) if metrics.ENABLED else None
         agent = self.turn_order[self.current_index]
         agent.step()
-        self.spread_smoke()
+        if laps:
+            laps.lap("agent_turn")
+            self._report_paths()
+        for _ in range(spread_count(self.random, self.smoke_rate)):
+            self.spread_smoke()
+        if laps: laps.lap("spread_smoke")
         self.spawn_pois()
+        if laps: laps.lap("poi_respawn")
         self.check_end_conditions()
+        if laps: laps.lap("end_checks")
         self.current_index = (self.current_index + 1) % len(self.turn_order)
         self.steps += 1
+        self._commit_changes()
+        if self.recorder:
+            self.recorder.capture(self)
+        if laps:
+            laps.lap("commit")
+            laps.done()
 
 # --- FLASK ---
-model = None
-
-@app.route('/init', methods=['POST'])
-def init():
-    global model; model = FireModel()
-    return jsonify(model.get_state_json())
-
-@app.route('/step', methods=['POST'])
-def step_route():
-    if not model: return jsonify({"error": "Init first"}), 400
-    model.step()
-    return jsonify(model.get_state_json())
-
-@app.route('/reset', methods=['POST'])
-def reset():
-    global model; model = FireModel()
-    return jsonify(model.get_state_json())
+def build_model(params):
+    cls = FireModel
+    if params.get("engine") == "array":
+        from fire_array import ArrayFireModel
+        cls = ArrayFireModel
+    return new_game(cls, **cls.options_from(params))
+
+# Flask solo se importa al levantar el servidor; los modelos se usan sin él
+def create_app():
+    from flask import Flask
+    from flask_cors import CORS
+    from routes import register_routes
+
+    app = Flask(__name__)
+    CORS(app)
+    register_routes(app, build_model)
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    create_app().run(host='0.0.0.0', port=5001, debug=True)
 
 
 
@@ -0,0 +1,275 @@
+# sessions.py - Registro de partidas concurrentes para los servidores Flask
+# Cada cliente (Unity, scripts de evaluación) trabaja sobre su propia sesión,
+# así un /init de un cliente ya no borra la partida de los demás.
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+
+from maps import CompiledMap
+
+DEFAULT_SESSION = "default"
+MAX_CHECKPOINTS = 16  # Snapshots guardados por sesión (/snapshot)
+
+
+class Session:
+    def __init__(self, session_id, model, params=None):
+        self.id = session_id
+        self.model = model
+        self.params = dict(params or {})  # Parámetros de /init (se reusan en /reset)
+        self.lock = threading.RLock()     # Un solo step a la vez por partida
+        self.checkpoints = OrderedDict()  # nombre -> model.snapshot()
+        self.stream = None                # stream.Autoplay de GET /stream
+        self.state_cache = {}             # formato -> respuesta de GET /state (routes.py)
+        self.created = time.monotonic()
+        self.last_used = self.created
+        # Lo que crece con la partida (checkpoints, grabación, bitácora,
+        # /state en caché) se mide por partes conforme llega; el resto del
+        # modelo solo una vez, sin los datos compartidos con otras sesiones.
+        self.base_footprint = estimate_footprint(model, skip=shared_parts(model))
+        self._checkpoint_bytes = {}
+        self._recorder = None
+        self._recorded = self._recorder_bytes = 0
+        self._events = None
+        self._event_seq = self._event_bytes = 0
+        self._event_sizes = deque()
+        self.footprint = self.base_footprint
+        self.refresh_footprint()
+
+    def save_checkpoint(self, name, snap):
+        self.checkpoints.pop(name, None)
+        self.checkpoints[name] = snap
+        self._checkpoint_bytes[name] = estimate_footprint(snap)
+        while len(self.checkpoints) > MAX_CHECKPOINTS:
+            old, _ = self.checkpoints.popitem(last=False)
+            del self._checkpoint_bytes[old]
+
+    def refresh_footprint(self):
+        # Llamar con self.lock tomado, después de cambiar la partida
+        model = self.model
+        recorder = getattr(model, "recorder", None)
+        if recorder is not self._recorder:  # /restore la descarta
+            self._recorder, self._recorded, self._recorder_bytes = recorder, 0, 0
+        if recorder is not None:
+            frames = recorder.frames
+            self._recorder_bytes += sum(estimate_footprint(f) for f in frames[self._recorded:])
+            self._recorded = len(frames)
+        self._measure_events(getattr(model, "events", None))
+        cached = sum(len(entry[1]) for entry in self.state_cache.values())
+        self.footprint = (self.base_footprint + sum(self._checkpoint_bytes.values())
+                          + self._recorder_bytes + self._event_bytes + cached)
+        return self.footprint
+
+    def _measure_events(self, log):
+        # Anillo de eventos: solo se miden los nuevos y se descuentan los que salen
+        if log is None:
+            return
+        if log is not self._events:
+            self._events, self._event_seq, self._event_bytes = log, 0, 0
+            self._event_sizes.clear()
+        buffer, sizes = log.buffer, self._event_sizes
+        new = min(log.seq - self._event_seq, len(buffer))
+        self._event_seq = log.seq
+        for event in islice(buffer, len(buffer) - new, None):
+            if len(sizes) == buffer.maxlen:
+                self._event_bytes -= sizes.popleft()
+            size = estimate_footprint(event)
+            sizes.append(size)
+            self._event_bytes += size
+
+    def close(self):
+        # Al salir del registro: detener su /stream (si no, seguiría jugando
+        # una partida que ya nadie puede controlar) y soltar la bitácora
+        with self.lock:
+            if self.stream is not None:
+                self.stream.stop()
+                self.stream = None
+            events = getattr(self.model, "events", None)
+            if events is not None:
+                events.close()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def info(self):
+        return {
+            "session_id": self.id,
+            "step": getattr(self.model, "steps", 0),
+            "running": getattr(self.model, "running", False),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "footprint_bytes": self.footprint,
+            "checkpoints": list(self.checkpoints),
+        }
+
+
+class SessionRegistry:
+    """Partidas vivas ordenadas por último uso (LRU)."""
+
+    def __init__(self, max_sessions=64, idle_timeout=1800, memory_cap_mb=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.memory_cap = int(memory_cap_mb * 1024 * 1024) if memory_cap_mb else None
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls):
+        cap = os.environ.get("FLASHPOINT_MEMORY_CAP_MB")
+        return cls(
+            max_sessions=int(os.environ.get("FLASHPOINT_MAX_SESSIONS", 64)),
+            idle_timeout=float(os.environ.get("FLASHPOINT_IDLE_TIMEOUT", 1800)),
+            memory_cap_mb=float(cap) if cap else None,
+        )
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex[:12]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def put(self, session_id, model, params=None):
+        # Crea o reemplaza la sesión y libera espacio si hace falta
+        session = Session(session_id, model, params)
+        with self._lock:
+            old = self._sessions.pop(session_id, None)
+            removed = self._evict_locked(incoming=session.footprint)
+            self._sessions[session_id] = session
+        if old is not None and old.model is not model:
+            removed.append(old)
+        _close_all(removed)
+        return session
+
+    def account(self, session):
+        # Tras un step o un checkpoint: volver a medir y respetar el límite
+        # de memoria (se conserva la sesión usada más recientemente). Sin
+        # tener el candado de ninguna sesión: cerrar otra toma el suyo.
+        with session.lock:
+            session.refresh_footprint()
+        if self.memory_cap is not None:
+            with self._lock:
+                removed = self._evict_locked(incoming=0, slots=0, keep=1)
+            _close_all(removed)
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            expired = self._expired(session, time.monotonic())
+            if expired:
+                del self._sessions[session_id]
+                self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+                session.touch()
+        if expired:
+            session.close()
+            return None
+        return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def sweep(self):
+        with self._lock:
+            removed = self._evict_locked(incoming=0, slots=0)
+        _close_all(removed)
+        return len(removed)
+
+    def memory_used(self):
+        return sum(s.footprint for s in self._sessions.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout": self.idle_timeout,
+                "memory_used_bytes": self.memory_used(),
+                "memory_cap_bytes": self.memory_cap,
+                "evicted": self.evicted,
+                "active": [s.info() for s in self._sessions.values()],
+            }
+
+    def _expired(self, session, now):
+        return self.idle_timeout is not None and now - session.last_used > self.idle_timeout
+
+    def _evict_locked(self, incoming, slots=1, keep=0):
+        # Regresa las sesiones que salen; quien llama las cierra ya sin el candado
+        now = time.monotonic()
+        removed = []
+        # 1. Sesiones inactivas
+        for sid in [sid for sid, s in self._sessions.items() if self._expired(s, now)]:
+            removed.append(self._sessions.pop(sid))
+        # 2. LRU hasta respetar el límite de sesiones y de memoria
+        while len(self._sessions) > keep and (
+            len(self._sessions) + slots > self.max_sessions
+            or (self.memory_cap is not None
+                and self.memory_used() + incoming > self.memory_cap)
+        ):
+            removed.append(self._sessions.popitem(last=False)[1])
+        self.evicted += len(removed)
+        return removed
+
+
+def _close_all(sessions):
+    for session in sessions:
+        session.close()
+
+
+# --- ESTIMACIÓN DE MEMORIA ---
+
+def shared_parts(model):
+    """Lo que el modelo no paga solo: la plantilla de la que salió (y lo que
+    comparte con ella) y las partes que Session mide por separado."""
+    template = getattr(model, "_template", None)
+    parts = [getattr(model, "recorder", None), getattr(model, "events", None)]
+    if template is not None:
+        parts.append(template)
+        parts.extend(vars(template).values())
+    return parts
+
+
+def estimate_footprint(obj, skip=()):
+    # Recorre el grafo de objetos; los mapas compilados son de todos
+    if hasattr(obj, "memory_footprint"):
+        return obj.memory_footprint()
+    seen = {id(part) for part in skip if part is not None}
+    stack = [obj]
+    total = 0
+    while stack:
+        cur = stack.pop()
+        if id(cur) in seen:
+            continue
+        seen.add(id(cur))
+        if isinstance(cur, CompiledMap):
+            continue
+        nbytes = getattr(cur, "nbytes", None)  # Arreglos NumPy
+        if isinstance(nbytes, int):
+            total += nbytes
+            continue
+        total += sys.getsizeof(cur)
+        if isinstance(cur, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(cur, dict):
+            stack.extend(cur.keys())
+            stack.extend(cur.values())
+        elif isinstance(cur, (list, tuple, set, frozenset)):
+            stack.extend(cur)
+        elif hasattr(cur, "__dict__") and not isinstance(cur, type):
+            stack.append(cur.__dict__)
+    return total
@@ -0,0 +1,138 @@
+# snapshot.py - Fotografías compactas del estado de una partida
+# model.snapshot() regresa un dict de datos planos (bytes para el mapa,
+# tuplas para agentes, el estado del RNG empacado) y model.restore(snap)
+# regresa el modelo a ese punto; model.fork() crea una partida nueva con el
+# mismo estado. Mucho más barato que copy.deepcopy del modelo de Mesa.
+#
+#   python snapshot.py --games 20          # tamaño y latencia contra deepcopy
+
+import argparse
+import copy
+import importlib
+import pickle
+import random
+import statistics
+import sys
+import time
+from array import array
+
+from sessions import estimate_footprint
+
+SNAPSHOT_VERSION = 1
+
+
+def pack_rng(rng):
+    version, state, gauss = rng.getstate()
+    return (version, array("I", state).tobytes(), gauss)
+
+
+def unpack_rng(rng, packed):
+    version, state, gauss = packed
+    rng.setstate((version, tuple(array("I", state)), gauss))
+
+
+def snapshot_size(snap):
+    # Bytes al serializar (lo que costaría guardarla o mandarla a otro proceso)
+    return len(pickle.dumps(snap, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def check_snapshot(model, snap):
+    if snap.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("versión de snapshot no soportada")
+    if snap.get("rules") != model.RULES:
+        raise ValueError(f"snapshot de reglas '{snap.get('rules')}', no '{model.RULES}'")
+    if (snap["width"], snap["height"]) != (model.width, model.height):
+        raise ValueError("snapshot de un mapa de otro tamaño")
+    if snap.get("map") != model.map.name:
+        raise ValueError(f"snapshot del mapa '{snap.get('map')}', no '{model.map.name}'")
+
+
+# --- FORK ---
+
+def clone_shell(model):
+    # Copia superficial sin pasar por Model.__new__ (consumiría el RNG global)
+    # ni por __init__ (volvería a preparar la partida); el modelo reemplaza
+    # después cada estructura mutable.
+    clone = object.__new__(type(model))
+    clone.__dict__.update(model.__dict__)
+    clone.random = random.Random()
+    clone.random.setstate(model.random.getstate())
+    return clone
+
+
+def blank_grid(source):
+    # Grid vacía del mismo tamaño y tipo sin el constructor de Mesa, que
+    # llama default_val() por celda (lo más caro de un fork en mapas grandes)
+    grid = object.__new__(type(source))
+    grid.__dict__.update(source.__dict__)
+    if source.default_val() is None:
+        grid._grid = [[None] * source.height for _ in range(source.width)]
+    else:
+        grid._grid = [[[] for _ in range(source.height)] for _ in range(source.width)]
+    grid._empties_built = False
+    grid.__dict__.pop("_empties", None)
+    grid._neighborhood_cache = {}
+    return grid
+
+
+def clone_agent(agent, model):
+    twin = object.__new__(type(agent))
+    twin.__dict__.update(agent.__dict__)
+    twin.__dict__["model"] = model  # Directo: Tile intercepta __setattr__
+    return twin
+
+
+# --- BENCHMARK ---
+
+BENCH_MODELS = {
+    "strat": ("serverStrat", "FireModel"),
+    "strat_array": ("fire_array", "ArrayFireModel"),
+    "random": ("serverR", "FlashPointModel"),
+}
+
+
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def bench(name, games=10, steps=40, repeat=20):
+    module, cls_name = BENCH_MODELS[name]
+    cls = getattr(importlib.import_module(module), cls_name)
+    rows = []
+    for seed in range(games):
+        model = cls(seed=seed, log_level="off")
+        for _ in range(steps):
+            model.step()
+        snap = model.snapshot()
+        rows.append({
+            "snapshot_us": _timed(model.snapshot, repeat),
+            "restore_us": _timed(lambda: model.restore(snap), repeat),
+            "fork_us": _timed(model.fork, repeat),
+            "deepcopy_us": _timed(lambda: copy.deepcopy(model), max(1, repeat // 4)),
+            "snapshot_bytes": snapshot_size(snap),
+            "model_bytes": estimate_footprint(model),
+        })
+    report = {k: round(statistics.median(r[k] for r in rows), 1) for k in rows[0]}
+    report["fork_speedup"] = round(report["deepcopy_us"] / report["fork_us"], 1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tamaño y latencia de snapshot/fork")
+    parser.add_argument("--models", default=",".join(BENCH_MODELS))
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=40, help="steps antes de medir")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+    for name in args.models.split(","):
+        report = bench(name, args.games, args.steps, args.repeat)
+        print(name, " ".join(f"{k}={v}" for k, v in report.items()), file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# spatial.py - Índice espacial por cubetas para buscar el objetivo más cercano
+# Las posiciones se agrupan en cubetas de BUCKET x BUCKET celdas. La búsqueda
+# recorre anillos de cubetas alrededor del punto y se detiene en cuanto el
+# siguiente anillo ya no puede tener nada más cerca (distancia Manhattan).
+
+BUCKET = 8
+
+
+class SpatialIndex:
+    def __init__(self, width, height, bucket=BUCKET):
+        self.bucket = bucket
+        self.bw = (width + bucket - 1) // bucket
+        self.bh = (height + bucket - 1) // bucket
+        self.buckets = {}
+        self.order = {}  # pos -> llave de desempate (como el orden de min())
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, pos):
+        return pos in self.order
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def copy(self):
+        twin = object.__new__(SpatialIndex)
+        twin.bucket, twin.bw, twin.bh = self.bucket, self.bw, self.bh
+        twin.buckets = {key: set(cell) for key, cell in self.buckets.items()}
+        twin.order = dict(self.order)
+        return twin
+
+    def add(self, pos, order):
+        if pos in self.order:
+            return
+        self.order[pos] = order
+        key = (pos[0] // self.bucket, pos[1] // self.bucket)
+        self.buckets.setdefault(key, set()).add(pos)
+
+    def discard(self, pos):
+        if self.order.pop(pos, None) is None:
+            return
+        key = (pos[0] // self.bucket, pos[1] // self.bucket)
+        cell = self.buckets[key]
+        cell.discard(pos)
+        if not cell:
+            del self.buckets[key]
+
+    def nearest(self, pos):
+        """(posición, distancia) más cercana; empates por la llave de orden."""
+        if not self.order:
+            return None, None
+        x, y = pos
+        b = self.bucket
+        bx, by = x // b, y // b
+        best = None
+        best_key = None
+        max_r = max(bx, by, self.bw - 1 - bx, self.bh - 1 - by)
+        for r in range(max_r + 1):
+            # Cota inferior de distancia para cualquier punto del anillo r
+            if best is not None and r > 0 and (r - 1) * b + 1 > best_key[0]:
+                break
+            for key in self._ring(bx, by, r):
+                for p in self.buckets.get(key, ()):
+                    k = (abs(p[0] - x) + abs(p[1] - y), self.order[p])
+                    if best_key is None or k < best_key:
+                        best, best_key = p, k
+        return best, best_key[0]
+
+    def _ring(self, bx, by, r):
+        if r == 0:
+            yield (bx, by)
+            return
+        for i in range(bx - r, bx + r + 1):
+            yield (i, by - r)
+            yield (i, by + r)
+        for j in range(by - r + 1, by + r):
+            yield (bx - r, j)
+            yield (bx + r, j)
@@ -0,0 +1,183 @@
+# state_binary.py - Codificación binaria compacta del estado (alternativa a JSON)
+# JSON sigue siendo el formato por defecto (lo que lee WebClient.cs). Con
+# ?format=binary o "Accept: application/x-flashpoint-state" se manda esto:
+#
+#   encabezado   <4sBBHHIhHH  "FPST", versión, flags, ancho, alto, step,
+#                             agente actual, #agentes, #POIs
+#                flags: 1 running, 2 delta, 4 trae POIs
+#   textos       game_result y game_id (u8 largo + utf-8; largo 0 = null)
+#   delta        since (u32), solo si flag 2
+#   celdas       completo: plano de estados fila por fila (ancho*alto bytes)
+#                y plano de daño igual; delta: u32 n + n * <HHBB (x, y, state, damage)
+#   agentes      n * <hHHBBB (id, x, y, AP, cargando, rol)
+#   POIs         n * <HH
+#   stats        u8 n + n * (u8 largo, llave, i32)
+#   extra        u32 largo + JSON con el resto de llaves (session_id, advanced...)
+#
+# Compresión opcional con gzip (?compress=gzip, o Accept-Encoding: gzip
+# cuando se pide binario).
+
+import gzip
+import json
+import struct
+
+MIME = "application/x-flashpoint-state"
+MAGIC = b"FPST"
+VERSION = 1
+RUNNING, DELTA, HAS_POIS = 1, 2, 4
+COMPRESS_LEVEL = 5
+
+HEADER = struct.Struct("<4sBBHHIhHH")
+CELL = struct.Struct("<HHBB")
+AGENT = struct.Struct("<hHHBBB")
+POI = struct.Struct("<HH")
+U8, U32, I32 = struct.Struct("<B"), struct.Struct("<I"), struct.Struct("<i")
+ROLES = ("", "APAGADOR", "RESCATISTA", "COMODIN")
+
+# Llaves que ya van en el formato binario; el resto viaja en "extra"
+_ENCODED = {"step", "running", "game_result", "width", "height", "current_agent",
+            "cells", "agents", "pois", "stats", "delta", "since", "game_id"}
+
+
+# --- NEGOCIACIÓN ---
+
+def wants_binary(fmt, accept):
+    if fmt:
+        return fmt == "binary"
+    return MIME in (accept or "")
+
+
+def wants_gzip(compress, accept_encoding, binary):
+    if compress is not None:
+        return compress in ("1", "true", "gzip")
+    return binary and "gzip" in (accept_encoding or "")
+
+
+def compress(body):
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+# --- CODIFICACIÓN ---
+
+def _text(value):
+    raw = b"" if value is None else str(value).encode()
+    return U8.pack(len(raw)) + raw
+
+
+def planes_from_cells(cells, width, height):
+    # Para estados que no vienen de un modelo vivo (p. ej. /replay)
+    state = bytearray(width * height)
+    damage = bytearray(width * height)
+    for c in cells:
+        i = c["y"] * width + c["x"]
+        state[i] = c["state"]
+        damage[i] = min(c["damage"], 255)
+    return bytes(state), bytes(damage)
+
+
+def encode_state(state, model=None):
+    """state: dict de get_state_json()/build_delta(). Si se pasa el modelo y
+    el estado es completo, los planos de celdas salen directo de él."""
+    delta = bool(state.get("delta"))
+    pois = state.get("pois")
+    # Los deltas no traen el tamaño del mapa
+    width = state.get("width", model.width if model else 0)
+    height = state.get("height", model.height if model else 0)
+    flags = ((RUNNING if state["running"] else 0) | (DELTA if delta else 0)
+             | (HAS_POIS if pois is not None else 0))
+    agents = state["agents"]
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, width, height, state["step"],
+                    state["current_agent"], len(agents), len(pois or ())),
+        _text(state.get("game_result")),
+        _text(state.get("game_id")),
+    ]
+    if delta:
+        parts.append(U32.pack(state["since"]))
+        cells = state["cells"]
+        parts.append(U32.pack(len(cells)))
+        parts.extend(CELL.pack(c["x"], c["y"], c["state"], min(c["damage"], 255)) for c in cells)
+    else:
+        if state["cells"] is None or (model is not None and state["step"] == model.steps):
+            planes = model.state_planes()
+        else:
+            planes = planes_from_cells(state["cells"], width, height)
+        parts.extend(planes)
+    parts.extend(AGENT.pack(a["id"], a["x"], a["y"], a["ap_remaining"], bool(a["carrying_victim"]),
+                            ROLES.index(a.get("role", ""))) for a in agents)
+    if pois is not None:
+        parts.extend(POI.pack(p["x"], p["y"]) for p in pois)
+    stats = state["stats"]
+    parts.append(U8.pack(len(stats)))
+    for key, value in stats.items():
+        parts.append(_text(key) + I32.pack(value))
+    extra = {k: v for k, v in state.items() if k not in _ENCODED}
+    raw = json.dumps(extra, default=int).encode() if extra else b""
+    parts.append(U32.pack(len(raw)) + raw)
+    return b"".join(parts)
+
+
+# --- DECODIFICACIÓN (clientes Python, pruebas) ---
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.at = 0
+
+    def take(self, n):
+        chunk = self.data[self.at:self.at + n]
+        self.at += n
+        return chunk
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.at)
+        self.at += fmt.size
+        return values
+
+    def text(self):
+        (n,) = self.unpack(U8)
+        return bytes(self.take(n)).decode() if n else None
+
+
+def decode_state(data):
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    r = _Reader(data)
+    magic, version, flags, width, height, step, current, n_agents, n_pois = r.unpack(HEADER)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("no es un estado binario de Flashpoint")
+    state = {"step": step, "running": bool(flags & RUNNING), "game_result": r.text(),
+             "width": width, "height": height, "current_agent": current}
+    game_id = r.text()
+    if game_id is not None:
+        state["game_id"] = game_id
+    if flags & DELTA:
+        state["delta"] = True
+        (state["since"],) = r.unpack(U32)
+        (n,) = r.unpack(U32)
+        state["cells"] = [dict(zip(("x", "y", "state", "damage"), r.unpack(CELL))) for _ in range(n)]
+    else:
+        size = width * height
+        planes = bytes(r.take(size)), bytes(r.take(size))
+        state["cells"] = [{"x": i % width, "y": i // width, "state": s, "damage": d}
+                          for i, (s, d) in enumerate(zip(*planes))]
+    agents = []
+    for _ in range(n_agents):
+        aid, x, y, ap, carrying, role = r.unpack(AGENT)
+        agent = {"id": aid, "x": x, "y": y, "carrying_victim": bool(carrying), "ap_remaining": ap}
+        if role:
+            agent["role"] = ROLES[role]
+        agents.append(agent)
+    state["agents"] = agents
+    if flags & HAS_POIS:
+        state["pois"] = [dict(zip(("x", "y"), r.unpack(POI))) for _ in range(n_pois)]
+    (n,) = r.unpack(U8)
+    stats = {}
+    for _ in range(n):
+        key = r.text()
+        (stats[key],) = r.unpack(I32)
+    state["stats"] = stats
+    (n,) = r.unpack(U32)
+    if n:
+        state.update(json.loads(bytes(r.take(n))))
+    return state
@@ -0,0 +1,85 @@
+# state_delta.py - Registro de cambios por step para respuestas delta
+# En lugar de reenviar las 240 celdas en cada /step, el modelo marca las
+# celdas que toca y aquí se guarda, por step, qué cambió. Agentes, POIs y
+# stats son pocos, así que se guarda su "firma" por step y se compara.
+
+import uuid
+
+DEFAULT_HISTORY = 256
+
+
+class Frame:
+    __slots__ = ("cells", "agents", "pois", "stats")
+
+    def __init__(self):
+        self.cells = set()
+        self.agents = None
+        self.pois = None
+        self.stats = None
+
+
+class ChangeTracker:
+    # start: step desde el que se registra (un modelo restaurado no empieza en 0)
+    def __init__(self, history=DEFAULT_HISTORY, start=0):
+        self.history = history
+        self.game_id = uuid.uuid4().hex[:8]  # Distingue partidas tras /reset
+        self.clock = start
+        self.frames = {start: Frame()}
+        self.oldest = start
+
+    def mark(self, pos):
+        self.frames[self.clock].cells.add(pos)
+
+    def begin(self, step):
+        # Todo lo que se marque a partir de aquí pertenece al estado 'step'
+        self.clock = step
+        self.frames[step] = Frame()
+        while step - self.oldest > self.history:
+            del self.frames[self.oldest]
+            self.oldest += 1
+
+    def commit(self, agents, pois, stats):
+        # agents: {id: dict}, pois: lista de dicts, stats: dict (se copia)
+        frame = self.frames[self.clock]
+        frame.agents = agents
+        frame.pois = pois
+        frame.stats = dict(stats)
+
+    def can_diff(self, since, game_id=None):
+        if game_id is not None and game_id != self.game_id:
+            return False
+        return self.oldest <= since <= self.clock and self.frames[since].agents is not None
+
+    def diff(self, since):
+        # Regresa (celdas, agentes, pois o None, stats) cambiados desde 'since'
+        cells = set()
+        for step in range(since + 1, self.clock + 1):
+            cells |= self.frames[step].cells
+        old, new = self.frames[since], self.frames[self.clock]
+        agents = [a for aid, a in new.agents.items() if old.agents.get(aid) != a]
+        pois = new.pois if new.pois != old.pois else None
+        stats = {k: v for k, v in new.stats.items() if old.stats.get(k) != v}
+        return cells, agents, pois, stats
+
+
+def build_delta(model, since, game_id=None, with_cells=True):
+    """Estado parcial desde 'since' o, si no se puede, el estado completo."""
+    changes = model.changes
+    if since is None or not changes.can_diff(since, game_id):
+        state = model.get_state_json(with_cells)
+        state["delta"] = False
+        state["game_id"] = changes.game_id
+        return state
+    cells, agents, pois, stats = changes.diff(since)
+    state = {
+        "delta": True, "since": since, "game_id": changes.game_id,
+        "step": model.steps, "running": model.running,
+        "game_result": model.game_result,
+        "current_agent": model.current_agent_id(),
+        "cells": [model.cell_json(p) for p in sorted(cells)],
+        "agents": agents,
+        "stats": stats,
+    }
+    if pois is not None:
+        state["pois"] = pois
+    return state
@@ -0,0 +1,132 @@
+# stream.py - Autoplay en el servidor con envío por Server-Sent Events
+# En lugar de un POST /step por tick, el cliente abre GET /stream y el
+# servidor avanza la partida al ritmo pedido (o lo más rápido posible) y
+# empuja un evento por tick por la misma conexión.
+#
+# Contrapresión: el generador solo avanza el modelo cuando el servidor ya
+# entregó el evento anterior al socket; si el cliente lee lento, la partida
+# espera en lugar de acumular eventos. Como cada evento es un delta desde el
+# último enviado, con steps_per_event > 1 se saltan cuadros sin perder cambios.
+
+import json
+import threading
+import time
+
+from batch import MAX_BATCH_STEPS
+from state_delta import build_delta
+
+HEARTBEAT = 15.0  # Segundos entre comentarios ": ping" mientras está en pausa
+
+
+def parse_rate(value):
+    # Ticks por segundo; 0 / "max" = lo más rápido posible
+    if value in (None, "", "max"):
+        return 0.0
+    rate = float(value)
+    if rate < 0:
+        raise ValueError("rate debe ser >= 0")
+    return rate
+
+
+def sse(event, data=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, default=int))
+    return "\n".join(lines) + "\n\n"
+
+
+class Autoplay:
+    def __init__(self, session, rate=0.0, delta=True, steps_per_event=1, since=None,
+                 game_id=None, max_steps=MAX_BATCH_STEPS, paused=False):
+        self.session = session
+        self.rate = rate
+        self.delta = delta
+        self.steps_per_event = max(1, int(steps_per_event))
+        self.since = since  # Último step que tiene el cliente (Last-Event-ID)
+        self.max_steps = max_steps
+        self.stopped = False
+        self.sent = 0
+        self.game_id = game_id
+        self._playing = threading.Event()
+        self._wake = threading.Event()  # Interrumpe la espera entre ticks
+        if not paused:
+            self._playing.set()
+
+    @property
+    def paused(self):
+        return not self._playing.is_set()
+
+    def pause(self):
+        self._playing.clear()
+        self._wake.set()
+
+    def resume(self):
+        self._playing.set()
+        self._wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self._playing.set()
+        self._wake.set()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self._wake.set()
+
+    def info(self):
+        return {"streaming": not self.stopped, "paused": self.paused, "rate": self.rate,
+                "steps_per_event": self.steps_per_event, "events_sent": self.sent}
+
+    def _frame(self, advance):
+        session = self.session
+        with session.lock:
+            model = session.model
+            advanced = 0
+            while advance and model.running and advanced < self.steps_per_event:
+                model.step()
+                advanced += 1
+            if self.delta and self.since is not None:
+                state = build_delta(model, self.since, self.game_id)
+            else:
+                state = model.get_state_json()
+                state["game_id"] = model.changes.game_id
+            state["session_id"] = session.id
+            state["advanced"] = advanced
+            self.since, self.game_id = model.steps, model.changes.game_id
+            if advanced:
+                session.refresh_footprint()  # El límite se aplica en el siguiente /init o /sessions
+            return state, model.running
+
+    def events(self, clock=time.monotonic):
+        """Genera cadenas SSE. Primero el estado actual, luego un evento por tick."""
+        played = 0
+        next_tick = clock()
+        state, running = self._frame(advance=False)
+        self.sent += 1
+        yield sse("state", state, state["step"])
+        while running and not self.stopped and played < self.max_steps:
+            # Pausa: solo latidos hasta que llegue resume/stop
+            while not self._playing.wait(HEARTBEAT):
+                yield ": ping\n\n"
+            if self.stopped:
+                break
+            if self.rate > 0:
+                next_tick += 1.0 / self.rate
+                wait = next_tick - clock()
+                if wait > 0:
+                    self._wake.clear()
+                    self._wake.wait(wait)
+                    if self.stopped:
+                        break
+                    if self.paused:
+                        continue
+                elif wait < -1.0:
+                    next_tick = clock()  # Tras una pausa o atraso largo, sin ráfaga
+            state, running = self._frame(advance=True)
+            played += state["advanced"]
+            self.sent += 1
+            yield sse("state", state, state["step"])
+        yield sse("end", {"step": self.since, "running": running, "stopped": self.stopped,
+                          "game_result": state.get("game_result")})
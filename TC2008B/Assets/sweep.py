@@ -0,0 +1,316 @@
+# sweep.py - Barrido de parámetros en paralelo con resultados en SQLite
+#
+#   python sweep.py --db barrido.sqlite --seeds 200 --strategies strat,random \
+#       --grid '{"smoke_rate": [1, 1.5, 2], "max_damage": [24, 36],
+#                "roles": [["APAGADOR", "RESCATISTA", "COMODIN"], ["RESCATISTA"]]}'
+#   python sweep.py --db barrido.sqlite --report reporte.json   # solo el reporte
+#
+# La rejilla es un objeto JSON (o --grid-file) con una lista de valores por
+# parámetro; se juega el producto cartesiano × semillas × estrategias. Cada
+# estrategia toma solo los parámetros de su modelo (TUNABLE en FireModel y
+# FlashPointModel): num_agents/max_pois solo cambian "random_legacy" y roles
+# nada en él, así que esas combinaciones se juegan una sola vez.
+#
+# Cada partida es una fila de la base con llave (configuración, semilla,
+# estrategia, versión del motor) y se guarda conforme llega. Lo que ya está
+# en la base no se vuelve a jugar: una corrida interrumpida se reanuda con
+# el mismo comando y una rejilla más grande solo juega lo nuevo. La versión
+# del motor es un hash del código de las reglas; si el código cambia, las
+# filas viejas se conservan pero ya no cuentan.
+
+import argparse
+import hashlib
+import importlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import time
+import types
+
+from maps import load_map
+from server import STRATEGIES, model_class
+from tournament import DEFAULT_MAX_STEPS, Aggregate, _init_worker, game_seed, play
+from tuning import pois_from, rate_from, roles_from, threshold_from
+
+COMMIT_EVERY = 200      # Filas por transacción
+COMMIT_SECONDS = 5.0    # O cada tantos segundos, lo que pase primero
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    config TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    strategy TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    game_result TEXT NOT NULL,
+    win INTEGER NOT NULL,
+    steps INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    stats TEXT NOT NULL,
+    PRIMARY KEY (config, seed, strategy, engine)
+)
+"""
+
+
+# --- CONFIGURACIONES ---
+
+def expand_grid(grid):
+    """{"param": [valores]} -> lista de configuraciones (producto cartesiano)."""
+    for name, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{name}: se espera una lista no vacía de valores")
+    names = sorted(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+
+def check_config(config):
+    # Validar antes de repartir: un error dentro del pool tumbaría la corrida
+    known = set().union(*(model_class(s).TUNABLE for s in STRATEGIES))
+    unknown = sorted(set(config) - known)
+    if unknown:
+        raise ValueError(f"parámetros desconocidos: {', '.join(unknown)}")
+    if "roles" in config:
+        roles_from(config["roles"])
+    if "smoke_rate" in config:
+        rate_from(config["smoke_rate"])
+    for name in ("num_agents", "win_rescued", "max_lost", "max_damage"):
+        if name in config:
+            threshold_from(name, config[name])
+    game_map = load_map(config.get("map_name"))
+    if "max_pois" in config:
+        pois_from(config["max_pois"], game_map)
+
+
+def config_key(strategy, config, max_steps):
+    # Solo lo que usa el modelo de la estrategia, en JSON canónico
+    tunable = model_class(strategy).TUNABLE
+    used = {k: v for k, v in config.items() if k in tunable}
+    used["max_steps"] = max_steps  # Cambia el resultado (TIMEOUT)
+    return json.dumps(used, sort_keys=True, separators=(",", ":"))
+
+
+def model_options(key):
+    options = json.loads(key)
+    max_steps = options.pop("max_steps")
+    # Listas de JSON -> tuplas (la llave de la plantilla debe ser hashable)
+    options = {k: tuple(v) if isinstance(v, list) else v for k, v in options.items()}
+    return options, max_steps
+
+
+# --- VERSIÓN DEL MOTOR ---
+
+def _local_module(value):
+    # Módulo de este directorio al que pertenece value (o None)
+    module = value if isinstance(value, types.ModuleType) else \
+        sys.modules.get(getattr(value, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path and os.path.dirname(os.path.abspath(path)) == HERE:
+        return module
+    return None
+
+
+def engine_sources(module):
+    """Archivos de los módulos locales que usa module (cerradura transitiva)."""
+    found = {}
+    pending = [module]
+    while pending:
+        current = pending.pop()
+        if current.__name__ in found:
+            continue
+        found[current.__name__] = current.__file__
+        for value in vars(current).values():
+            dep = _local_module(value)
+            if dep is not None and dep.__name__ not in found:
+                pending.append(dep)
+    return found
+
+
+_versions = {}
+
+
+def engine_version(strategy):
+    """Hash del código de las reglas de la estrategia y sus argumentos fijos."""
+    if strategy not in _versions:
+        module, _, fixed = STRATEGIES[strategy]
+        digest = hashlib.sha1(repr(sorted(fixed.items())).encode())
+        for name, path in sorted(engine_sources(importlib.import_module(module)).items()):
+            with open(path, "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+        _versions[strategy] = f"{model_class(strategy).RULES}-{digest.hexdigest()[:12]}"
+    return _versions[strategy]
+
+
+# --- BASE DE RESULTADOS ---
+
+class ResultStore:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Se puede leer mientras corre
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def done(self, strategy, engine):
+        rows = self.db.execute("SELECT config, seed FROM results WHERE strategy = ? AND engine = ?",
+                               (strategy, engine))
+        return set(rows)
+
+    def add(self, rows):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["config"], r["seed"], r["strategy"], r["engine"], r["game_result"],
+              int(r["win"]), r["steps"], r["seconds"], json.dumps(r["stats"], sort_keys=True))
+             for r in rows])
+        self.db.commit()
+
+    def results(self, strategy, engine):
+        return self.db.execute(
+            "SELECT config, game_result, win, steps, seconds, stats FROM results "
+            "WHERE strategy = ? AND engine = ? ORDER BY config, seed", (strategy, engine))
+
+    def close(self):
+        self.db.close()
+
+
+# --- CORRIDA ---
+
+def play_cell(task):
+    strategy, engine, key, seed = task
+    options, max_steps = model_options(key)
+    row = play(strategy, seed, max_steps, **options)
+    row.update(config=key, engine=engine)
+    return row
+
+
+def pending_tasks(store, configs, strategies, seeds, base_seed, max_steps):
+    """Celdas que faltan, agrupadas por configuración (cada proceso reusa la
+    plantilla del modelo mientras juega las semillas de una configuración)."""
+    tasks = []
+    total = 0
+    for strategy in strategies:
+        engine = engine_version(strategy)
+        done = store.done(strategy, engine)
+        keys = dict.fromkeys(config_key(strategy, c, max_steps) for c in configs)
+        for key in keys:
+            for i in range(seeds):
+                seed = game_seed(base_seed, i)
+                total += 1
+                if (key, seed) not in done:
+                    tasks.append((strategy, engine, key, seed))
+    return tasks, total
+
+
+def run_sweep(store, configs, strategies, seeds, base_seed, max_steps, workers, progress=None):
+    tasks, total = pending_tasks(store, configs, strategies, seeds, base_seed, max_steps)
+    if progress:
+        print(f"{total - len(tasks)}/{total} partidas ya estaban en la base", file=sys.stderr)
+    if not tasks:
+        return {"games": total, "played": 0, "wall_seconds": 0.0}
+    chunksize = max(1, min(seeds, len(tasks) // (workers * 16)))
+    buffer = []
+    last_commit = start = time.perf_counter()
+    played = 0
+    try:
+        with mp.Pool(workers, initializer=_init_worker) as pool:
+            for row in pool.imap_unordered(play_cell, tasks, chunksize):
+                buffer.append(row)
+                played += 1
+                now = time.perf_counter()
+                if len(buffer) >= COMMIT_EVERY or now - last_commit >= COMMIT_SECONDS:
+                    store.add(buffer)
+                    buffer = []
+                    last_commit = now
+                if progress and played % progress == 0:
+                    print(f"{played}/{len(tasks)} partidas", file=sys.stderr)
+    finally:
+        # También al interrumpir: lo que ya se jugó no se repite
+        if buffer:
+            store.add(buffer)
+    wall = time.perf_counter() - start
+    return {
+        "games": total,
+        "played": played,
+        "wall_seconds": round(wall, 3),
+        "games_per_second": round(played / wall, 2) if wall else None,
+    }
+
+
+def report(store, strategies, configs=None, max_steps=DEFAULT_MAX_STEPS):
+    """Agregado por (estrategia, configuración) con la versión actual del motor.
+    Con configs solo las de la rejilla; sin ellas, todo lo que hay en la base."""
+    out = []
+    for strategy in strategies:
+        wanted = None
+        if configs is not None:
+            wanted = {config_key(strategy, c, max_steps) for c in configs}
+        aggregates = {}
+        for key, result, win, steps, seconds, stats in store.results(
+                strategy, engine_version(strategy)):
+            if wanted is not None and key not in wanted:
+                continue
+            aggregates.setdefault(key, Aggregate()).add({
+                "game_result": result, "win": win, "steps": steps, "seconds": seconds,
+                "stats": json.loads(stats)})
+        for key, aggregate in aggregates.items():
+            out.append({"strategy": strategy, "config": json.loads(key), **aggregate.report()})
+    return out
+
+
+def load_grid(args):
+    if args.grid_file:
+        with open(args.grid_file) as f:
+            return json.load(f)
+    return json.loads(args.grid) if args.grid else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido de parámetros con resultados en SQLite")
+    parser.add_argument("--db", required=True, help="base SQLite (se crea o se reanuda)")
+    parser.add_argument("--grid", help='rejilla JSON, p. ej. {"smoke_rate": [1, 2]}')
+    parser.add_argument("--grid-file", help="rejilla en un archivo JSON")
+    parser.add_argument("--strategies", default="strat,random")
+    parser.add_argument("--seeds", type=int, default=100, help="semillas por configuración")
+    parser.add_argument("--seed", type=int, default=0, help="semilla base")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--report", help="archivo JSON con el agregado por configuración")
+    parser.add_argument("--progress", type=int, default=0, help="avisar cada N partidas")
+    args = parser.parse_args(argv)
+
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"estrategias desconocidas: {', '.join(unknown)}")
+    try:
+        grid = load_grid(args)
+        configs = expand_grid(grid) if grid is not None else None
+        for config in configs or ():
+            check_config(config)
+    except ValueError as e:  # También JSON inválido
+        parser.error(str(e))
+
+    store = ResultStore(args.db)
+    try:
+        summary = None
+        if configs is not None:
+            summary = run_sweep(store, configs, strategies, args.seeds, args.seed,
+                                args.max_steps, args.workers, args.progress)
+        results = report(store, strategies, configs, args.max_steps)
+    except KeyboardInterrupt:
+        print("interrumpido: lo jugado ya está en la base, el mismo comando reanuda",
+              file=sys.stderr)
+        sys.exit(130)
+    finally:
+        store.close()
+
+    text = json.dumps({"sweep": summary, "configs": results}, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# templates.py - Partidas nuevas a partir de un modelo ya preparado
+# Construir un modelo (Tiles, MultiGrid, agentes, índices, celdas candidatas)
+# cuesta mucho más que copiarlo. Por cada clase y configuración se guarda
+# una plantilla preparada hasta justo antes de usar el RNG (model._prepare);
+# /init y /reset sellan una copia con model.fork(), le ponen la semilla de
+# la partida y terminan la preparación (model._start_game). Con la misma
+# semilla sale exactamente la misma partida que con el constructor.
+#
+# Las plantillas no se modifican nunca después de armarse, así que varios
+# hilos pueden sellar partidas de la misma a la vez.
+
+import random
+import threading
+from collections import OrderedDict
+
+from events import EventLog
+from maps import load_map
+
+MAX_TEMPLATES = 8
+
+_templates = OrderedDict()  # (clase, mapa compilado, configuración) -> modelo
+_lock = threading.Lock()
+
+
+def build_template(cls, config):
+    from mesa import Model  # Ya está cargado: cls es un modelo de Mesa
+
+    template = cls.__new__(cls, seed=0)
+    Model.__init__(template)
+    template._prepare(log_level="off", **config)
+    return template
+
+
+def get_template(cls, config):
+    # El mapa compilado entra en la llave: si su archivo cambia, plantilla nueva
+    key = (cls, load_map(config.get("map_name")), tuple(sorted(config.items())))
+    with _lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = build_template(cls, config)  # Fuera del candado: puede tardar
+    with _lock:
+        template = _templates.setdefault(key, template)
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def stamp(template, seed, log_level=None, record=False):
+    game = template.fork()
+    game._template = template  # Lo que comparten no cuenta en su memoria (sessions.py)
+    game._seed = game.seed = seed
+    game.random = random.Random(seed)
+    game.events = EventLog(log_level)
+    game.events.game = game.changes.game_id
+    game._start_game(record)
+    return game
+
+
+def new_game(cls, seed=None, log_level=None, record=False, **config):
+    """Igual que cls(seed=..., **config), pero copiando la plantilla."""
+    if seed is None:
+        seed = random.random()  # Como Model.__new__ de Mesa
+    return stamp(get_template(cls, config), seed, log_level, record)
+
+
+def clear():
+    with _lock:
+        _templates.clear()
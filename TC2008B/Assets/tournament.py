@@ -0,0 +1,190 @@
+# tournament.py - Torneo Monte Carlo sin Flask entre estrategias de server.py
+#
+#   python tournament.py --games 2000 --workers 8 --seed 7 \
+#       --csv resultados.csv --json reporte.json
+#
+# Cada partida corre en un proceso del pool con su propia semilla; los
+# resultados se escriben al CSV conforme llegan y al final se agregan con
+# intervalos de confianza al 95%.
+
+import argparse
+import csv
+import json
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+
+from server import STRATEGIES, model_factory
+
+DEFAULT_MAX_STEPS = 5000
+Z_95 = 1.96
+
+
+def game_seed(base_seed, index):
+    # Semillas independientes por partida, iguales para ambas estrategias
+    return (base_seed * 1_000_003 + index) & 0x7FFFFFFF
+
+
+def play(strategy, seed, max_steps, **options):
+    """Una partida completa; options van al constructor del modelo."""
+    model_cls = model_factory(strategy)
+    start = time.perf_counter()
+    # Sin bitácora de eventos: en el torneo solo cuesta tiempo
+    model = model_cls(log_level="off", seed=seed, **options)
+    while model.running and model.steps < max_steps:
+        model.step()
+    stats = model.get_state_json()["stats"]
+    return {
+        "strategy": strategy, "seed": seed,
+        "game_result": model.game_result or "TIMEOUT",
+        "win": model.game_result == "WIN",
+        "steps": model.steps,
+        "seconds": round(time.perf_counter() - start, 4),
+        "stats": dict(stats),
+    }
+
+
+def play_game(task):
+    strategy, index, seed, max_steps = task
+    return dict(play(strategy, seed, max_steps), game=index)
+
+
+def _init_worker():
+    # Importar los modelos una sola vez por proceso
+    for strategy in STRATEGIES:
+        model_factory(strategy)
+
+
+# --- ESTADÍSTICA ---
+
+def wilson_interval(successes, n, z=Z_95):
+    if n == 0:
+        return (0.0, 0.0)
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return (max(0.0, center - half), min(1.0, center + half))
+
+
+def mean_interval(values, z=Z_95):
+    n = len(values)
+    if n == 0:
+        return {"mean": 0.0, "ci95": [0.0, 0.0]}
+    mean = sum(values) / n
+    if n == 1:
+        return {"mean": mean, "ci95": [mean, mean]}
+    var = sum((v - mean) ** 2 for v in values) / (n - 1)
+    half = z * math.sqrt(var / n)
+    return {"mean": mean, "ci95": [mean - half, mean + half]}
+
+
+class Aggregate:
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.results = {}
+        self.steps = []
+        self.seconds = 0.0
+        self.stats = {}
+
+    def add(self, row):
+        self.games += 1
+        self.wins += row["win"]
+        self.results[row["game_result"]] = self.results.get(row["game_result"], 0) + 1
+        self.steps.append(row["steps"])
+        self.seconds += row["seconds"]
+        for key, value in row["stats"].items():
+            self.stats.setdefault(key, []).append(value)
+
+    def report(self):
+        low, high = wilson_interval(self.wins, self.games)
+        return {
+            "games": self.games,
+            "wins": self.wins,
+            "win_rate": self.wins / self.games if self.games else 0.0,
+            "win_rate_ci95": [low, high],
+            "results": dict(sorted(self.results.items())),
+            "steps": mean_interval(self.steps),
+            "cpu_seconds": round(self.seconds, 3),
+            "stats": {k: mean_interval(v) for k, v in sorted(self.stats.items())},
+        }
+
+
+# --- CORRIDA ---
+
+def stat_columns(strategies):
+    keys = set()
+    for strategy in strategies:
+        keys.update(model_factory(strategy)(log_level="off").get_state_json()["stats"])
+    return sorted(keys)
+
+
+def run_tournament(games, strategies, workers, seed, max_steps, csv_path=None, progress=None):
+    tasks = [(s, i, game_seed(seed, i), max_steps) for i in range(games) for s in strategies]
+    aggregates = {s: Aggregate() for s in strategies}
+    columns = stat_columns(strategies)
+    chunksize = max(1, len(tasks) // (workers * 16))
+
+    csv_file = open(csv_path, "w", newline="") if csv_path else None
+    try:
+        writer = None
+        if csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["strategy", "game", "seed", "game_result", "steps", "seconds"] + columns)
+        start = time.perf_counter()
+        with mp.Pool(workers, initializer=_init_worker) as pool:
+            for done, row in enumerate(pool.imap_unordered(play_game, tasks, chunksize), 1):
+                aggregates[row["strategy"]].add(row)
+                if writer:
+                    writer.writerow([row["strategy"], row["game"], row["seed"], row["game_result"],
+                                     row["steps"], row["seconds"]]
+                                    + [row["stats"].get(c, "") for c in columns])
+                if progress and done % progress == 0:
+                    print(f"{done}/{len(tasks)} partidas", file=sys.stderr)
+        wall = time.perf_counter() - start
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    return {
+        "games_per_strategy": games,
+        "seed": seed,
+        "workers": workers,
+        "max_steps": max_steps,
+        "wall_seconds": round(wall, 3),
+        "games_per_second": round(len(tasks) / wall, 2) if wall else None,
+        "strategies": {s: a.report() for s, a in aggregates.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Torneo Monte Carlo entre estrategias")
+    parser.add_argument("--games", type=int, default=1000, help="partidas por estrategia")
+    parser.add_argument("--strategies", default="strat,random")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--csv", help="archivo CSV con una fila por partida")
+    parser.add_argument("--json", help="archivo JSON con el reporte agregado")
+    parser.add_argument("--progress", type=int, default=0, help="avisar cada N partidas")
+    args = parser.parse_args(argv)
+
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"estrategias desconocidas: {', '.join(unknown)}")
+
+    report = run_tournament(args.games, strategies, args.workers, args.seed,
+                            args.max_steps, args.csv, args.progress)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
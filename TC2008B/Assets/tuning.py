@@ -0,0 +1,52 @@
+# tuning.py - Parámetros ajustables de las reglas y sus valores de siempre
+# Ambos modelos los aceptan en el constructor y en /init; sweep.py los barre.
+# Con los valores por defecto las partidas (y sus semillas) no cambian.
+#
+#   /init {"smoke_rate": 1.5, "max_damage": 30, "roles": ["RESCATISTA"]}
+
+ROLES = ("APAGADOR", "RESCATISTA", "COMODIN")  # En ciclo sobre los spawns
+SMOKE_RATE = 1     # Humo esparcido por step; la parte fraccionaria es una probabilidad
+WIN_RESCUED = 7    # Víctimas salvadas para ganar
+MAX_LOST = 4       # Víctimas perdidas para perder
+MAX_DAMAGE = 24    # Daño al edificio para que colapse
+
+
+def roles_from(roles):
+    """Lista de roles (de JSON) -> tupla validada; None = la de siempre."""
+    if roles is None:
+        return ROLES
+    if not isinstance(roles, (list, tuple)) or not roles:
+        raise ValueError("roles debe ser una lista no vacía")
+    unknown = [r for r in roles if not isinstance(r, str) or r not in ROLES]
+    if unknown:
+        raise ValueError(f"roles desconocidos: {', '.join(map(str, unknown))}")
+    return tuple(roles)
+
+
+def rate_from(rate):
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 100:
+        raise ValueError("smoke_rate debe ser un número entre 0 y 100")
+    return rate
+
+
+def threshold_from(name, value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{name} debe ser un entero positivo")
+    return value
+
+
+def pois_from(max_pois, game_map):
+    # Víctimas activas a la vez: no más que celdas C donde puedan aparecer
+    threshold_from("max_pois", max_pois)
+    cells = game_map.codes.count(2)  # Código de C en maps.TILE_TYPES
+    if max_pois > cells:
+        raise ValueError(f"max_pois debe ser a lo más {cells} (celdas C del mapa)")
+    return max_pois
+
+
+def spread_count(rng, rate):
+    # Con una tasa entera no se usa el RNG: la tasa 1 juega igual que antes
+    whole = int(rate)
+    if rate != whole and rng.random() < rate - whole:
+        whole += 1
+    return whole